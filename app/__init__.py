@@ -2,10 +2,23 @@ import os
 from flask import Flask
 from dotenv import load_dotenv
 from .routes import main
-from .extensions import mongo, bcrypt
+from .extensions import (
+    mongo, bcrypt, passwords, media, images, tasks, geocoding, response_cache,
+    content_versions, pool_metrics, request_metrics, query_budgets, slow_queries
+)
+from .pool import client_options
+from .media import media_cli
+from .geocode import geocode_cli
+from .indexes import db_cli, check_indexes
+from .deals import deals_cli
+from .reviews import reviews_cli
+from .summary import summary_cli
+from .cascade import cascade_cli
+from .slowlog import slow_queries_cli
+from .passwords import passwords_cli
 
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
 
     load_dotenv()
@@ -14,11 +27,87 @@ def create_app():
     app.config["MONGO_DBNAME"] = os.environ.get("MONGO_DBNAME")
     app.config["MONGO_URI"] = os.environ.get("MONGO_URI")
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY")
+    # Connection pool: keep MONGO_MAX_POOL_SIZE at or above the threads per worker
+    app.config["MONGO_MAX_POOL_SIZE"] = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+    app.config["MONGO_MIN_POOL_SIZE"] = int(os.environ.get("MONGO_MIN_POOL_SIZE", 2))
+    app.config["MONGO_WAIT_QUEUE_TIMEOUT_MS"] = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+    app.config["MONGO_SERVER_SELECTION_TIMEOUT_MS"] = int(
+        os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    app.config["MONGO_COMPRESSORS"] = os.environ.get("MONGO_COMPRESSORS", "zlib")
+    app.config["LISTING_READ_PREFERENCE"] = os.environ.get("LISTING_READ_PREFERENCE", "primary")
+    app.config["BCRYPT_LOG_ROUNDS"] = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    app.config["MEDIA_BACKEND"] = os.environ.get("MEDIA_BACKEND", "gridfs")
+    # Per-file and per-request upload limits; bigger uploads get a 413
+    app.config["MAX_UPLOAD_SIZE"] = int(os.environ.get("MAX_UPLOAD_SIZE", 10 * 1024 * 1024))
+    app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_CONTENT_LENGTH", 32 * 1024 * 1024))
+    app.config["GEOCODER"] = os.environ.get("GEOCODER", "google")
+    app.config["CHECK_INDEXES"] = os.environ.get("CHECK_INDEXES", "True") == "True"
+    app.config["DEALS_PAGE_SIZE"] = int(os.environ.get("DEALS_PAGE_SIZE", 20))
+    app.config["CATEGORY_PAGE_SIZE"] = int(os.environ.get("CATEGORY_PAGE_SIZE", 20))
+    app.config["SEARCH_PAGE_SIZE"] = int(os.environ.get("SEARCH_PAGE_SIZE", 20))
+    app.config["NEARBY_PAGE_SIZE"] = int(os.environ.get("NEARBY_PAGE_SIZE", 20))
+    app.config["NEARBY_MAX_RADIUS_KM"] = float(os.environ.get("NEARBY_MAX_RADIUS_KM", 50))
+    app.config["REVIEWS_PAGE_SIZE"] = int(os.environ.get("REVIEWS_PAGE_SIZE", 10))
+    app.config["HOME_DEALS_SIZE"] = int(os.environ.get("HOME_DEALS_SIZE", 4))
+    # Background pool: tasks waiting beyond the queue size block the request queuing them
+    app.config["BACKGROUND_WORKERS"] = int(os.environ.get("BACKGROUND_WORKERS", 2))
+    app.config["BACKGROUND_QUEUE_SIZE"] = int(os.environ.get("BACKGROUND_QUEUE_SIZE", 100))
+    app.config["DELETE_BATCH_SIZE"] = int(os.environ.get("DELETE_BATCH_SIZE", 500))
+    app.config["MAX_PAGE_SIZE"] = int(os.environ.get("MAX_PAGE_SIZE", 50))
+    # An lru cache is per process and only evicts pages in the worker that
+    # made the write, so several workers share one through Redis when it exists
+    cache_redis_url = os.environ.get("CACHE_REDIS_URL") or os.environ.get("REDIS_URL")
+    shared_cache = cache_redis_url and int(os.environ.get("WEB_CONCURRENCY", 1)) > 1
+    app.config["CACHE_BACKEND"] = os.environ.get("CACHE_BACKEND", "redis" if shared_cache else "lru")
+    app.config["CACHE_REDIS_URL"] = cache_redis_url or "redis://localhost:6379/0"
+    app.config["CONDITIONAL_REQUESTS"] = os.environ.get("CONDITIONAL_REQUESTS", "True") == "True"
+    app.config["ETAG_SALT"] = os.environ.get("ETAG_SALT")
+    app.config["REQUEST_METRICS"] = os.environ.get("REQUEST_METRICS", "True") == "True"
+    app.config["SERVER_TIMING"] = os.environ.get("SERVER_TIMING", "True") == "True"
+    # /metrics is a 404 unless the scraper sends this token or comes from an allowed address
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    app.config["METRICS_ALLOWED_IPS"] = [
+        ip.strip() for ip in os.environ.get("METRICS_ALLOWED_IPS", "").split(",") if ip.strip()]
+    app.config["QUERY_BUDGETS"] = os.environ.get("QUERY_BUDGETS", "off")
+    # Profile MongoDB commands slower than this; "off" (default) disables the profiler
+    slow_query_ms = os.environ.get("SLOW_QUERY_MS", "off")
+    app.config["SLOW_QUERY_MS"] = None if slow_query_ms == "off" else float(slow_query_ms)
+    app.config["SLOW_QUERY_SINK"] = os.environ.get("SLOW_QUERY_SINK", "collection")
+    app.config["SLOW_QUERY_FILE"] = os.environ.get("SLOW_QUERY_FILE", "slow_queries.log")
 
-    mongo.init_app(app)
+    # Let tests override any setting, e.g. GEOCODER=StaticGeocoder(...)
+    if test_config:
+        app.config.update(test_config)
+
+    mongo.init_app(app, **client_options(
+        app.config, [pool_metrics, request_metrics.listener, query_budgets.listener,
+                     slow_queries.listener]))
     bcrypt.init_app(app)
+    passwords.init_app(app)
+    media.init_app(app)
+    images.init_app(app)
+    tasks.init_app(app)
+    geocoding.init_app(app)
+    response_cache.init_app(app)
+    content_versions.init_app(app)
+    request_metrics.init_app(app)
+    query_budgets.init_app(app)
+    slow_queries.init_app(app)
 
     app.register_blueprint(main)
+    app.cli.add_command(media_cli)
+    app.cli.add_command(geocode_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(deals_cli)
+    app.cli.add_command(reviews_cli)
+    app.cli.add_command(summary_cli)
+    app.cli.add_command(cascade_cli)
+    app.cli.add_command(slow_queries_cli)
+    app.cli.add_command(passwords_cli)
+
+    # Warn about missing indexes rather than silently scanning collections
+    if app.config["CHECK_INDEXES"]:
+        check_indexes(app)
 
     # Make API key available globally in templates
     @app.context_processor
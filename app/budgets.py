@@ -0,0 +1,142 @@
+import logging
+from collections import Counter
+
+from bson import json_util
+from flask import current_app, g, has_request_context, request
+from pymongo import monitoring
+
+
+logger = logging.getLogger(__name__)
+
+# Command fields that change between otherwise identical queries.
+VOLATILE_FIELDS = {"lsid", "txnNumber", "$clusterTime", "$readPreference", "$db",
+                   "signature", "autocommit", "startTransaction"}
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """
+    Raised in "raise" mode when a request sends more MongoDB commands than
+    its route's budget, or sends the same query twice.
+    """
+
+
+def query_budget(limit):
+    """
+    Declares the most MongoDB commands one request to a route may send.
+
+    Usage:
+        @main.route("/deals")
+        @query_budget(2)
+        def deals():
+            ...
+    """
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+
+def fingerprint(event):
+    """Identifies a command by everything but its session and cluster fields."""
+    command = {key: value for key, value in event.command.items()
+               if key not in VOLATILE_FIELDS}
+    return json_util.dumps(command, sort_keys=True)
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """
+    Notes every command a request sends, on the thread that sends it.
+
+    Commands on the GridFS media bucket are left out: storing or streaming
+    an image takes one command per 255KB chunk, so they scale with the
+    file rather than with what the route queries.
+    """
+
+    def __init__(self):
+        self.media_prefix = "media."
+
+    def started(self, event):
+        if has_request_context() and "query_log" in g:
+            # The first field of a command names its collection
+            target = next(iter(event.command.values()), None)
+            if isinstance(target, str) and target.startswith(self.media_prefix):
+                return
+            g.query_log.append(fingerprint(event))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class QueryBudgets:
+    """
+    Flask extension enforcing the query budgets routes declare with
+    query_budget().
+
+    After each request it checks how many commands the request sent and
+    whether any was sent twice; the identity map and the profile
+    aggregation exist to avoid exactly that. The recorder has to be given
+    to the MongoClient, see client_options().
+
+    Config:
+        QUERY_BUDGETS: "off" (default), "log" to log a warning for each
+            offending request, or "raise" to fail it with
+            QueryBudgetExceeded, for tests and development.
+    """
+
+    def __init__(self, app=None):
+        self.listener = QueryRecorder()
+        self.mode = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("QUERY_BUDGETS", "off")
+        self.mode = app.config["QUERY_BUDGETS"]
+        self.listener.media_prefix = app.config.get("MEDIA_BUCKET", "media") + "."
+        if self.mode not in ("off", "log", "raise"):
+            raise ValueError(f"Unknown QUERY_BUDGETS mode: {self.mode}")
+        app.extensions["query_budgets"] = self
+        if self.mode == "off":
+            return
+
+        app.before_request(self._start)
+        app.after_request(self._check)
+
+    def _start(self):
+        g.query_log = []
+
+    def problems(self, queries, budget):
+        """
+        Lists what is wrong with the commands one request sent.
+
+        Args:
+            queries (list): Command fingerprints, in the order sent.
+            budget (int or None): The route's budget, if it declares one.
+
+        Returns:
+            list: One message per problem.
+        """
+        problems = []
+        if budget is not None and len(queries) > budget:
+            problems.append(f"sent {len(queries)} MongoDB commands, budget is {budget}")
+        for query, count in Counter(queries).items():
+            if count > 1:
+                problems.append(f"sent {count} times: {query}")
+        return problems
+
+    def _check(self, response):
+        queries = g.pop("query_log", None)
+        if queries is None:
+            return response
+
+        view = current_app.view_functions.get(request.endpoint)
+        problems = self.problems(queries, getattr(view, "query_budget", None))
+        if problems:
+            message = f"{request.method} {request.path} ({request.endpoint}) " + "; ".join(problems)
+            if self.mode == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning("Query budget: %s", message)
+        return response
@@ -0,0 +1,300 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, g, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+from .signals import content_changed
+
+
+class LRUBackend:
+    """
+    In-process cache holding at most max_entries responses, evicting the
+    least recently used first. Each worker process has its own copy.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, tags):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, time.monotonic() + timeout, tags)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, tags):
+        with self.lock:
+            for tag in tags:
+                for key in self.tags.pop(tag, set()):
+                    self._remove(key)
+
+    def delete(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+    def _remove(self, key):
+        _, _, tags = self.entries.pop(key, (None, None, ()))
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+class RedisBackend:
+    """
+    Cache shared by every worker through Redis (or anything speaking its
+    protocol). Each tag is a Redis set of the keys rendered from it.
+    """
+
+    def __init__(self, url, prefix="msp3:cache:"):
+        # Optional dependency, only needed when CACHE_BACKEND is "redis"
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, timeout, tags):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, value, ex=timeout)
+        for tag in tags:
+            pipe.sadd(self.prefix + "tag:" + tag, self.prefix + key)
+            pipe.expire(self.prefix + "tag:" + tag, timeout)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            keys = self.client.smembers(tag_key)
+            self.client.delete(tag_key, *keys)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class ResponseCache:
+    """
+    Flask extension caching whole responses for anonymous visitors.
+
+    Pages opt in with the cached() decorator and name the data they render
+    as tags. Writes call signals.notify_changed(), which evicts exactly the
+    pages carrying those tags.
+
+    Config:
+        CACHE_BACKEND: "lru" (default), "redis", or "null" to disable.
+        CACHE_REDIS_URL: connection URL for the redis backend.
+        CACHE_DEFAULT_TIMEOUT: seconds a page may be served from cache.
+        CACHE_MAX_ENTRIES: size of the lru backend.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.timeout = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_BACKEND", "lru")
+        app.config.setdefault("CACHE_REDIS_URL", "redis://localhost:6379/0")
+        app.config.setdefault("CACHE_DEFAULT_TIMEOUT", 60)
+        app.config.setdefault("CACHE_MAX_ENTRIES", 512)
+
+        backend = app.config["CACHE_BACKEND"]
+        if backend == "lru":
+            self.backend = LRUBackend(app.config["CACHE_MAX_ENTRIES"])
+        elif backend == "redis":
+            self.backend = RedisBackend(app.config["CACHE_REDIS_URL"])
+        elif backend == "null":
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+        self.timeout = app.config["CACHE_DEFAULT_TIMEOUT"]
+
+        content_changed.connect(self._on_content_changed, sender=app, weak=False)
+        app.extensions["response_cache"] = self
+
+    def _on_content_changed(self, sender, tags):
+        if self.backend is not None:
+            self.backend.invalidate(tags)
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            return None
+        data = json.loads(value)
+        response = Response(
+            base64.b64decode(data["body"]),
+            status=data["status"],
+            headers=data["headers"]
+        )
+        response.headers["X-Cache"] = "HIT"
+        return response
+
+    def set(self, key, response, tags, timeout=None):
+        if self.backend is None:
+            return
+        value = json.dumps({
+            "status": response.status_code,
+            "headers": [
+                (name, value) for name, value in response.headers
+                if name.lower() != "content-length"
+            ],
+            "body": base64.b64encode(response.get_data()).decode("ascii"),
+        })
+        self.backend.set(key, value, timeout or self.timeout, tags)
+
+    def delete(self, key):
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def cache_key():
+    """Keys a page by its path plus its sorted query arguments."""
+    args = sorted(request.args.items(multi=True))
+    return f"{request.path}?{urlencode(args)}"
+
+
+def is_cacheable_request():
+    """
+    Only anonymous GETs with nothing pending in the session are cached: the
+    navigation differs for logged in users and flash messages are one-off.
+    """
+    return (
+        request.method == "GET"
+        and "user" not in session
+        and "_flashes" not in session
+    )
+
+
+def not_modified(etag, last_modified):
+    """An empty 304 carrying the page's validators."""
+    response = Response(status=304)
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Adds the validators to a full response. Browsers must check back with
+    them before reusing the page, and only keep pages for logged in users
+    to themselves.
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.cache_control.private = "user" in session or None
+    response.vary.add("Cookie")
+
+
+def cached(tags, timeout=None):
+    """
+    Caches a view's response for anonymous visitors, and answers
+    conditional GETs from everyone.
+
+    The page's ETag and Last-Modified come from the versions of its tags
+    (see versions.ContentVersions), read on every request. When the
+    browser already holds the current page it gets a 304 before the view
+    runs. A cached page is only served while its stored ETag is still the
+    current one; otherwise it was rendered from older data (e.g. by a
+    worker that never saw the write) and is dropped and rendered again.
+    A page read from a secondary (see repository.listing()) is neither
+    cached nor given validators.
+
+    Args:
+        tags (callable): Returns the tags for the current request, e.g.
+            lambda: ["deals"]; any write notifying one of them evicts the page.
+        timeout (int): Seconds to keep the page; defaults to CACHE_DEFAULT_TIMEOUT.
+
+    Usage:
+        @main.route("/deals")
+        @cached(lambda: ["deals"])
+        def deals():
+            ...
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            from .extensions import content_versions, mongo, response_cache
+
+            # Flash messages are one-off, so those pages are never reused
+            if request.method != "GET" or "_flashes" in session:
+                return f(*args, **kwargs)
+
+            key = cache_key()
+            page_tags = tags()
+            cacheable = is_cacheable_request()
+
+            validators = None
+            if content_versions.enabled:
+                etag, last_modified = validators = content_versions.validators(
+                    mongo.db, page_tags, [key, session.get("user")])
+                if not is_resource_modified(request.environ, etag, last_modified=last_modified):
+                    return not_modified(etag, last_modified)
+
+            if cacheable:
+                response = response_cache.get(key)
+                if response is not None:
+                    if validators is None or response.get_etag()[0] == validators[0]:
+                        return response
+                    response_cache.delete(key)
+
+            response = make_response(f(*args, **kwargs))
+            # A view that flashed and rendered the message in one go changed the session
+            if response.status_code != 200 or session.modified:
+                return response
+            # Read from a secondary, so possibly older than the validators
+            if g.pop("stale_read", False):
+                return response
+            if validators is not None:
+                set_validators(response, *validators)
+            if cacheable and "Set-Cookie" not in response.headers:
+                response_cache.set(key, response, page_tags, timeout)
+                response.headers["X-Cache"] = "MISS"
+            return response
+        return decorated_function
+    return decorator
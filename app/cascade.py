@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+import click
+from bson import ObjectId
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from .categories import CATEGORIES
+from .reviews import refresh_review_summary
+from .signals import category_tag, notify_changed
+from .summary import count_business, rebuild_home_summary, refresh_latest_deals
+
+
+# Documents pointing at a parent that no longer exists, as
+# (collection, field, parent collection, parent field). Businesses come
+# first so the reviews and deals of a swept business go in the same run.
+ORPHAN_RULES = [
+    ("business", "owner_id", "users", "_id"),
+    ("reviews", "business_id", "business", "owner_id"),
+    ("reviews", "user_id", "users", "_id"),
+    ("deals", "business_owner", "business", "owner_id"),
+]
+
+
+def delete_in_batches(collection, query, batch_size):
+    """
+    Deletes everything matching a query a batch of _ids at a time, so no
+    single delete holds the collection for long.
+
+    Returns:
+        int: How many documents were deleted.
+    """
+    deleted = 0
+    while True:
+        ids = [doc["_id"] for doc in collection.find(query, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            return deleted
+        deleted += collection.delete_many({"_id": {"$in": ids}}).deleted_count
+
+
+def delete_later(db, kind, user_id, business=None):
+    """
+    Deletes a business ("business") or a whole account ("account") as far
+    as anyone can see, and queues removing what hangs off it.
+
+    The business and user documents go at once; the job recorded in
+    "deletion_jobs" then removes their reviews and deals on the
+    background pool. Every step can safely run again, so a job cut short
+    by a restart is finished by the scheduled "flask cascade reconcile".
+
+    Args:
+        db (Database): The database.
+        kind (str): "business" or "account".
+        user_id (ObjectId): The owner's user _id, which reviews and deals
+            are keyed by.
+        business (dict): Their business, loaded with BUSINESS_OWNER, if any.
+
+    Returns:
+        Future: The background job.
+    """
+    from .extensions import tasks
+
+    job = {
+        "_id": ObjectId(),
+        "kind": kind,
+        "user_id": user_id,
+        "business_id": business["_id"] if business else None,
+        "category": business.get("category") if business else None,
+        "created_at": datetime.now(timezone.utc),
+    }
+    db.deletion_jobs.insert_one(job)
+    _remove_primary(db, job)
+    return tasks.submit(_run_in_background, current_app._get_current_object(), job)
+
+
+def _remove_primary(db, job):
+    if job["business_id"] and db.business.delete_one({"_id": job["business_id"]}).deleted_count:
+        count_business(db, job["category"], -1)
+    if job["kind"] == "account":
+        db.users.delete_one({"_id": job["user_id"]})
+
+
+def _run_in_background(app, job):
+    from .extensions import mongo
+
+    with app.app_context():
+        return run_deletion(mongo.db, job)
+
+
+def run_deletion(db, job):
+    """
+    Carries out a deletion job: removes the reviews and deals of the
+    deleted business and, for an account, the reviews its owner wrote,
+    then drops the job.
+
+    Reviews and deals newer than the job are kept, in case the owner has
+    already started a new business.
+
+    Returns:
+        dict: Documents deleted per kind.
+    """
+    batch_size = current_app.config["DELETE_BATCH_SIZE"]
+    owner, cutoff = job["user_id"], {"$lt": job["_id"]}
+    deleted = {}
+
+    _remove_primary(db, job)
+    if job["business_id"] or job["kind"] == "account":
+        deleted["reviews"] = delete_in_batches(
+            db.reviews, {"business_id": owner, "_id": cutoff}, batch_size)
+        deleted["deals"] = delete_in_batches(
+            db.deals, {"business_owner": owner, "_id": cutoff}, batch_size)
+
+    if job["kind"] == "account":
+        reviewed = db.reviews.distinct("business_id", {"user_id": owner})
+        deleted["written reviews"] = delete_in_batches(
+            db.reviews, {"user_id": owner}, batch_size)
+        for business_id in reviewed:
+            refresh_review_summary(db, business_id)
+
+    if deleted.get("deals"):
+        refresh_latest_deals(db)
+    notify_changed(category_tag(job["category"]), "deals", "home", "search")
+    db.deletion_jobs.delete_one({"_id": job["_id"]})
+    return deleted
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def sweep_orphans(db, collection, field, parent, parent_field, batch_size,
+                  dry_run=False):
+    """
+    Deletes the documents in a collection whose parent is gone, e.g.
+    reviews of a business that no longer exists. With dry_run, only
+    reports them.
+
+    Returns:
+        list: The parent keys that were missing.
+    """
+    keys = (group["_id"] for group in db[collection].aggregate(
+        [{"$group": {"_id": f"${field}"}}], allowDiskUse=True))
+    missing = []
+    for chunk in _chunks(keys, batch_size):
+        existing = set(db[parent].distinct(parent_field, {parent_field: {"$in": chunk}}))
+        orphaned = [key for key in chunk if key not in existing]
+        if orphaned and not dry_run:
+            delete_in_batches(db[collection], {field: {"$in": orphaned}}, batch_size)
+        missing.extend(orphaned)
+    return missing
+
+
+cascade_cli = AppGroup("cascade", help="Finish deletions and remove orphans.")
+
+
+@cascade_cli.command("reconcile")
+@click.option("--stale-minutes", default=10, show_default=True,
+              help="Rerun deletion jobs queued at least this long ago.")
+@click.option("--dry-run", is_flag=True, help="Report orphans without deleting them.")
+@with_appcontext
+def reconcile_command(stale_minutes, dry_run):
+    """
+    Reruns deletion jobs that never finished, then sweeps reviews, deals
+    and businesses left pointing at something that no longer exists.
+    """
+    from .extensions import mongo
+
+    db = mongo.db
+    batch_size = current_app.config["DELETE_BATCH_SIZE"]
+
+    stale = datetime.now(timezone.utc) - timedelta(minutes=stale_minutes)
+    for job in list(db.deletion_jobs.find({"created_at": {"$lt": stale}})):
+        if dry_run:
+            click.echo(f"Unfinished {job['kind']} deletion {job['_id']}")
+            continue
+        deleted = run_deletion(db, job)
+        click.echo(f"Finished {job['kind']} deletion {job['_id']}: {deleted}")
+
+    swept = 0
+    for collection, field, parent, parent_field in ORPHAN_RULES:
+        missing = sweep_orphans(db, collection, field, parent, parent_field,
+                                batch_size, dry_run)
+        click.echo(f"{collection}.{field}: {len(missing)} missing {parent}")
+        if dry_run:
+            continue
+        swept += len(missing)
+        if collection == "reviews" and field == "user_id" and missing:
+            # Summaries may still show reviews by the deleted users
+            for business in db.business.find(
+                    {"review_summary.latest.user_id": {"$in": missing}}, {"owner_id": 1}):
+                refresh_review_summary(db, business["owner_id"])
+
+    if swept:
+        rebuild_home_summary(db)
+        notify_changed("deals", "home", "search",
+                       *(category_tag(value) for value, _ in CATEGORIES))
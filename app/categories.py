@@ -0,0 +1,12 @@
+# The business categories, as (stored value, display name) pairs. The value
+# is what business documents and ?category= links carry.
+CATEGORIES = [
+    ("cleaning services", "Cleaning Services"),
+    ("gardening", "Gardening & Landscape"),
+    ("hair and beauty", "Hair & Beauty"),
+    ("child care and education", "Child Care & Education"),
+    ("building and trades", "Building & Trades"),
+    ("health fitness and sport", "Health, Fitness & Sport"),
+    ("retail and crafts", "Retail & Crafts"),
+    ("professional services", "Professional Services"),
+]
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask.cli import AppGroup, with_appcontext
+
+
+# The create form's datepicker sends dd-mm-yyyy; the edit form's native
+# date input sends yyyy-mm-dd.
+DATE_FORMATS = ("%d-%m-%Y", "%Y-%m-%d")
+
+
+def parse_expiry(value):
+    """
+    Turns the expiry date typed into a deal form into the moment it expires.
+
+    A deal stays live for the whole of its expiry day, so the result is
+    midnight (UTC) at the end of that day.
+
+    Args:
+        value (str): The date from the form.
+
+    Returns:
+        datetime or None: When the deal expires, or None if the date is invalid.
+    """
+    if not value:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            day = datetime.strptime(value.strip(), date_format)
+        except ValueError:
+            continue
+        return day.replace(tzinfo=timezone.utc) + timedelta(days=1)
+    return None
+
+
+def is_live(expires_at):
+    """Checks an expiry moment is still in the future."""
+    return expires_at is not None and expires_at > datetime.now(timezone.utc)
+
+
+def active_deals_query():
+    """The filter matching deals that have not expired yet."""
+    return {"expires_at": {"$gt": datetime.now(timezone.utc)}}
+
+
+deals_cli = AppGroup("deals", help="Manage deals.")
+
+
+@deals_cli.command("backfill-expiry")
+@with_appcontext
+def backfill_expiry_command():
+    """
+    Parses expire-date into expires_at for deals saved before it existed.
+
+    Once set, the TTL index removes each deal when it expires. Deals whose
+    date cannot be parsed are reported and left alone.
+    """
+    from .extensions import mongo
+
+    updated = 0
+    for deal in mongo.db.deals.find(
+            {"expires_at": {"$exists": False}}, {"expire-date": 1}):
+        expires_at = parse_expiry(deal.get("expire-date"))
+        if expires_at is None:
+            click.echo(f"Could not parse expire-date {deal.get('expire-date')!r} "
+                       f"on deal {deal['_id']}")
+            continue
+        mongo.db.deals.update_one(
+            {"_id": deal["_id"]}, {"$set": {"expires_at": expires_at}})
+        updated += 1
+    click.echo(f"Updated {updated} deals")
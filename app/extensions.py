@@ -1,6 +1,28 @@
 from flask_pymongo import PyMongo
 from flask_bcrypt import Bcrypt
+from .media import MediaStore
+from .geocode import GeocodeCache
+from .images import ImagePipeline
+from .tasks import BackgroundTasks
+from .cache import ResponseCache
+from .versions import ContentVersions
+from .pool import PoolMetrics
+from .passwords import PasswordHasher
+from .timing import RequestMetrics
+from .budgets import QueryBudgets
+from .slowlog import SlowQueryProfiler
 
 
 mongo = PyMongo()
-bcrypt = Bcrypt()
\ No newline at end of file
+bcrypt = Bcrypt()
+media = MediaStore()
+images = ImagePipeline()
+tasks = BackgroundTasks()
+geocoding = GeocodeCache()
+response_cache = ResponseCache()
+content_versions = ContentVersions()
+pool_metrics = PoolMetrics()
+passwords = PasswordHasher()
+request_metrics = RequestMetrics()
+query_budgets = QueryBudgets()
+slow_queries = SlowQueryProfiler()
@@ -0,0 +1,261 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+
+import click
+import requests
+from flask.cli import AppGroup, with_appcontext
+
+from .timing import timed_http
+
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodeError(Exception):
+    """Raised when a geocoder cannot give a definite answer for an address."""
+
+
+def normalize_address(address):
+    """
+    Normalizes an address so trivially different spellings share a cache entry.
+
+    Args:
+        address (str): The address as typed by the user.
+
+    Returns:
+        str: The address lower-cased, with punctuation and repeated spaces removed.
+    """
+    address = re.sub(r"[^\w\s]", " ", address.lower())
+    return " ".join(address.split())
+
+
+class GoogleGeocoder:
+    """
+    Looks addresses up with the Google Geocoding API.
+    """
+
+    URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+    def __init__(self, api_key, timeout=3.0):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def geocode(self, address):
+        """
+        Returns (lat, lng) for an address, or None if Google has no match.
+
+        Raises:
+            GeocodeError: On network errors, timeouts, any other API status
+                or a response missing the fields it should have.
+        """
+        try:
+            with timed_http():
+                response = self.session.get(
+                    self.URL,
+                    params={"address": address, "key": self.api_key},
+                    timeout=self.timeout
+                ).json()
+        except (requests.RequestException, ValueError) as e:
+            raise GeocodeError(str(e)) from e
+
+        status = response.get("status") if isinstance(response, dict) else None
+        if status == "OK":
+            try:
+                location = response["results"][0]["geometry"]["location"]
+                return float(location["lat"]), float(location["lng"])
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                raise GeocodeError(f"Unexpected response: {e!r}") from e
+        if status == "ZERO_RESULTS":
+            return None
+        raise GeocodeError(status or "Response has no status")
+
+
+class StaticGeocoder:
+    """
+    Answers from a fixed mapping of address to (lat, lng), for tests and
+    local development without network access.
+    """
+
+    def __init__(self, locations=None):
+        self.locations = {
+            normalize_address(address): tuple(coordinates)
+            for address, coordinates in (locations or {}).items()
+        }
+
+    def geocode(self, address):
+        return self.locations.get(normalize_address(address))
+
+
+class GeocodeCache:
+    """
+    Flask extension putting a shared Mongo-backed cache in front of a geocoder.
+
+    Entries live in the "geocode_cache" collection keyed by the normalized
+    address. Misses are cached too (for a shorter time) so an unknown
+    address does not hit the API on every save.
+
+    Config:
+        GEOCODER: "google", "static", or any object with a geocode(address) method.
+        GEOCODE_FIXTURES: address to (lat, lng) mapping used by "static".
+        GEOCODE_TIMEOUT: seconds to wait for the Google API.
+        GEOCODE_CACHE_TTL / GEOCODE_NEGATIVE_TTL: seconds to keep hits / misses.
+    """
+
+    def __init__(self, app=None):
+        self.geocoder = None
+        self.ttl = None
+        self.negative_ttl = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("GEOCODER", "google")
+        app.config.setdefault("GEOCODE_FIXTURES", {})
+        app.config.setdefault("GEOCODE_TIMEOUT", 3.0)
+        app.config.setdefault("GEOCODE_CACHE_TTL", 30 * 24 * 3600)
+        app.config.setdefault("GEOCODE_NEGATIVE_TTL", 24 * 3600)
+
+        geocoder = app.config["GEOCODER"]
+        if geocoder == "google":
+            geocoder = GoogleGeocoder(
+                app.config["GOOGLE_MAPS_API_KEY"],
+                timeout=app.config["GEOCODE_TIMEOUT"]
+            )
+        elif geocoder == "static":
+            geocoder = StaticGeocoder(app.config["GEOCODE_FIXTURES"])
+        self.geocoder = geocoder
+        self.ttl = timedelta(seconds=app.config["GEOCODE_CACHE_TTL"])
+        self.negative_ttl = timedelta(seconds=app.config["GEOCODE_NEGATIVE_TTL"])
+        app.extensions["geocode"] = self
+
+    @property
+    def collection(self):
+        from .extensions import mongo
+        return mongo.db.geocode_cache
+
+    def cached(self, address):
+        """
+        Reads an address from the cache only, never from the network.
+
+        Returns:
+            dict or None: The cache entry if there is a live one.
+        """
+        return self.collection.find_one({
+            "_id": normalize_address(address),
+            "expires_at": {"$gt": datetime.now(timezone.utc)}
+        })
+
+    def lookup(self, address):
+        """
+        Geocodes an address, going to the geocoder only on a cache miss.
+
+        Args:
+            address (str): The address to look up.
+
+        Returns:
+            tuple: (lat, lng), or (None, None) if the address is unknown or
+            the geocoder is unavailable.
+        """
+        if not address or not normalize_address(address):
+            return None, None
+
+        entry = self.cached(address)
+        if entry is None:
+            try:
+                coordinates = self.geocoder.geocode(address)
+            except GeocodeError as e:
+                # Transient failures are not cached, so the next save retries
+                logger.warning("Geocoding %r failed: %s", address, e)
+                return None, None
+            entry = self._store(address, coordinates)
+
+        if not entry["found"]:
+            return None, None
+        return entry["lat"], entry["lng"]
+
+    def _store(self, address, coordinates):
+        found = coordinates is not None
+        entry = {
+            "found": found,
+            "lat": coordinates[0] if found else None,
+            "lng": coordinates[1] if found else None,
+            "expires_at": datetime.now(timezone.utc) + (
+                self.ttl if found else self.negative_ttl),
+        }
+        self.collection.update_one(
+            {"_id": normalize_address(address)},
+            {"$set": entry},
+            upsert=True
+        )
+        return entry
+
+
+def coordinates_for(location):
+    """
+    Builds the coordinates stored on a business document for its location.
+
+    Args:
+        location (str): The business location as entered.
+
+    Returns:
+        dict or None: {"lat": ..., "lng": ...}, or None if it could not be geocoded.
+    """
+    from .extensions import geocoding
+
+    lat, lng = geocoding.lookup(location)
+    if lat is None:
+        return None
+    return {"lat": lat, "lng": lng}
+
+
+def geo_point(coordinates):
+    """
+    Turns stored {"lat", "lng"} coordinates into the GeoJSON point the
+    2dsphere index and /nearby query use. GeoJSON puts longitude first.
+
+    Args:
+        coordinates (dict or None): As returned by coordinates_for().
+
+    Returns:
+        dict or None: {"type": "Point", "coordinates": [lng, lat]}.
+    """
+    if not coordinates:
+        return None
+    return {"type": "Point", "coordinates": [coordinates["lng"], coordinates["lat"]]}
+
+
+geocode_cli = AppGroup("geocode", help="Manage stored business coordinates.")
+
+
+@geocode_cli.command("backfill")
+@with_appcontext
+def backfill_command():
+    """
+    Geocodes every business that has a location but no stored coordinates,
+    and gives every business with coordinates its GeoJSON point.
+    """
+    from .extensions import mongo
+
+    updated = 0
+    for business in mongo.db.business.find(
+            {"location": {"$nin": [None, ""]}, "coordinates": None},
+            {"location": 1}):
+        coordinates = coordinates_for(business["location"])
+        if coordinates is None:
+            continue
+        mongo.db.business.update_one(
+            {"_id": business["_id"]},
+            {"$set": {"coordinates": coordinates, "point": geo_point(coordinates)}})
+        updated += 1
+    click.echo(f"Geocoded {updated} businesses")
+
+    pointed = 0
+    for business in mongo.db.business.find(
+            {"coordinates": {"$ne": None}, "point": None}, {"coordinates": 1}):
+        mongo.db.business.update_one(
+            {"_id": business["_id"]},
+            {"$set": {"point": geo_point(business["coordinates"])}})
+        pointed += 1
+    click.echo(f"Added points to {pointed} businesses")
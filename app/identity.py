@@ -0,0 +1,142 @@
+import copy
+
+from flask import g, has_request_context
+
+
+class IdentityMap:
+    """
+    Documents already loaded during the current request, so asking for the
+    same user or business twice costs one query.
+
+    Entries are keyed by (collection, field, value) and remember the
+    projection they were loaded with; a later lookup is served from an
+    entry whose projection covers the one asked for. Misses (None) are
+    remembered too.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, collection, field, value, projection):
+        """
+        Finds a loaded document covering the projection.
+
+        Returns:
+            tuple: (True, document) on a hit, (False, None) on a miss.
+        """
+        for loaded, document in self.entries.get((collection, field, value), []):
+            if covers(loaded, projection):
+                return True, copy.deepcopy(document)
+        return False, None
+
+    def add(self, collection, field, value, projection, document):
+        """Remembers a document (or None) loaded with the given projection."""
+        self.entries.setdefault((collection, field, value), []).append(
+            (projection, copy.deepcopy(document)))
+
+    def forget(self, *collections):
+        """Drops every entry for the given collections, or all of them."""
+        if not collections:
+            self.entries.clear()
+            return
+        for key in [key for key in self.entries if key[0] in collections]:
+            del self.entries[key]
+
+
+def _is_exclusion(projection):
+    return any(value == 0 for field, value in projection.items() if field != "_id")
+
+
+def _overlaps(a, b):
+    """True if one dotted field path is the other or contains it."""
+    return a == b or a.startswith(b + ".") or b.startswith(a + ".")
+
+
+def _includes(projection, field, value):
+    if field == "_id":
+        return projection.get("_id", 1) != 0
+    for loaded, loaded_value in projection.items():
+        if loaded_value in (1, True) and (field == loaded or field.startswith(loaded + ".")):
+            return True
+        # Operators such as $slice only cover the very same operator
+        if loaded == field and isinstance(value, dict):
+            return loaded_value == value
+    return False
+
+
+def covers(loaded, wanted):
+    """
+    Works out whether a document loaded with one projection has every field
+    another projection asks for.
+
+    Args:
+        loaded (dict or None): The projection the document was loaded with;
+            None means the whole document.
+        wanted (dict or None): The projection being asked for.
+
+    Returns:
+        bool: True if the loaded document can stand in for the query.
+    """
+    if loaded is None:
+        return True
+    if wanted is None:
+        return False
+    if _is_exclusion(loaded):
+        excluded = [field for field, value in loaded.items() if value == 0]
+        if _is_exclusion(wanted):
+            return all(field in wanted for field in excluded)
+        return not any(
+            _overlaps(field, out) for field in wanted for out in excluded)
+    if _is_exclusion(wanted):
+        return False
+    return all(
+        _includes(loaded, field, value)
+        for field, value in wanted.items() if value not in (0, False))
+
+
+def identity_map():
+    """Returns the identity map for the current request."""
+    if "identity_map" not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
+
+
+def remember(collection, field, value, projection, loader):
+    """
+    Loads a document at most once per request.
+
+    Outside a request (CLI commands, background tasks) the loader is
+    always called.
+
+    Args:
+        collection (str): The collection the document lives in.
+        field (str): The field it is looked up by, e.g. "username".
+        value: The value of that field.
+        projection (dict or None): The fields the caller needs.
+        loader (callable): Runs the query on a miss.
+
+    Returns:
+        dict or None: The document.
+    """
+    if not has_request_context():
+        return loader()
+
+    found, document = identity_map().get(collection, field, value, projection)
+    if found:
+        return document
+    document = loader()
+    identity_map().add(collection, field, value, projection, document)
+    return document
+
+
+def forget(*collections):
+    """
+    Drops what this request has loaded from the given collections, so
+    lookups after a write see the new data.
+
+    Usage:
+        mongo.db.users.update_one(...)
+        forget("users")
+    """
+    if has_request_context() and "identity_map" in g:
+        g.identity_map.forget(*collections)
@@ -0,0 +1,134 @@
+import io
+import logging
+
+from PIL import Image, ImageOps, features
+
+
+logger = logging.getLogger(__name__)
+
+# Variant name and maximum width, largest first so each one can be
+# resized from the previous instead of from the original.
+VARIANTS = (
+    ("full", 1200),
+    ("card", 480),
+    ("thumb", 160),
+)
+
+VARIANT_WIDTHS = dict(VARIANTS)
+
+# Formats in order of preference; AVIF is dropped if Pillow lacks support.
+FORMATS = ("avif", "webp")
+
+
+def variant_key(digest, variant, fmt):
+    """
+    Builds the media store key for a resized variant of an image.
+
+    Args:
+        digest (str): Digest of the original image.
+        variant (str): One of the names in VARIANTS.
+        fmt (str): Output format, e.g. "webp".
+
+    Returns:
+        str: The key the variant is stored under.
+    """
+    return f"{digest}.{variant}.{fmt}"
+
+
+def _prepare(image):
+    """Applies EXIF orientation, then drops EXIF/XMP and odd colour modes."""
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    image.info.pop("exif", None)
+    image.info.pop("xmp", None)
+    return image
+
+
+def build_variants(store, digest, formats, quality):
+    """
+    Decodes a stored image once and writes every variant in every format.
+
+    - Images are never upscaled; a variant narrower than its target width
+      is saved at the original size.
+    - Variants that already exist are left alone, so this is safe to rerun.
+
+    Args:
+        store: The media store backend holding the original.
+        digest (str): Digest of the original image.
+        formats (iterable): Output formats to produce.
+        quality (int): Encoder quality passed to Pillow.
+
+    Returns:
+        int: The number of variants written.
+    """
+    blob = store.open(digest)
+    if blob is None:
+        return 0
+
+    written = 0
+    with blob, Image.open(blob) as original:
+        image = _prepare(original)
+        for variant, width in VARIANTS:
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                key = variant_key(digest, variant, fmt)
+                if store.exists(key):
+                    continue
+                buffer = io.BytesIO()
+                image.save(buffer, format=fmt.upper(), quality=quality)
+                buffer.seek(0)
+                store.save(key, buffer)
+                written += 1
+    return written
+
+
+def _build_in_background(store, digest, formats, quality):
+    try:
+        build_variants(store, digest, formats, quality)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning("Could not build variants for %s: %s", digest, e)
+
+
+class ImagePipeline:
+    """
+    Flask extension that turns uploads into resized WebP/AVIF variants on
+    the background task pool.
+
+    Config:
+        IMAGE_FORMATS: formats to produce, most preferred first.
+        IMAGE_QUALITY: encoder quality for every variant.
+    """
+
+    def __init__(self, app=None):
+        self.formats = ()
+        self.quality = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("IMAGE_FORMATS", FORMATS)
+        app.config.setdefault("IMAGE_QUALITY", 75)
+        self.formats = tuple(
+            fmt for fmt in app.config["IMAGE_FORMATS"] if features.check(fmt))
+        self.quality = app.config["IMAGE_QUALITY"]
+        app.extensions["images"] = self
+
+    def enqueue(self, digest):
+        """
+        Schedules variant generation for a stored image and returns at once.
+        """
+        from .extensions import media, tasks
+
+        return tasks.submit(
+            _build_in_background, media.backend, digest,
+            self.formats, self.quality)
+
+    def build(self, digest):
+        """Builds the variants for an image on the calling thread."""
+        from .extensions import media
+
+        return build_variants(media.backend, digest, self.formats, self.quality)
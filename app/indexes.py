@@ -0,0 +1,200 @@
+import click
+from flask.cli import AppGroup, with_appcontext
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
+
+
+# Every index the app relies on, by collection. Add new indexes here and
+# run "flask db ensure-indexes"; names are explicit so the startup check
+# can tell what is missing.
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "business": [
+        IndexModel([("owner_id", ASCENDING)], name="owner_id"),
+        IndexModel([("category", ASCENDING), ("_id", ASCENDING)],
+                   name="category_id"),
+        # Serves /nearby; category narrows the $geoNear scan
+        IndexModel([("point", GEOSPHERE), ("category", ASCENDING)],
+                   name="point_2dsphere"),
+        # Serves /search; a collection can only have one text index
+        IndexModel([("company_name", TEXT), ("description", TEXT),
+                    ("location", TEXT)], name="business_text",
+                   weights={"company_name": 10, "location": 3, "description": 1}),
+    ],
+    "reviews": [
+        # Serves the profile page's reviews: newest first per business
+        IndexModel([("business_id", ASCENDING), ("date", DESCENDING),
+                    ("_id", DESCENDING)], name="business_id_date"),
+        # Finds a user's reviews when their name or avatar changes
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+    ],
+    "deals": [
+        IndexModel([("business_owner", ASCENDING)], name="business_owner"),
+        # Deletes each deal once its expiry date has passed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl",
+                   expireAfterSeconds=0),
+        # Serves /deals: live deals, soonest to expire first
+        IndexModel([("expires_at", ASCENDING), ("_id", ASCENDING)],
+                   name="expires_at_id"),
+    ],
+    "geocode_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl",
+                   expireAfterSeconds=0),
+    ],
+}
+
+
+DUPLICATE_KEY = 11000
+
+
+class DuplicateKeys(Exception):
+    """
+    Raised by ensure_indexes() when existing documents stop a unique index
+    from being built. conflicts maps (collection, index name) to the
+    duplicate groups found by duplicate_keys().
+    """
+
+    def __init__(self, conflicts):
+        super().__init__(", ".join(f"{collection}.{name}" for collection, name in conflicts))
+        self.conflicts = conflicts
+
+
+def duplicate_keys(collection, index, limit=20):
+    """
+    Finds documents sharing the key of a unique index.
+
+    Args:
+        collection (Collection): The collection to search.
+        index (IndexModel): The unique index that could not be built.
+        limit (int): How many duplicate keys to return at most.
+
+    Returns:
+        list: (key, _ids) pairs, e.g. ({"email": "a@b.com"}, [id1, id2]).
+    """
+    fields = list(index.document["key"])
+    pipeline = [
+        {"$group": {"_id": {field: f"${field}" for field in fields},
+                    "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return [(group["_id"], group["ids"])
+            for group in collection.aggregate(pipeline, allowDiskUse=True)]
+
+
+def ensure_indexes(db):
+    """
+    Creates every index in the registry. Existing indexes are left alone,
+    so this is safe to run on every deploy.
+
+    When existing documents break a unique index, the collection's other
+    indexes are still created one by one before DuplicateKeys is raised.
+
+    Args:
+        db (Database): The database to create the indexes in.
+
+    Returns:
+        dict: Index names per collection, as reported by the server.
+
+    Raises:
+        DuplicateKeys: If a unique index could not be built.
+    """
+    created, conflicts = {}, {}
+    for collection, indexes in INDEXES.items():
+        try:
+            created[collection] = db[collection].create_indexes(indexes)
+            continue
+        except OperationFailure as e:
+            if e.code != DUPLICATE_KEY:
+                raise
+        created[collection] = []
+        for index in indexes:
+            try:
+                created[collection] += db[collection].create_indexes([index])
+            except OperationFailure as e:
+                if e.code != DUPLICATE_KEY:
+                    raise
+                conflicts[(collection, index.document["name"])] = duplicate_keys(
+                    db[collection], index)
+    if conflicts:
+        raise DuplicateKeys(conflicts)
+    return created
+
+
+def missing_indexes(db):
+    """
+    Lists registry indexes that do not exist yet.
+
+    Args:
+        db (Database): The database to check.
+
+    Returns:
+        list: (collection, index name) pairs that are missing.
+    """
+    missing = []
+    for collection, indexes in INDEXES.items():
+        existing = db[collection].index_information()
+        for index in indexes:
+            name = index.document["name"]
+            if name not in existing:
+                missing.append((collection, name))
+    return missing
+
+
+def check_indexes(app):
+    """
+    Logs a warning at startup for every missing index.
+
+    Connection errors are logged too, but never stop the app from starting.
+    """
+    from .extensions import mongo
+
+    try:
+        missing = missing_indexes(mongo.db)
+    except PyMongoError as e:
+        app.logger.warning("Could not check indexes: %s", e)
+        return
+
+    for collection, name in missing:
+        app.logger.warning(
+            "Missing index %s.%s, run 'flask db ensure-indexes'", collection, name)
+
+
+db_cli = AppGroup("db", help="Manage the MongoDB database.")
+
+
+@db_cli.command("ensure-indexes")
+@with_appcontext
+def ensure_indexes_command():
+    """Creates any missing indexes from the registry."""
+    from .extensions import mongo
+
+    try:
+        created = ensure_indexes(mongo.db)
+    except DuplicateKeys as e:
+        for (collection, name), groups in e.conflicts.items():
+            click.echo(f"Could not build {collection}.{name}, these documents share a key:")
+            for key, ids in groups:
+                click.echo(f"    {key}: {', '.join(str(_id) for _id in ids)}")
+        click.echo("Merge or remove the duplicates and run this again.")
+        raise click.exceptions.Exit(1)
+
+    for collection, names in created.items():
+        click.echo(f"{collection}: {', '.join(names)}")
+
+
+@db_cli.command("check-indexes")
+@with_appcontext
+def check_indexes_command():
+    """Lists indexes from the registry that have not been created."""
+    from .extensions import mongo
+
+    missing = missing_indexes(mongo.db)
+    for collection, name in missing:
+        click.echo(f"Missing {collection}.{name}")
+    if missing:
+        raise click.exceptions.Exit(1)
+    click.echo("All indexes present")
@@ -0,0 +1,436 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo.errors import DuplicateKeyError
+
+
+CHUNK_SIZE = 64 * 1024
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading bytes of the image formats we accept, used to pick a Content-Type
+# without storing any metadata next to the blob.
+MAGIC_NUMBERS = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+# What save_upload() accepts: everything sniff_mimetype() recognises.
+IMAGE_MIMETYPES = {mimetype for _, mimetype in MAGIC_NUMBERS} | {"image/webp", "image/avif"}
+
+
+def is_digest(value):
+    """
+    Checks whether a value looks like a blob digest rather than legacy
+    base64 image data.
+
+    Args:
+        value (str): The stored image value.
+
+    Returns:
+        bool: True if the value is a sha256 hex digest.
+    """
+    return isinstance(value, str) and bool(DIGEST_RE.match(value))
+
+
+def sniff_mimetype(head):
+    """
+    Works out the mimetype of an image from its first few bytes.
+
+    Args:
+        head (bytes): The first bytes of the blob.
+
+    Returns:
+        str: The detected mimetype, or "application/octet-stream".
+    """
+    for magic, mimetype in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mimetype
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+
+class UploadTooLarge(ValueError):
+    """Raised when a single upload is bigger than the allowed size."""
+
+    def __init__(self, max_size):
+        super().__init__(f"Upload is larger than {max_size} bytes")
+        self.max_size = max_size
+
+
+class UnsupportedImage(ValueError):
+    """Raised when an upload is not a JPEG, PNG, GIF, WebP or AVIF image."""
+
+    def __init__(self, mimetype):
+        super().__init__(f"Upload is not a supported image: {mimetype}")
+        self.mimetype = mimetype
+
+
+def _chunks(stream, max_size=None):
+    """
+    Reads a stream in CHUNK_SIZE pieces, so no more than one chunk is ever
+    held in memory.
+
+    Raises:
+        UploadTooLarge: As soon as more than max_size bytes have been read.
+    """
+    total = 0
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+        total += len(chunk)
+        if max_size is not None and total > max_size:
+            raise UploadTooLarge(max_size)
+        yield chunk
+
+
+def _hash_in_place(stream, max_size=None):
+    """
+    Hashes a seekable stream, e.g. an upload Werkzeug has already spooled
+    to disk, then rewinds it so it can be stored without another copy.
+
+    Returns:
+        str: The sha256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for chunk in _chunks(stream, max_size):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _spool_and_hash(stream, directory=None, max_size=None):
+    """
+    Copies a stream into a named temporary file in chunks, hashing as it goes.
+
+    Returns:
+        tuple: (sha256 hex digest, open temporary file positioned at 0)
+
+    Raises:
+        UploadTooLarge: If the stream is longer than max_size; the
+            temporary file is removed first.
+    """
+    digest = hashlib.sha256()
+    spool = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+    try:
+        for chunk in _chunks(stream, max_size):
+            digest.update(chunk)
+            spool.write(chunk)
+        spool.flush()
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        os.unlink(spool.name)
+        raise
+    return digest.hexdigest(), spool
+
+
+def _is_seekable(stream):
+    try:
+        return stream.seekable()
+    except AttributeError:
+        return False
+
+
+class FilesystemBlobStore:
+    """
+    Stores blobs as files under a root directory, fanned out by the first
+    two characters of the key.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, stream, max_size=None):
+        digest, spool = _spool_and_hash(
+            stream, directory=self.root, max_size=max_size)
+        spool.close()
+        path = self._path(digest)
+        if os.path.exists(path):
+            os.unlink(spool.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.move(spool.name, path)
+        return digest
+
+    def save(self, key, stream):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.root, delete=False) as spool:
+            shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+        os.replace(spool.name, path)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def open(self, key):
+        try:
+            return open(self._path(key), "rb")
+        except FileNotFoundError:
+            return None
+
+    def size(self, blob):
+        return os.fstat(blob.fileno()).st_size
+
+
+class GridFSBlobStore:
+    """
+    Stores blobs in a GridFS bucket, using the key as the file _id.
+    """
+
+    def __init__(self, db, bucket_name="media"):
+        self.files = db[f"{bucket_name}.files"]
+        self.bucket = GridFSBucket(db, bucket_name=bucket_name)
+
+    def put(self, stream, max_size=None):
+        # Uploads are already spooled by Werkzeug: hash, rewind and stream
+        # them straight into GridFS instead of copying them again.
+        if _is_seekable(stream):
+            digest = _hash_in_place(stream, max_size)
+            if not self.exists(digest):
+                self.save(digest, stream)
+            return digest
+
+        digest, spool = _spool_and_hash(stream, max_size=max_size)
+        try:
+            if not self.exists(digest):
+                self.bucket.upload_from_stream_with_id(digest, digest, spool)
+        finally:
+            spool.close()
+            os.unlink(spool.name)
+        return digest
+
+    def save(self, key, stream):
+        try:
+            self.bucket.upload_from_stream_with_id(key, key, stream)
+        except DuplicateKeyError:
+            pass
+
+    def exists(self, key):
+        return self.files.count_documents({"_id": key}, limit=1) > 0
+
+    def open(self, key):
+        try:
+            return self.bucket.open_download_stream(key)
+        except NoFile:
+            return None
+
+    def size(self, blob):
+        return blob.length
+
+
+class MediaStore:
+    """
+    Flask extension giving the app a single content-addressed blob store.
+
+    Images are stored once, keyed by the sha256 of their bytes, and documents
+    only hold that digest. The backend is picked with MEDIA_BACKEND:
+
+    - "gridfs" (default): a GridFS bucket in the app database.
+    - "filesystem": files under MEDIA_ROOT.
+
+    MAX_UPLOAD_SIZE caps a single uploaded file (default 10MB); the whole
+    request is capped by Flask's MAX_CONTENT_LENGTH.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("MEDIA_BACKEND", "gridfs")
+        app.config.setdefault("MEDIA_BUCKET", "media")
+        app.config.setdefault("MAX_UPLOAD_SIZE", 10 * 1024 * 1024)
+        app.config.setdefault(
+            "MEDIA_ROOT", os.path.join(app.instance_path, "media"))
+
+        backend = app.config["MEDIA_BACKEND"]
+        if backend == "gridfs":
+            from .extensions import mongo
+            self.backend = GridFSBlobStore(
+                mongo.db, bucket_name=app.config["MEDIA_BUCKET"])
+        elif backend == "filesystem":
+            self.backend = FilesystemBlobStore(app.config["MEDIA_ROOT"])
+        else:
+            raise ValueError(f"Unknown MEDIA_BACKEND: {backend}")
+
+        app.extensions["media"] = self
+
+    def put(self, stream, max_size=None):
+        return self.backend.put(stream, max_size=max_size)
+
+    def put_bytes(self, data):
+        return self.backend.put(io.BytesIO(data))
+
+    def save(self, key, stream):
+        return self.backend.save(key, stream)
+
+    def exists(self, key):
+        return self.backend.exists(key)
+
+    def open(self, key):
+        return self.backend.open(key)
+
+    def size(self, blob):
+        return self.backend.size(blob)
+
+
+def save_upload(file_storage):
+    """
+    Streams an uploaded file into the media store and queues its resized
+    variants to be built in the background.
+
+    The file is read in chunks and never held in memory whole; anything
+    over MAX_UPLOAD_SIZE is rejected part way through. Its first bytes
+    must be those of an image type in IMAGE_MIMETYPES, whatever filename
+    or Content-Type the browser sent.
+
+    Args:
+        file_storage (FileStorage): The uploaded file from request.files.
+
+    Returns:
+        str or None: The digest of the stored image, or None if no file was sent.
+
+    Raises:
+        UploadTooLarge: If the file is bigger than MAX_UPLOAD_SIZE.
+        UnsupportedImage: If the file is not a supported image.
+    """
+    from .extensions import media, images
+
+    if not file_storage or file_storage.filename == "":
+        return None
+    # Werkzeug spools uploads to memory or disk, so the stream can rewind
+    mimetype = sniff_mimetype(file_storage.stream.read(16))
+    file_storage.stream.seek(0)
+    if mimetype not in IMAGE_MIMETYPES:
+        raise UnsupportedImage(mimetype)
+    digest = media.put(
+        file_storage.stream, max_size=current_app.config["MAX_UPLOAD_SIZE"])
+    images.enqueue(digest)
+    return digest
+
+
+def _migrate_value(value, dry_run):
+    """Stores a legacy base64 value and returns its digest."""
+    if not value or is_digest(value):
+        return value
+    try:
+        data = base64.b64decode(value.strip(), validate=False)
+    except (binascii.Error, ValueError):
+        return value
+    if dry_run:
+        return hashlib.sha256(data).hexdigest()
+    from .extensions import media
+    return media.put_bytes(data)
+
+
+def _referenced_digests(db):
+    """Yields every image digest referenced by a document."""
+    for user in db.users.find({}, {"profile.profile_image": 1}):
+        yield user.get("profile", {}).get("profile_image")
+    for business in db.business.find({}, {"images": 1}):
+        yield from business.get("images") or []
+    for deal in db.deals.find({}, {"deal-image": 1}):
+        yield deal.get("deal-image")
+
+
+media_cli = AppGroup("media", help="Manage stored images.")
+
+
+@media_cli.command("migrate")
+@click.option("--dry-run", is_flag=True, help="Report what would change.")
+@with_appcontext
+def migrate_command(dry_run):
+    """
+    Moves base64 images embedded in documents into the media store.
+
+    Safe to run more than once: values that are already digests are skipped.
+    """
+    from .extensions import mongo
+
+    db = mongo.db
+    updated = {"users": 0, "business": 0, "deals": 0, "reviews": 0}
+
+    for user in db.users.find(
+            {"profile.profile_image": {"$nin": [None, ""]}},
+            {"profile.profile_image": 1}):
+        image = user["profile"]["profile_image"]
+        if is_digest(image):
+            continue
+        digest = _migrate_value(image, dry_run)
+        if not dry_run:
+            db.users.update_one(
+                {"_id": user["_id"]},
+                {"$set": {"profile.profile_image": digest}})
+        updated["users"] += 1
+
+    for business in db.business.find(
+            {"images.0": {"$exists": True}}, {"images": 1}):
+        images = business["images"]
+        if all(is_digest(image) for image in images):
+            continue
+        digests = [_migrate_value(image, dry_run) for image in images]
+        if not dry_run:
+            db.business.update_one(
+                {"_id": business["_id"]}, {"$set": {"images": digests}})
+        updated["business"] += 1
+
+    for deal in db.deals.find(
+            {"deal-image": {"$nin": [None, ""]}}, {"deal-image": 1}):
+        if is_digest(deal["deal-image"]):
+            continue
+        digest = _migrate_value(deal["deal-image"], dry_run)
+        if not dry_run:
+            db.deals.update_one(
+                {"_id": deal["_id"]}, {"$set": {"deal-image": digest}})
+        updated["deals"] += 1
+
+    for review in db.reviews.find(
+            {"profile_image": {"$nin": [None, ""]}}, {"profile_image": 1}):
+        if is_digest(review["profile_image"]):
+            continue
+        digest = _migrate_value(review["profile_image"], dry_run)
+        if not dry_run:
+            db.reviews.update_one(
+                {"_id": review["_id"]}, {"$set": {"profile_image": digest}})
+        updated["reviews"] += 1
+
+    prefix = "Would migrate" if dry_run else "Migrated"
+    for collection, count in updated.items():
+        click.echo(f"{prefix} {count} {collection} documents")
+
+
+@media_cli.command("variants")
+@with_appcontext
+def variants_command():
+    """
+    Builds any missing resized variants for every stored image.
+
+    Runs in the foreground, so use it after "migrate" or to backfill
+    formats added to IMAGE_FORMATS.
+    """
+    from .extensions import mongo, images
+
+    built = 0
+    for digest in set(_referenced_digests(mongo.db)):
+        if is_digest(digest):
+            built += images.build(digest)
+    click.echo(f"Built {built} variants")
@@ -0,0 +1,114 @@
+import bisect
+import threading
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in sorted(labels.items()))
+    return "{" + pairs + "}"
+
+
+def metric(name, kind, help_text, samples):
+    """
+    Formats one metric family.
+
+    Args:
+        name (str): The metric name.
+        kind (str): "counter" or "gauge".
+        help_text (str): One line describing it.
+        samples (list): (labels dict, value) pairs.
+
+    Returns:
+        list: The exposition lines.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    return lines
+
+
+class Histogram:
+    """
+    A labelled Prometheus histogram: counts of observations per upper
+    bound, plus their sum and count.
+    """
+
+    def __init__(self, name, help_text, buckets, label="route"):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.label = label
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, label_value, value):
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = {
+                    "buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def lines(self):
+        """The exposition lines, with cumulative buckets."""
+        lines = [f"# HELP {self.name} {self.help_text}",
+                 f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {key: dict(value, buckets=list(value["buckets"]))
+                      for key, value in self.series.items()}
+        for label_value, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values["buckets"]):
+                cumulative += count
+                labels = _format_labels({self.label: label_value, "le": f"{bound:g}"})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels({self.label: label_value, "le": "+Inf"})
+            lines.append(f"{self.name}_bucket{labels} {values['count']}")
+            labels = _format_labels({self.label: label_value})
+            lines.append(f"{self.name}_sum{labels} {round(values['sum'], 6)}")
+            lines.append(f"{self.name}_count{labels} {values['count']}")
+        return lines
+
+
+def pool_families(snapshot):
+    """The metric families for a PoolMetrics snapshot."""
+    failures = [({"reason": reason}, count)
+                for reason, count in sorted(snapshot["failures"].items())]
+    return (
+        metric("mongo_pool_connections", "gauge",
+               "Open connections to MongoDB.", [({}, snapshot["open"])])
+        + metric("mongo_pool_checked_out", "gauge",
+                 "Connections currently in use.", [({}, snapshot["checked_out"])])
+        + metric("mongo_pool_checkouts_total", "counter",
+                 "Connections handed out by the pool.", [({}, snapshot["checkouts"])])
+        + metric("mongo_pool_wait_seconds_total", "counter",
+                 "Time spent waiting for a connection.",
+                 [({}, round(snapshot["wait_seconds"], 6))])
+        + metric("mongo_pool_checkout_failures_total", "counter",
+                 "Checkouts that failed, by reason.", failures or [({}, 0)])
+        + metric("mongo_pool_cleared_total", "counter",
+                 "Times the pool was cleared after a network error.",
+                 [({}, snapshot["cleared"])])
+    )
+
+
+def render():
+    """
+    Renders every metric the app collects in the Prometheus text format.
+
+    Returns:
+        str: The /metrics response body.
+    """
+    from .extensions import pool_metrics, request_metrics
+
+    lines = pool_families(pool_metrics.snapshot())
+    for histogram in request_metrics.histograms:
+        lines += histogram.lines()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,215 @@
+import base64
+import binascii
+from datetime import datetime
+
+from bson import ObjectId, json_util
+from bson.errors import BSONError
+from flask import current_app, request
+
+
+# The only kinds of value a cursor may carry. Anything else, e.g. a dict
+# like {"$ne": null} or a regex, would act as an operator in the keyset filter.
+TOKEN_TYPES = (str, int, float, bool, type(None), datetime, ObjectId)
+
+
+class Page:
+    """
+    One page of a keyset-paginated query.
+
+    Attributes:
+        items (list): The documents on this page.
+        next_token (str or None): Cursor for the page after this one.
+        prev_token (str or None): Cursor for the page before this one.
+    """
+
+    def __init__(self, items, next_token=None, prev_token=None):
+        self.items = items
+        self.next_token = next_token
+        self.prev_token = prev_token
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _value(document, field):
+    for part in field.split("."):
+        document = document.get(part) if document else None
+    return document
+
+
+def encode_token(document, sort):
+    """
+    Builds an opaque cursor from the sort key values of a document.
+
+    Args:
+        document (dict): The first or last document on a page.
+        sort (list): The (field, direction) pairs the query is sorted by.
+
+    Returns:
+        str: A URL-safe token.
+    """
+    values = [_value(document, field) for field, _ in sort]
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_token(token, sort):
+    """
+    Reads the sort key values back out of a cursor.
+
+    Cursors come from the query string, so anything but one plain value per
+    sort field is treated as no cursor at all, i.e. the first page.
+
+    Args:
+        token (str): The cursor from the request.
+        sort (list): The (field, direction) pairs the query is sorted by.
+
+    Returns:
+        list or None: The values, or None if the token is missing or invalid.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json_util.loads(raw.decode("utf-8"))
+    # json_util's extended JSON parsers raise all sorts on malformed input
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError,
+            IndexError, OverflowError, BSONError):
+        return None
+    if not isinstance(values, list) or len(values) != len(sort):
+        return None
+    if not all(isinstance(value, TOKEN_TYPES) for value in values):
+        return None
+    return values
+
+
+def _keyset_filter(sort, values, forward):
+    """
+    Builds the filter matching documents strictly after (or before) the
+    given sort key values, e.g. for [(a, 1), (_id, 1)]:
+    {"$or": [{a: {$gt: va}}, {a: va, _id: {$gt: vid}}]}.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        ascending = (direction == 1) == forward
+        clause = {prev: values[j] for j, (prev, _) in enumerate(sort[:i])}
+        clause[field] = {"$gt" if ascending else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+def _page(fetch, sort, after, before, limit):
+    """
+    Runs one keyset-paginated fetch and wraps the result in a Page.
+
+    Args:
+        fetch (callable): fetch(keyset, order, limit) returns the documents
+            matching the extra keyset filter (or None) in the given order.
+        sort, after, before, limit: As for paginate().
+    """
+    after_values = decode_token(after, sort)
+    before_values = None if after_values else decode_token(before, sort)
+    forward = before_values is None
+
+    keyset = None
+    if after_values:
+        keyset = _keyset_filter(sort, after_values, forward=True)
+    elif before_values:
+        keyset = _keyset_filter(sort, before_values, forward=False)
+
+    order = sort if forward else [(field, -direction) for field, direction in sort]
+    items = fetch(keyset, order, limit + 1)
+    has_more = len(items) > limit
+    items = items[:limit]
+    if not forward:
+        items.reverse()
+
+    if not items:
+        return Page(items)
+
+    # Going forwards there is a previous page if we came from a cursor, and
+    # a next page if we over-fetched; backwards it is the other way round.
+    has_next = has_more if forward else True
+    has_prev = bool(after_values) if forward else has_more
+    return Page(
+        items,
+        next_token=encode_token(items[-1], sort) if has_next else None,
+        prev_token=encode_token(items[0], sort) if has_prev else None
+    )
+
+
+def paginate(collection, query, sort, projection=None, after=None,
+             before=None, limit=20):
+    """
+    Fetches one page of a query using keyset (cursor) pagination.
+
+    - Each page is a bounded, indexed range scan: no skip, so late pages cost
+      the same as the first one.
+    - The last sort field must be unique (normally _id) so cursors are exact.
+
+    Args:
+        collection (Collection): The collection to query.
+        query (dict): The filter for the whole listing.
+        sort (list): (field, direction) pairs; should match an index.
+        projection (dict): Fields to return.
+        after (str): Cursor from a previous page's next_token.
+        before (str): Cursor from a previous page's prev_token.
+        limit (int): Page size.
+
+    Returns:
+        Page: The documents and the cursors either side of them.
+    """
+    def fetch(keyset, order, limit):
+        return list(
+            collection.find({"$and": [query, keyset]} if keyset else query, projection)
+            .sort(order)
+            .limit(limit)
+        )
+    return _page(fetch, sort, after, before, limit)
+
+
+def paginate_pipeline(collection, pipeline, sort, projection=None, after=None,
+                      before=None, limit=20):
+    """
+    Keyset-paginates the output of an aggregation, for orderings a plain
+    find() cannot express, such as text search relevance.
+
+    Args:
+        collection (Collection): The collection to aggregate.
+        pipeline (list): Stages producing the full listing, including any
+            computed sort fields.
+        sort (list): (field, direction) pairs over the pipeline's output.
+        projection (dict): A $project applied after paging; it must keep
+            the sort fields, which the cursors are built from.
+        after, before, limit: As for paginate().
+
+    Returns:
+        Page: The documents and the cursors either side of them.
+    """
+    def fetch(keyset, order, limit):
+        stages = list(pipeline)
+        if keyset:
+            stages.append({"$match": keyset})
+        stages += [{"$sort": dict(order)}, {"$limit": limit}]
+        if projection:
+            stages.append({"$project": projection})
+        return list(collection.aggregate(stages))
+    return _page(fetch, sort, after, before, limit)
+
+
+def page_size(config_key):
+    """
+    Works out the page size for a listing from config and ?limit=.
+
+    Args:
+        config_key (str): The config setting holding the default size.
+
+    Returns:
+        int: The requested size, capped at MAX_PAGE_SIZE.
+    """
+    default = current_app.config[config_key]
+    limit = request.args.get("limit", default, type=int)
+    return max(1, min(limit, current_app.config["MAX_PAGE_SIZE"]))
@@ -0,0 +1,141 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from werkzeug.security import check_password_hash
+
+
+# Prefixes of the hashes Werkzeug's generate_password_hash used to write.
+LEGACY_PREFIXES = ("scrypt:", "pbkdf2:")
+
+
+class PasswordBusy(RuntimeError):
+    """Raised when no hashing thread frees up within PASSWORD_TIMEOUT."""
+
+
+def bcrypt_rounds(stored):
+    """
+    Reads the cost factor out of a bcrypt hash such as "$2b$12$...".
+
+    Returns:
+        int or None: The log rounds, or None if this is not a bcrypt hash.
+    """
+    parts = stored.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """
+    Flask extension hashing and checking passwords with flask_bcrypt.
+
+    Hashing is deliberately slow, so it runs on a small bounded thread pool
+    (bcrypt releases the GIL): a burst of logins queues there instead of
+    tying up every request thread's CPU.
+
+    Config:
+        BCRYPT_LOG_ROUNDS: bcrypt cost factor; pick it with
+            "flask passwords benchmark".
+        PASSWORD_WORKERS: threads hashing at once per process.
+        PASSWORD_TIMEOUT: seconds to wait for a free thread before
+            giving up with PasswordBusy.
+    """
+
+    def __init__(self, app=None):
+        self.executor = None
+        self.rounds = None
+        self.timeout = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("BCRYPT_LOG_ROUNDS", 12)
+        app.config.setdefault("PASSWORD_WORKERS", 2)
+        app.config.setdefault("PASSWORD_TIMEOUT", 10)
+        self.rounds = app.config["BCRYPT_LOG_ROUNDS"]
+        self.timeout = app.config["PASSWORD_TIMEOUT"]
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config["PASSWORD_WORKERS"],
+            thread_name_prefix="passwords"
+        )
+        app.extensions["passwords"] = self
+
+    def _run(self, fn, *args):
+        future = self.executor.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise PasswordBusy("Password hashing is busy, try again") from None
+
+    def hash(self, password):
+        """
+        Hashes a password at the configured cost.
+
+        Returns:
+            str: The bcrypt hash to store.
+        """
+        from .extensions import bcrypt
+
+        return self._run(bcrypt.generate_password_hash, password).decode("utf-8")
+
+    def verify(self, stored, password):
+        """
+        Checks a password against a stored bcrypt or legacy Werkzeug hash.
+
+        Args:
+            stored (str): The hash from the user document.
+            password (str): The password typed in.
+
+        Returns:
+            bool: True if the password matches.
+        """
+        from .extensions import bcrypt
+
+        if not stored or not password:
+            return False
+        if stored.startswith(LEGACY_PREFIXES):
+            return self._run(check_password_hash, stored, password)
+        return self._run(bcrypt.check_password_hash, stored, password)
+
+    def needs_rehash(self, stored):
+        """
+        Checks whether a stored hash should be replaced after a successful
+        login: it is a legacy Werkzeug hash, or bcrypt at another cost.
+        """
+        return bcrypt_rounds(stored) != self.rounds
+
+
+passwords_cli = AppGroup("passwords", help="Manage password hashing.")
+
+
+@passwords_cli.command("benchmark")
+@click.option("--target-ms", default=250, show_default=True,
+              help="Longest acceptable time for one hash.")
+@click.option("--min-rounds", default=10, show_default=True)
+@click.option("--max-rounds", default=15, show_default=True)
+@with_appcontext
+def benchmark_command(target_ms, min_rounds, max_rounds):
+    """
+    Times bcrypt at each cost factor on this machine and suggests the
+    highest BCRYPT_LOG_ROUNDS that stays under the target.
+    """
+    from .extensions import bcrypt
+
+    best = None
+    for rounds in range(min_rounds, max_rounds + 1):
+        start = time.perf_counter()
+        bcrypt.generate_password_hash("benchmark-password", rounds)
+        elapsed = (time.perf_counter() - start) * 1000
+        click.echo(f"rounds={rounds:<3} {elapsed:8.1f} ms")
+        if elapsed <= target_ms:
+            best = rounds
+        else:
+            break
+
+    if best is None:
+        click.echo(f"Even {min_rounds} rounds is slower than {target_ms} ms")
+        raise click.exceptions.Exit(1)
+    click.echo(f"Suggested BCRYPT_LOG_ROUNDS={best}")
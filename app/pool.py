@@ -0,0 +1,147 @@
+import importlib.util
+import threading
+import time
+
+from pymongo import ReadPreference, monitoring
+
+
+# Compression libraries pymongo can use, and the package providing each.
+# zlib ships with Python; zstd and snappy need zstandard / python-snappy,
+# which requirements.txt does not install.
+COMPRESSOR_PACKAGES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def available_compressors(names):
+    """
+    Filters a comma separated compressor list down to those installed, so
+    asking for zstd without the zstandard package falls back quietly.
+
+    Args:
+        names (str): e.g. "zstd,zlib", in order of preference.
+
+    Returns:
+        list: The usable compressor names.
+    """
+    compressors = []
+    for name in (name.strip() for name in names.split(",")):
+        package = COMPRESSOR_PACKAGES.get(name)
+        if package and importlib.util.find_spec(package) is not None:
+            compressors.append(name)
+    return compressors
+
+
+def client_options(config, listeners=()):
+    """
+    Builds the MongoClient keyword arguments from the app config.
+
+    Args:
+        config (Config): The app config, with the MONGO_* pool settings.
+        listeners (iterable): pymongo event listeners to register.
+
+    Returns:
+        dict: Keyword arguments for PyMongo.init_app / MongoClient.
+    """
+    options = {
+        "maxPoolSize": config["MONGO_MAX_POOL_SIZE"],
+        "minPoolSize": config["MONGO_MIN_POOL_SIZE"],
+        "waitQueueTimeoutMS": config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+        "serverSelectionTimeoutMS": config["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+        "event_listeners": list(listeners),
+    }
+    compressors = available_compressors(config["MONGO_COMPRESSORS"])
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    return options
+
+
+def read_preference(name):
+    """
+    Looks up a read preference by its connection string name.
+
+    Raises:
+        ValueError: If the name is not a read preference mode.
+    """
+    try:
+        return READ_PREFERENCES[name]
+    except KeyError:
+        raise ValueError(f"Unknown read preference: {name}") from None
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Keeps running totals of connection pool activity for /metrics: open
+    and checked out connections, checkouts, time spent waiting for a
+    connection, and checkouts that failed (e.g. waitQueueTimeoutMS).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = threading.local()
+        self.open = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.failures = {}
+        self.cleared = 0
+
+    def snapshot(self):
+        """Returns the current values as a dict."""
+        with self.lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "wait_seconds": self.wait_seconds,
+                "failures": dict(self.failures),
+                "cleared": self.cleared,
+            }
+
+    def connection_check_out_started(self, event):
+        self.waiting.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = time.perf_counter() - getattr(self.waiting, "started", time.perf_counter())
+        with self.lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_seconds += waited
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.failures[event.reason] = self.failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open -= 1
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.cleared += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
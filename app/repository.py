@@ -0,0 +1,182 @@
+from flask import current_app, g
+from flask_pymongo import ObjectId
+
+from .deals import active_deals_query
+from .extensions import mongo
+from .pagination import paginate
+from .pool import read_preference
+
+
+# Named projections: each one lists only the fields a caller reads, so a
+# permission check does not pull a whole profile or every business image.
+
+# Enough to identify the logged in user and check ownership.
+USER_AUTH = {"_id": 1, "username": 1}
+# What login needs to verify a password.
+USER_LOGIN = {"_id": 1, "username": 1, "password": 1}
+# Everything the profile page and edit form render; never the password hash.
+USER_PROFILE = {"password": 0}
+# What registration compares to find a taken username or email.
+USER_IDENTITY = {"_id": 1, "username": 1, "email": 1}
+# What a review shows about its author.
+USER_REVIEW_AUTHOR = {
+    "_id": 1, "username": 1, "profile.name": 1, "profile.profile_image": 1}
+
+# Enough to check who owns a business and which listing it appears in.
+BUSINESS_OWNER = {"_id": 1, "owner_id": 1, "category": 1}
+# A search result card: the first image only.
+BUSINESS_CARD = {
+    "_id": 1, "owner_id": 1, "company_name": 1, "description": 1,
+    "category": 1, "images": {"$slice": 1}}
+# Fields edit_business merges with the submitted form.
+BUSINESS_EDIT = {"_id": 1, "owner_id": 1, "images": 1, "location": 1,
+                 "coordinates": 1, "category": 1}
+# The map pin on the profile page.
+BUSINESS_LOCATION = {"_id": 1, "coordinates": 1}
+
+# Enough to check who wrote a review.
+REVIEW_OWNER = {"_id": 1, "user_id": 1, "business_id": 1}
+# A review as shown on the profile page; profile_image is only there on
+# reviews saved before author snapshots, until "flask reviews backfill".
+REVIEW_CARD = {"_id": 1, "business_id": 1, "user_id": 1, "author": 1,
+               "text": 1, "date": 1, "profile_image": 1}
+# Newest first, served by the (business_id, date, _id) index.
+REVIEW_SORT = [("date", -1), ("_id", -1)]
+
+# Enough to check who owns a deal.
+DEAL_OWNER = {"_id": 1, "business_owner": 1}
+# A deal as shown on the deals page and profile.
+DEAL_CARD = {"_id": 1, "business_owner": 1, "deal-text": 1, "date": 1,
+             "expire-date": 1, "expires_at": 1, "deal-image": 1}
+
+
+def listing(collection):
+    """
+    Returns a collection that reads with LISTING_READ_PREFERENCE.
+
+    The default is the primary. A page rendered from a lagging secondary
+    could show data older than the versions its ETag is built from, so
+    cached() neither caches nor validates a page that read from anywhere
+    else (see g.stale_read).
+    """
+    name = current_app.config["LISTING_READ_PREFERENCE"]
+    if name != "primary":
+        g.stale_read = True
+    return mongo.db[collection].with_options(read_preference=read_preference(name))
+
+
+def find_user_by_username(username, projection=USER_PROFILE):
+    """
+    Finds a user by username.
+
+    Args:
+        username (str): The username to look up.
+        projection (dict): Fields to return, one of the USER_* projections.
+
+    Returns:
+        dict or None: The user document.
+    """
+    return mongo.db.users.find_one({"username": username}, projection)
+
+
+def find_user_by_id(user_id, projection=USER_PROFILE):
+    """Finds a user by _id, returning only the projected fields."""
+    return mongo.db.users.find_one({"_id": ObjectId(user_id)}, projection)
+
+
+def find_user_by_email(email, projection=USER_LOGIN):
+    """Finds a user by email, returning only the projected fields."""
+    return mongo.db.users.find_one({"email": email}, projection)
+
+
+def find_user_by_username_or_email(username, email, projection=USER_IDENTITY):
+    """Finds a user holding either the username or the email, if any."""
+    return mongo.db.users.find_one(
+        {"$or": [{"username": username}, {"email": email}]}, projection)
+
+
+def find_business_by_owner(owner_id, projection=None):
+    """
+    Finds the business owned by a user.
+
+    Args:
+        owner_id (str or ObjectId): The owner's user _id.
+        projection (dict): Fields to return; None returns the whole document.
+
+    Returns:
+        dict or None: The business document.
+    """
+    return mongo.db.business.find_one({"owner_id": ObjectId(owner_id)}, projection)
+
+
+def find_business(business_id, projection=None):
+    """Finds a business by _id, returning only the projected fields."""
+    return mongo.db.business.find_one({"_id": ObjectId(business_id)}, projection)
+
+
+def find_businesses_by_category(category, after=None, before=None, limit=20,
+                                projection=BUSINESS_CARD):
+    """
+    Lists one page of the businesses in a category as search result cards.
+
+    Args:
+        category (str): The category to list.
+        after (str): Cursor for the next page.
+        before (str): Cursor for the previous page.
+        limit (int): Page size.
+        projection (dict): Fields to return.
+
+    Returns:
+        Page: The businesses, oldest first, served by the (category, _id) index.
+    """
+    return paginate(
+        listing("business"), {"category": category}, [("_id", 1)],
+        projection, after=after, before=before, limit=limit)
+
+
+def find_reviews_for_business(business_id, after=None, before=None, limit=10,
+                              projection=REVIEW_CARD):
+    """
+    Lists one page of the reviews left for a business, newest first.
+
+    Args:
+        business_id (str or ObjectId): The business owner's user _id.
+        after (str): Cursor for older reviews.
+        before (str): Cursor for newer reviews.
+        limit (int): Page size.
+        projection (dict): Fields to return.
+
+    Returns:
+        Page: The reviews and the cursors either side of them.
+    """
+    return paginate(
+        mongo.db.reviews, {"business_id": ObjectId(business_id)}, REVIEW_SORT,
+        projection, after=after, before=before, limit=limit)
+
+
+def find_review(review_id, projection=REVIEW_OWNER):
+    """Finds a review by _id, returning only the projected fields."""
+    return mongo.db.reviews.find_one({"_id": ObjectId(review_id)}, projection)
+
+
+def find_deal(deal_id, projection=DEAL_OWNER):
+    """Finds a deal by _id, returning only the projected fields."""
+    return mongo.db.deals.find_one({"_id": ObjectId(deal_id)}, projection)
+
+
+def find_deal_by_owner(owner_id, projection=DEAL_CARD):
+    """Finds the deal belonging to a business owner."""
+    return mongo.db.deals.find_one({"business_owner": ObjectId(owner_id)}, projection)
+
+
+def find_deals(after=None, before=None, limit=20, projection=DEAL_CARD):
+    """
+    Lists one page of live deals as shown on the deals page, soonest to
+    expire first.
+
+    Returns:
+        Page: The deals and the cursors either side of them.
+    """
+    return paginate(
+        listing("deals"), active_deals_query(), [("expires_at", 1), ("_id", 1)],
+        projection, after=after, before=before, limit=limit)
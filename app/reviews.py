@@ -0,0 +1,182 @@
+from datetime import datetime, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from .deals import DATE_FORMATS
+from .identity import forget
+from .media import is_digest
+from .repository import REVIEW_SORT
+
+
+# Fields of a review copied into its business's summary.
+SUMMARY_FIELDS = {"_id": 1, "business_id": 1, "user_id": 1, "author": 1,
+                  "text": 1, "date": 1}
+
+
+def author_snapshot(user):
+    """
+    Builds the small copy of a reviewer stored on each review.
+
+    Only the avatar's digest is kept, never the image itself; legacy base64
+    avatars are left out until "flask media migrate" has run.
+
+    Args:
+        user (dict): The reviewer, loaded with at least USER_REVIEW_AUTHOR.
+
+    Returns:
+        dict: {"user_id", "name", "avatar"}.
+    """
+    profile = user.get("profile") or {}
+    avatar = profile.get("profile_image")
+    return {
+        "user_id": user["_id"],
+        "name": profile.get("name") or user["username"],
+        "avatar": avatar if is_digest(avatar) else None,
+    }
+
+
+def refresh_review_summary(db, business_id):
+    """
+    Rebuilds the review summary stored on a business: how many reviews it
+    has and the newest page of them, so the profile page needs no reviews
+    query until someone asks for older ones.
+
+    Called after every review write; rebuilding rather than patching keeps
+    the summary right after edits and deletes. Each rebuild stamps the
+    summary with when it started reading, and never replaces one that
+    started later: that one read the reviews after this one did, so two
+    review writes racing each other cannot leave the older summary behind.
+
+    Args:
+        db (Database): The database.
+        business_id (ObjectId): The business owner's user _id, which is
+            what reviews are keyed by.
+    """
+    size = current_app.config["REVIEWS_PAGE_SIZE"]
+    # Stored with millisecond precision, so compare at that precision too
+    started = datetime.now(timezone.utc)
+    started = started.replace(microsecond=started.microsecond // 1000 * 1000)
+    latest = list(
+        db.reviews.find({"business_id": business_id}, SUMMARY_FIELDS)
+        .sort(REVIEW_SORT)
+        .limit(size)
+    )
+    db.business.update_one(
+        {"owner_id": business_id,
+         "review_summary.rebuilt_at": {"$not": {"$gt": started}}},
+        {"$set": {"review_summary": {
+            "count": db.reviews.count_documents({"business_id": business_id}),
+            "latest": latest,
+            "rebuilt_at": started,
+        }}}
+    )
+    forget("business")
+
+
+def refresh_author(db, user):
+    """
+    Updates the author snapshot on every review a user has written, and in
+    the summaries that show them, after they change their name or avatar.
+
+    Args:
+        db (Database): The database.
+        user (dict): The user as now stored.
+    """
+    author = author_snapshot(user)
+    db.reviews.update_many(
+        {"user_id": user["_id"]}, {"$set": {"author": author}})
+    # Only summaries that currently show one of their reviews need rebuilding
+    for business in db.business.find(
+            {"review_summary.latest.user_id": user["_id"]}, {"owner_id": 1}):
+        refresh_review_summary(db, business["owner_id"])
+
+
+def refresh_author_later(user):
+    """
+    Queues refresh_author() on the background pool, so the request changing
+    a name or avatar costs the same however many reviews the user wrote.
+
+    Args:
+        user (dict): The user as now stored.
+
+    Returns:
+        Future: Resolves once the reviews and summaries are updated.
+    """
+    from .extensions import tasks
+
+    return tasks.submit(_refresh_author_in_background, current_app._get_current_object(), user)
+
+
+def _refresh_author_in_background(app, user):
+    from .extensions import mongo
+
+    with app.app_context():
+        refresh_author(mongo.db, user)
+
+
+def parse_review_date(value):
+    """
+    Reads the dd-mm-yyyy string older reviews stored as their date.
+
+    Returns:
+        datetime or None: Midnight UTC on that day, or None if invalid.
+    """
+    for date_format in DATE_FORMATS:
+        try:
+            day = datetime.strptime(value.strip(), date_format)
+        except (AttributeError, ValueError):
+            continue
+        return day.replace(tzinfo=timezone.utc)
+    return None
+
+
+reviews_cli = AppGroup("reviews", help="Manage reviews.")
+
+
+@reviews_cli.command("backfill")
+@with_appcontext
+def backfill_command():
+    """
+    Replaces the avatar copied into older reviews with an author snapshot,
+    turns their string dates into real dates so they sort, and builds the
+    review summary for every business.
+    """
+    from .extensions import mongo
+
+    authors = {}
+    updated = 0
+    for review in mongo.db.reviews.find(
+            {"author": {"$exists": False}}, {"user_id": 1}):
+        user_id = review.get("user_id")
+        if user_id not in authors:
+            user = mongo.db.users.find_one(
+                {"_id": user_id},
+                {"username": 1, "profile.name": 1, "profile.profile_image": 1})
+            authors[user_id] = author_snapshot(user) if user else None
+        if authors[user_id] is None:
+            click.echo(f"Review {review['_id']} has no author, skipped")
+            continue
+        mongo.db.reviews.update_one(
+            {"_id": review["_id"]},
+            {"$set": {"author": authors[user_id]}, "$unset": {"profile_image": ""}}
+        )
+        updated += 1
+    click.echo(f"Updated {updated} reviews")
+
+    dated = 0
+    for review in mongo.db.reviews.find({"date": {"$type": "string"}}, {"date": 1}):
+        date = parse_review_date(review["date"])
+        if date is None:
+            click.echo(f"Could not parse date {review['date']!r} on review {review['_id']}")
+            continue
+        mongo.db.reviews.update_one({"_id": review["_id"]}, {"$set": {"date": date}})
+        dated += 1
+    click.echo(f"Dated {dated} reviews")
+
+    businesses = 0
+    for business in mongo.db.business.find({}, {"owner_id": 1}):
+        refresh_review_summary(mongo.db, business["owner_id"])
+        businesses += 1
+    click.echo(f"Rebuilt {businesses} review summaries")
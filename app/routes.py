@@ -1,5 +1,3 @@
-import os
-import requests
 from flask import (
     render_template,
     Blueprint,
@@ -7,14 +5,48 @@ from flask import (
     flash,
     redirect,
     url_for,
-    session
+    session,
+    abort,
+    Response,
+    jsonify,
+    current_app
+)
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import wrap_file
+
+from .extensions import mongo, passwords, media, images, request_metrics
+from .cache import cached
+from .budgets import query_budget
+from .signals import category_tag, notify_changed
+from .geocode import coordinates_for, geo_point
+from .identity import remember, forget
+from .views import load_profile_view
+from .pagination import page_size
+from .search import search_businesses, category_facets, nearby_businesses
+from .categories import CATEGORIES
+from .deals import parse_expiry, is_live
+from .reviews import author_snapshot, refresh_author_later, refresh_review_summary
+from .summary import (
+    load_home_summary, category_count, count_business, move_business,
+    add_latest_deal, refresh_latest_deals
+)
+from .cascade import delete_later
+from .images import VARIANT_WIDTHS, variant_key
+from .media import is_digest, save_upload, sniff_mimetype, UnsupportedImage, UploadTooLarge
+from .passwords import PasswordBusy
+from . import metrics, repository
+from .repository import (
+    USER_AUTH,
+    USER_PROFILE,
+    USER_REVIEW_AUTHOR,
+    BUSINESS_OWNER,
+    BUSINESS_EDIT,
+    DEAL_CARD
 )
-
-from .extensions import mongo, bcrypt
-import base64
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_pymongo import ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from functools import wraps
+from datetime import datetime, timezone
 
 
 main = Blueprint("main", __name__)
@@ -47,37 +79,45 @@ def logged_in_user():
     return decorator
 
 
-def get_current_user():
+def get_current_user(projection=USER_AUTH):
     """
     Gets the current logged in user
 
+    Args:
+        projection (dict): fields to load, defaults to just _id and username
+
+    Shares the request's identity map with get_profile_user, so it is
+    only queried once per request.
+
     return:
         dictionary: current users info
     """
     if "user" not in session:
         return None
-    return mongo.db.users.find_one({
-        "username": session["user"]
-    })
+    return get_profile_user(session["user"], projection)
 
 
 # function to get the profile user or current user
-def get_profile_user(username):
+def get_profile_user(username, projection=USER_PROFILE):
     """
     Gets the profile page user
 
     Args:
         username (str): username of the views profile page
+        projection (dict): fields to load, defaults to everything but the password
+
+    Repeat lookups in the same request are served from the identity map
+    until a write to users calls forget("users").
 
     return:
         dictionary: profile owners information
     """
-    return mongo.db.users.find_one({
-        "username": username
-    })
+    return remember(
+        "users", "username", username, projection,
+        lambda: repository.find_user_by_username(username, projection))
 
 
-def get_business_owner(user_id):
+def get_business_owner(user_id, projection=None):
     """
     Retrieves a business document owned by the specified user.
 
@@ -85,134 +125,298 @@ def get_business_owner(user_id):
 
     Args:
         user_id (str): The unique identifier of the user who owns the business.
+        projection (dict): Fields to load; None loads the whole business.
+
+    Like the user helpers, this is memoised for the rest of the request.
 
     Returns:
         dict or None: The business document if found, otherwise None.
     """
-    return mongo.db.business.find_one({
-        "owner_id": ObjectId(user_id)
-    })
+    owner_id = ObjectId(user_id)
+    return remember(
+        "business", "owner_id", owner_id, projection,
+        lambda: repository.find_business_by_owner(owner_id, projection))
+
+
+@main.route("/")
+@query_budget(5)
+@cached(lambda: ["home"])
+def home():
+    """
+    Renders the home page from the homepage summary: business counts per
+    category, so empty categories are hidden, and the latest deals.
+    """
+    summary = load_home_summary(mongo.db)
+    return render_template("index.html", category_counts=summary["categories"],
+                           latest_deals=summary["latest_deals"])
+
+
+@main.route("/about")
+@query_budget(1)
+@cached(lambda: ["about"])
+def about():
+    """Renders the about page"""
+    return render_template("about.html")
+
+
+@main.route("/metrics")
+@query_budget(0)
+def metrics_page():
+    """
+    Serves pool and per-route request metrics in the Prometheus text format.
+
+    Only to scrapers sending METRICS_TOKEN or coming from
+    METRICS_ALLOWED_IPS; anyone else gets a 404.
+    """
+    if not request_metrics.may_scrape():
+        abort(404)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
-def get_business_reviews(owners_id):
+@main.route("/media/<digest>")
+@query_budget(0)
+def media_file(digest):
     """
-    Retrieves all reviews for a business using the owner's identifier.
+    Streams a stored image by its content digest.
 
-    - Converts the provided owner_id to an ObjectId.
-    - Queries the MongoDB 'reviews' collection for documents where the 'business_id' matches the converted owner_id.
+    - The digest doubles as a strong ETag, so a matching If-None-Match gets a 304.
+    - Blobs never change for a given digest, so they are cached for a year as immutable.
 
     Args:
-        owners_id (str): The unique identifier of the business owner, used as the business_id in reviews.
+        digest (str): The sha256 hex digest of the image.
 
     Returns:
-        list: A list of review documents associated with the business. If no reviews are found, returns an empty list.
+        Response: The image bytes, a 304, or a 404 if the blob does not exist.
     """
-    return list(mongo.db.reviews.find({
-        "business_id": ObjectId(owners_id)
-    }))
+    if not is_digest(digest):
+        abort(404)
 
+    response = send_blob(digest)
+    if response is None:
+        abort(404)
+    return response
 
-def get_lat_lng(address):
+
+@main.route("/media/<digest>/<variant>.<fmt>")
+@query_budget(0)
+def media_variant(digest, variant, fmt):
     """
-    Retrieves the latitude and longitude for a given address using the Google Geocoding API.
+    Streams a resized variant of a stored image.
 
-    This function takes a single address as input and makes a request to the Google Geocoding API.
-    It parses the JSON response to extract the latitude and longitude of the address. If the address
-    is empty or the API response is not successful, it returns (None, None).
+    Variants are built in the background after upload, so until one exists
+    this redirects to the original image without caching the redirect.
 
     Args:
-        address (str): The address for which to retrieve the geographical coordinates.
+        digest (str): The digest of the original image.
+        variant (str): The variant name, e.g. "thumb" or "card".
+        fmt (str): The image format, e.g. "webp".
 
     Returns:
-        tuple: A tuple containing the latitude and longitude of the given address. If the address
-            is invalid or an error occurs in the API call, returns (None, None).
+        Response: The variant bytes, a 304, a redirect to the original, or a 404.
     """
-    if not address:
-        return None, None
-    api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={api_key}"
-    response = requests.get(url).json()
-    if response["status"] == "OK":
-        location = response["results"][0]["geometry"]["location"]
-        return location["lat"], location["lng"]
-    return None, None
+    if not is_digest(digest) or variant not in VARIANT_WIDTHS or fmt not in images.formats:
+        abort(404)
 
+    response = send_blob(variant_key(digest, variant, fmt))
+    if response is None:
+        response = redirect(url_for("main.media_file", digest=digest))
+        response.cache_control.no_cache = True
+    return response
 
-@main.route("/")
-def home():
-    """Renders the home page"""
-    return render_template("index.html")
 
+def send_blob(key):
+    """
+    Builds a streaming response for a blob in the media store.
 
-@main.route("/about")
-def about():
-    """Renders the about page"""
-    return render_template("about.html")
+    - Keys never change content, so the key is used as a strong ETag and the
+      response is cached for a year as immutable.
+    - The Content-Type comes from the blob's own bytes, and nosniff stops
+      browsers from second-guessing it.
+
+    Args:
+        key (str): The media store key.
+
+    Returns:
+        Response or None: The blob response or a 304, or None if the blob is missing.
+    """
+    if key in request.if_none_match:
+        response = Response(status=304)
+    else:
+        blob = media.open(key)
+        if blob is None:
+            return None
+        mimetype = sniff_mimetype(blob.read(16))
+        blob.seek(0)
+        response = Response(
+            wrap_file(request.environ, blob),
+            mimetype=mimetype,
+            direct_passthrough=True
+        )
+        response.content_length = media.size(blob)
+
+    response.set_etag(key)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
+
+
+@main.app_template_filter("is_digest")
+def is_digest_filter(value):
+    """Lets templates tell migrated images from legacy base64 data."""
+    return is_digest(value)
+
+
+@main.app_template_filter("srcset")
+def srcset(digest, fmt):
+    """
+    Builds a srcset listing every resized variant of an image in one format.
+
+    Args:
+        digest (str): The digest of the original image.
+        fmt (str): The image format, e.g. "webp".
+
+    Returns:
+        str: A srcset value such as "/media/<digest>/thumb.webp 160w, ...".
+    """
+    return ", ".join(
+        "{} {}w".format(
+            url_for("main.media_variant", digest=digest, variant=variant, fmt=fmt),
+            width
+        )
+        for variant, width in sorted(VARIANT_WIDTHS.items(), key=lambda item: item[1])
+    )
+
+
+@main.app_context_processor
+def inject_image_formats():
+    """Makes the enabled variant formats available to the picture macro."""
+    return dict(image_formats=images.formats)
+
+
+@main.app_template_filter("media_url")
+def media_url(value):
+    """
+    Turns a stored image value into an <img> src.
+
+    Digests point at the media route; anything else is treated as legacy
+    base64 data that has not been migrated yet.
+    """
+    if is_digest(value):
+        return url_for("main.media_file", digest=value)
+    return f"data:image/jpeg;base64,{value}"
 
 
 def getImages(image_name):
     """
-    Handles image upload, encodes it in Base64, and returns the encoded data.
+    Handles image upload, stores it in the media store, and returns its digest.
 
-    This function checks if a file is uploaded under the "profile_image" key in the request.
-    If a valid image file is found, it reads the file and encodes it in Base64 format.
+    This function checks if a file is uploaded under the image_name key in the request.
+    If a valid image file is found, it is streamed into the content-addressed media store.
 
     Returns:
-        str or None: The Base64-encoded image data if successful, otherwise None.
+        str or None: The digest of the stored image, or None if no image was
+        uploaded or it could not be stored. A failure is logged and flashed,
+        and callers carry on without the image (keeping any previous one).
 
     Raises:
-        Exception: If an error occurs while reading the image, it logs the error,
-                   flashes a failure message, and redirects to the registration page.
+        UploadTooLarge: If the file is over MAX_UPLOAD_SIZE; upload_too_large
+            turns it into a 413.
+        UnsupportedImage: If the file is not an image; unsupported_image
+            sends the user back to the form.
     """
-    image_data = None
     if image_name in request.files:
         image_file = request.files[image_name]
         if image_file.filename != "":
             try:
-                # Read the image file and encode it as Base64
-                image_data = base64.b64encode(
-                    image_file.read()).decode("utf-8")
-                return image_data
-            except Exception as e:
-                print("Error reading image:", e)
+                # Store the image once, keyed by the hash of its bytes
+                return save_upload(image_file)
+            except (UploadTooLarge, UnsupportedImage):
+                # Handled by upload_too_large and unsupported_image below
+                raise
+            except Exception:
+                current_app.logger.exception("Could not store %s", image_name)
                 flash(f"Failed to process {image_name}.", "danger")
-                return redirect(url_for("main.register"))
+    return None
+
+
+@main.app_errorhandler(RequestEntityTooLarge)
+@main.app_errorhandler(UploadTooLarge)
+def upload_too_large(error):
+    """
+    Sends the user back to the form they submitted when an upload is over
+    MAX_UPLOAD_SIZE, or the whole request is over MAX_CONTENT_LENGTH.
+
+    Returns:
+        Response: A redirect to the referring page, or the home page.
+    """
+    if isinstance(error, UploadTooLarge):
+        limit = error.max_size
+    else:
+        limit = current_app.config["MAX_CONTENT_LENGTH"]
+    flash(f"Uploads must be smaller than {limit // (1024 * 1024)}MB.", "danger")
+    return redirect(request.referrer or url_for("main.home"))
+
+
+@main.app_errorhandler(UnsupportedImage)
+def unsupported_image(error):
+    """
+    Sends the user back to the form they submitted when an upload is not
+    an image.
+
+    Returns:
+        Response: A redirect to the referring page, or the home page.
+    """
+    flash("Images must be JPEG, PNG, GIF, WebP or AVIF files.", "danger")
+    return redirect(request.referrer or url_for("main.home"))
+
+
+@main.app_errorhandler(PasswordBusy)
+def password_busy(error):
+    """Asks the user to retry when every password hashing thread is busy."""
+    flash("We are very busy right now, please try again in a moment.", "warning")
+    return redirect(request.referrer or url_for("main.login"))
 
 
 @main.route("/register", methods=["GET", "POST"])
+@query_budget(2)
 def register():
     """
     Handles user registration.
 
     If the request method is POST, the function:
-    - Checks if the username already exists in the database.
-    - If the username exists, flashes an error message and redirects back to the form.
-    - If not, processes the profile image (if provided).
+    - Checks the username and email are not taken yet, before doing any
+      expensive work, and flashes an error message if either is.
+    - Processes the profile image (if provided).
     - Hashes the password and stores user details in the database.
-    - Creates a session for the newly registered user.
+    - The unique indexes on username and email also reject duplicates, so
+      two registrations racing each other cannot both succeed.
     - Redirects to the login page with a success message.
 
     Returns:
         - If the method is GET: Renders the registration form.
         - If registration is successful: Redirects to the login page.
-        - If the username already exists: Redirects to the registration form with an error message.
+        - If the username or email already exists: Redirects to the registration form with an error message.
     """
     if request.method == "POST":
-        # Check the user doesn't already exist
-        existing_user = mongo.db.users.find_one({
-            "username": request.form.get("username").lower()
-        })
-
-        if existing_user:
-            flash("A user with that username already exist", "danger")
+        username = request.form.get("username").lower()
+        email = request.form.get("email").lower()
+
+        # Checked first so a duplicate costs neither a bcrypt hash nor an
+        # orphaned upload, and still caught without the unique indexes
+        existing = repository.find_user_by_username_or_email(username, email)
+        if existing:
+            taken = "email" if existing.get("email") == email else "username"
+            flash(f"A user with that {taken} already exist", "danger")
             return redirect(request.url)
 
         image_data = getImages("profile_image")
 
         register = {
-            "username": request.form.get("username").lower(),
-            "email": request.form.get("email").lower(),
-            "password": generate_password_hash(request.form.get("password")),
+            "username": username,
+            "email": email,
+            "password": passwords.hash(request.form.get("password")),
             "profile": {
                 "name": request.form.get("name"),
                 "postcode": request.form.get("postcode"),
@@ -222,7 +426,15 @@ def register():
             }
         }
 
-        mongo.db.users.insert_one(register)
+        # The unique indexes reject a duplicate registered since the check
+        try:
+            mongo.db.users.insert_one(register)
+        except DuplicateKeyError as e:
+            if "email" in (e.details or {}).get("keyPattern", {}):
+                flash("A user with that email already exist", "danger")
+            else:
+                flash("A user with that username already exist", "danger")
+            return redirect(request.url)
 
         flash("Congratulations and welcome to mind your own business.", "success")
         return redirect(url_for("main.login"))
@@ -231,26 +443,35 @@ def register():
 
 
 @main.route("/login", methods=["GET", "POST"])
+@query_budget(2)
 def login():
     """
     Handles user login.
 
     If the request method is POST, the function:
     - Retrieves the user from the database using the provided email.
-    - If the user exists, it verifies the password.
-    - If the password is correct, creates a session and redirects the user to their profile page.
+    - If the user exists, it verifies the password on the bounded hashing pool.
+    - If the password is correct, replaces a legacy or outdated hash with one
+      at the current bcrypt cost, creates a session and redirects the user to
+      their profile page.
 
     Returns:
         - If the method is GET: Renders the login form.
         - If login is successful: Redirects to the user's profile page.
     """
     if request.method == "POST":
-        check_user = mongo.db.users.find_one({
-            "email": request.form.get("email").lower()
-        })
+        check_user = repository.find_user_by_email(
+            request.form.get("email").lower())
 
         if check_user:
-            if check_password_hash(check_user["password"], request.form.get("password")):
+            password = request.form.get("password")
+            if passwords.verify(check_user["password"], password):
+                if passwords.needs_rehash(check_user["password"]):
+                    mongo.db.users.update_one(
+                        {"_id": check_user["_id"]},
+                        {"$set": {"password": passwords.hash(password)}}
+                    )
+
                 session["user"] = check_user["username"]
 
                 # Check whether the user has a session[next]
@@ -272,6 +493,7 @@ def login():
 
 
 @main.route("/logout")
+@query_budget(0)
 @logged_in_user()
 def logout():
     """
@@ -290,12 +512,15 @@ def logout():
 
 
 @main.route("/profile/<username>")
+@query_budget(3)
 @logged_in_user()
 def profile(username):
     """
     Displays the profile page for a given username.
 
-    - Retrieves the user's profile data from the database.
+    - Loads the user, their business and their deal in one aggregation; the
+      newest reviews come from the summary stored on the business.
+    - ?after= / ?before= cursors page through older reviews.
     - If the user is not found, flashes an error message and redirects to the homepage.
     - If the user exists, renders the profile page with the user's data.
 
@@ -306,59 +531,76 @@ def profile(username):
         - Renders the "profile.html" template with the user's data if found.
         - Redirects to the homepage with an error message if no user is found.
     """
-    profile_user = get_profile_user(username)
+    view = load_profile_view(
+        username,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        limit=page_size("REVIEWS_PAGE_SIZE")
+    )
 
-    if not profile_user:
+    if not view:
         flash("No user found", "danger")
         return redirect(url_for("main.home"))
 
-    get_business = get_business_owner(profile_user["_id"])
-
-    get_all_businesses = mongo.db.business.find_one({
-        "owner_id": ObjectId(profile_user['_id'])
-    })
+    # Coordinates are geocoded when the business is saved, never here
+    lat, lng = view.coordinates
 
-    # Default lat/lng to None
-    lat, lng = None, None
+    return render_template(
+        "profile.html",
+        username=username,
+        business=view.business,
+        user=view.user,
+        reviews=view.reviews,
+        review_count=view.review_count,
+        lat=lat,
+        lng=lng,
+        deal=view.deal
+    )
 
-    if get_business:
-        # Ensure get_lat_lng() does not break if location is missing
-        if "location" in get_all_businesses and get_all_businesses["location"]:
-            lat, lng = get_lat_lng(get_all_businesses["location"])
 
-        get_reviews = get_business_reviews(get_business["owner_id"])
+@main.route("/profile/<username>/reviews")
+@query_budget(2)
+@logged_in_user()
+def profile_reviews(username):
+    """
+    Returns one more page of a profile's reviews, for the profile page to
+    append as the visitor scrolls.
 
-        get_deal = mongo.db.deals.find_one({
-            "business_owner": ObjectId(profile_user["_id"])
-        })
+    - Takes the same after/before cursors as the profile page.
+    - Responds with JSON ({"html", "next"}) by default, or the bare HTML
+      fragment when the client prefers text/html.
 
-        return render_template(
-            "profile.html",
-            username=username,
-            business=get_business,
-            user=profile_user,
-            reviews=get_reviews,
-            lat=lat,
-            lng=lng,
-            get_all_businesses=get_all_businesses,
-            deal=get_deal or None
-        )
+    Args:
+        username (str): The username of the profile being viewed.
 
-    # If the user does not own a business, still return lat/lng as None
-    return render_template(
-        "profile.html",
-        username=username,
-        user=profile_user,
-        business=None,
-        reviews=None,
-        lat=None,
-        lng=None,
-        get_all_businesses=None,
-        deal=None
+    Returns:
+        Response: The rendered reviews and the URL of the page after them,
+        or a 404 if there is no such user.
+    """
+    owner = get_profile_user(username, USER_AUTH)
+    if not owner:
+        abort(404)
+
+    reviews = repository.find_reviews_for_business(
+        owner["_id"],
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        limit=page_size("REVIEWS_PAGE_SIZE")
     )
+    html = render_template("review_items.html", reviews=reviews, username=username)
+
+    if request.accept_mimetypes.best_match(["application/json", "text/html"]) == "text/html":
+        return html
+
+    next_url = None
+    if reviews.next_token:
+        next_url = url_for("main.profile_reviews", username=username,
+                           after=reviews.next_token)
+    return jsonify(html=html, next=next_url)
 
 
 @main.route("/edit_details/<user_id>", methods=["GET", "POST"])
+@query_budget(2)
 @logged_in_user()
 def edit_details(user_id):
     """
@@ -382,7 +624,7 @@ def edit_details(user_id):
     """
     if request.method == "POST":
         # Fetch the current user details from the database
-        current_user = get_current_user()
+        current_user = get_current_user(USER_PROFILE)
 
         if not current_user:
             flash("User not found", "danger")
@@ -409,12 +651,21 @@ def edit_details(user_id):
                 {"_id": ObjectId(user_id)},  # Match by ObjectId
                 {"$set": updated_details}   # Set updated values
             )
+            forget("users")
 
             # Check if the update was successful
             if result.matched_count == 0:
                 flash("User not found", "danger")
                 return redirect(url_for('main.profile', username=session['user']))
 
+            # Keep the author shown on their reviews up to date, in the background
+            if updated_details["profile"]["name"] != current_user["profile"]["name"] or image_data:
+                refresh_author_later({
+                    "_id": ObjectId(user_id),
+                    "username": current_user["username"],
+                    "profile": updated_details["profile"]
+                })
+
             flash("Updated Successfully", "success")
             return redirect(url_for('main.profile', username=session['user']))
         except Exception as e:
@@ -423,6 +674,7 @@ def edit_details(user_id):
 
 
 @main.route("/add_business/<user_id>", methods=["GET", "POST"])
+@query_budget(6)
 @logged_in_user()
 def add_business(user_id):
     """
@@ -430,7 +682,7 @@ def add_business(user_id):
 
     - Verifies that the user is logged in.
     - Checks if images are uploaded; if not, flashes a warning message.
-    - Processes uploaded images by encoding them in Base64.
+    - Stores uploaded images in the media store and keeps their digests.
     - Collects business details from the form and constructs a business object.
     - Inserts the new business into the database.
     - Redirects the user back to their profile with a success or error message.
@@ -455,22 +707,23 @@ def add_business(user_id):
 
         # Get the files
         files = request.files.getlist("business_images")
-        encoded_images = []
+        image_digests = []
 
         # Process each image
         for file in files:
             if file:  # Ensure the file is not empty
-                image_content = file.read()
-                encoded_image = base64.b64encode(image_content).decode("utf-8")
-                encoded_images.append(encoded_image)
+                image_digests.append(save_upload(file))
 
+        coordinates = coordinates_for(request.form.get("location"))
         business_to_add = {
             "owner_id": ObjectId(user_id),
             "company_name": request.form.get("company_name"),
             "description": request.form.get("description"),
             "location": request.form.get("location"),
             "category": category,  # ✅ Ensure category is added
-            "images": encoded_images,
+            "coordinates": coordinates,
+            "point": geo_point(coordinates),
+            "images": image_digests,
             "contact_info": {
                 "email": request.form.get("email"),
                 "phone": request.form.get("phone"),
@@ -479,16 +732,20 @@ def add_business(user_id):
         }
 
         create_business = mongo.db.business.insert_one(business_to_add)
+        forget("business")
 
         if not create_business:
             flash("Something has gone wrong", "danger")
             return redirect(url_for("main.profile", username=current_user['username']))
 
+        count_business(mongo.db, category, 1)
+        notify_changed(category_tag(category), "search", "home")
         flash("Your business has been added successfully", "success")
         return redirect(url_for("main.profile", username=current_user['username']))
 
 
 @main.route("/edit_business/<business_id>", methods=["GET", "POST"])
+@query_budget(7)
 def edit_business(business_id):
     """
     Handles business profile updates.
@@ -510,7 +767,7 @@ def edit_business(business_id):
     """
 
     # Retrieve the business from the database
-    business = mongo.db.business.find_one({'_id': ObjectId(business_id)})
+    business = repository.find_business(business_id, BUSINESS_EDIT)
 
     # If business does not exist, flash an error and redirect
     if not business:
@@ -533,16 +790,23 @@ def edit_business(business_id):
     image_list = business['images'] if business and 'images' in business else [
     ]
 
-    # Convert and append new images to the list if provided
+    # Store and append new images to the list if provided
     for image in new_images:
         if image and image.filename != '':
-            image_list.append(base64.b64encode(image.read()).decode('utf-8'))
+            image_list.append(save_upload(image))
+
+    # Only geocode again when the location has changed
+    coordinates = business.get("coordinates")
+    if location != business.get("location") or not coordinates:
+        coordinates = coordinates_for(location)
 
     # Prepare the updated business data
     updated_business = {
         "company_name": company_name,
         "description": description,
         "location": location,
+        "coordinates": coordinates,
+        "point": geo_point(coordinates),
         "category": category,
         "images": image_list,  # Retain old images if no new ones are uploaded
         "contact_info": {
@@ -555,6 +819,12 @@ def edit_business(business_id):
     # Perform the update operation in the database
     mongo.db.business.update_one({'_id': ObjectId(business_id)}, {
                                  '$set': updated_business})
+    forget("business")
+    move_business(mongo.db, business.get("category"), category)
+
+    # Evict the listing the business was in and the one it is in now
+    notify_changed(category_tag(business.get("category")), category_tag(category),
+                   "search", "home")
 
     # Flash a success message and redirect to the profile page
     flash("Business details updated successfully", "success")
@@ -562,6 +832,7 @@ def edit_business(business_id):
 
 
 @main.route("/add_review/<username>/<business_id>", methods=["GET", "POST"])
+@query_budget(6)
 @logged_in_user()
 def add_review(username, business_id):
     """
@@ -575,11 +846,12 @@ def add_review(username, business_id):
         * Constructs a review document containing:
             - business_id: Converted to an ObjectId.
             - user_id: Converted to an ObjectId from the current user's ID.
-            - profile_image: Extracted from the current user's profile.
+            - author: A snapshot of the reviewer's name and avatar digest.
             - text: The review text from the form input named "reviews".
-            - date: The review date from the form input named "datefeild".
+            - date: When the review was posted, set by the server so reviews sort newest first.
         * Inserts the review into the MongoDB 'reviews' collection.
         * If the insertion fails, flashes an error and redirects to the profile page.
+        * Rebuilds the review summary stored on the business.
         * If the insertion is successful, flashes a success message and redirects to the profile page.
 
     Args:
@@ -596,8 +868,8 @@ def add_review(username, business_id):
 
     if request.method == "POST":
         # Get all current user details
-        current_user = get_current_user()
-        profile = get_profile_user(username)
+        current_user = get_current_user(USER_REVIEW_AUTHOR)
+        profile = get_profile_user(username, USER_AUTH)
 
         if not current_user:
             flash("You need to be logged in to leave a review", "danger")
@@ -606,9 +878,9 @@ def add_review(username, business_id):
         create_review = {
             "business_id": ObjectId(business_id),
             "user_id": ObjectId(current_user["_id"]),
-            "profile_image": current_user['profile']['profile_image'],
+            "author": author_snapshot(current_user),
             "text": request.form.get("reviews"),
-            "date": request.form.get("datefeild")
+            "date": datetime.now(timezone.utc)
         }
 
         insert_review = mongo.db.reviews.insert_one(create_review)
@@ -617,11 +889,13 @@ def add_review(username, business_id):
             flash("Sorry something went wrong", "danger")
             return redirect(url_for("main.profile", username=profile["username"]))
 
+        refresh_review_summary(mongo.db, ObjectId(business_id))
         flash("Review added successfully", "success")
         return redirect(url_for("main.profile", username=profile["username"]))
 
 
 @main.route("/edit_review/<review_id>", methods=["GET", "POST"])
+@query_budget(6)
 @logged_in_user()
 def edit_review(review_id):
     """
@@ -630,7 +904,8 @@ def edit_review(review_id):
     - On a POST request:
         * Retrieves the review corresponding to the provided review_id from the database.
         * If the review is not found, flashes an error message and redirects to the user's profile.
-        * Constructs an updated review dictionary using the form inputs for the review text and date.
+        * Constructs an updated review dictionary from the form's review text, dated now.
+        * Rebuilds the review summary stored on the business.
         * Updates the review document in the MongoDB 'reviews' collection.
         * If the update operation fails, flashes an error message and redirects to the referring page.
         * If the update is successful, flashes a success message and redirects to the referring page.
@@ -643,9 +918,7 @@ def edit_review(review_id):
         Response: A Flask redirect response that either directs the user to the referring page or the profile page with an appropriate flash message.
     """
     if request.method == "POST":
-        get_review = mongo.db.reviews.find_one({
-            "_id": ObjectId(review_id)
-        })
+        get_review = repository.find_review(review_id)
 
         curent_user = get_current_user()
 
@@ -656,12 +929,10 @@ def edit_review(review_id):
         # Check whether the current user owns the review
         if ObjectId(get_review["user_id"]) == ObjectId(curent_user["_id"]):
 
+            # The author snapshot is left as it is
             updated_review = {
-                "business_id": ObjectId(get_review["business_id"]),
-                "user_id": ObjectId(get_review["user_id"]),
-                "profile_image": get_review["profile_image"],
                 "text": request.form.get("review"),
-                "date": request.form.get("datefeild"),
+                "date": datetime.now(timezone.utc),
             }
 
             update_to_db = mongo.db.reviews.update_one(
@@ -673,6 +944,7 @@ def edit_review(review_id):
                 flash("Sorry something has gone wrong", "danger")
                 return redirect(request.referrer)
 
+            refresh_review_summary(mongo.db, ObjectId(get_review["business_id"]))
             flash("Updated Successfully!!", "success")
             return redirect(request.referrer)
 
@@ -683,6 +955,7 @@ def edit_review(review_id):
 
 
 @main.route("/review_delete/<review_id>", methods=["GET", "POST"])
+@query_budget(6)
 @logged_in_user()
 def review_delete(review_id):
     """
@@ -704,9 +977,7 @@ def review_delete(review_id):
     if request.method == "POST":
         current_user = get_current_user()
 
-        get_review_to_delete = mongo.db.reviews.find_one({
-            "_id": ObjectId(review_id)
-        })
+        get_review_to_delete = repository.find_review(review_id)
 
         if ObjectId(current_user["_id"]) == ObjectId(get_review_to_delete["user_id"]):
 
@@ -720,6 +991,9 @@ def review_delete(review_id):
                 flash("Sorry something went wrong", "danger")
                 return redirect(url_for('main.profile', username=profile_username))
 
+            refresh_review_summary(
+                mongo.db, ObjectId(get_review_to_delete["business_id"]))
+
             flash("Deleted Successfully!", "success")
             return redirect(url_for('main.profile', username=profile_username))
 
@@ -730,6 +1004,8 @@ def review_delete(review_id):
 
 
 @main.route("/searched_category", methods=["GET", "POST"])
+@query_budget(3)
+@cached(lambda: [category_tag(request.args.get("category"))])
 def searched_category():
     """
     Handles category-based business searches and redirects to user profiles.
@@ -743,10 +1019,11 @@ def searched_category():
     - If no user is logged in, flashes a warning and redirects to the login page.
 
     For GET requests:
-    - Retrieves the selected category from the query parameters.
-    - Queries the 'business' collection for all businesses that match the selected category.
-    - If no businesses are found, flashes an error message and redirects to the home page.
-    - If businesses are found, renders the 'searched_category.html' template with the category data.
+    - Retrieves the selected category and the optional after/before cursors from the query parameters.
+    - Queries the 'business' collection for one page of businesses that match the selected category.
+    - If the category has no businesses, flashes an error message and redirects to the home page.
+    - If businesses are found, renders the 'searched_category.html' template with the category data
+      and links to the next and previous pages.
 
     Args:
         None (relies on form data for POST requests and query parameters for GET requests).
@@ -759,9 +1036,7 @@ def searched_category():
     if request.method == "POST":
         owner_id = request.form.get("owner_id")
 
-        getProfile = mongo.db.users.find_one({
-            "_id": ObjectId(owner_id)
-        })
+        getProfile = repository.find_user_by_id(owner_id, USER_AUTH)
 
         username = getProfile["username"]
 
@@ -781,20 +1056,121 @@ def searched_category():
             return redirect(url_for("main.login"))
 
     selected_category = request.args.get("category")
+    after = request.args.get("after")
+    before = request.args.get("before")
 
-    category = list(mongo.db.business.find({
-        "category": selected_category
-    }))
+    # The homepage summary already knows when a category is empty
+    if not (after or before) and category_count(mongo.db, selected_category) == 0:
+        flash(f"There are currently no businesses under {selected_category}", "danger")
+        return redirect(url_for("main.home"))
 
-    if not category:
+    category = repository.find_businesses_by_category(
+        selected_category, after=after, before=before,
+        limit=page_size("CATEGORY_PAGE_SIZE"))
+
+    if not category and not (after or before):
         flash(f"""There are currently no businesses under
                {selected_category}""", "danger")
         return redirect(url_for("main.home"))
 
-    return render_template("searched_category.html", category=category, selected_category=selected_category)
+    return render_template("searched_category.html", category=category, page=category,
+                           selected_category=selected_category)
+
+
+@main.route("/search")
+@query_budget(3)
+@cached(lambda: ["search"])
+def search():
+    """
+    Free text search over business names, descriptions and locations.
+
+    - Uses the business_text index, most relevant first.
+    - ?category= narrows the results to one category; the first page also
+      lists how many matches each category has.
+    - ?after= / ?before= cursors move between pages.
+
+    Returns:
+        Renders 'search.html' with the results, or just the search form when
+        nothing was searched for.
+    """
+    query = request.args.get("q", "").strip()
+    selected_category = request.args.get("category") or None
+    after = request.args.get("after")
+    before = request.args.get("before")
+
+    if not query:
+        return render_template("search.html", query="", results=None, facets=[],
+                               selected_category=selected_category)
+
+    try:
+        results = search_businesses(
+            query, selected_category, after=after, before=before,
+            limit=page_size("SEARCH_PAGE_SIZE"))
+        # Facets only change with the query, so later pages skip them
+        facets = [] if (after or before) else category_facets(query)
+    except OperationFailure as e:
+        current_app.logger.warning("Search failed: %s", e)
+        flash("Search is unavailable right now, please browse by category.", "warning")
+        return redirect(url_for("main.home"))
+
+    return render_template("search.html", query=query, results=results, page=results,
+                           facets=facets, selected_category=selected_category)
+
+
+@main.route("/nearby")
+@query_budget(4)
+@cached(lambda: ["search"])
+def nearby():
+    """
+    Lists businesses near a postcode or a lat/lng pair, nearest first.
+
+    - ?postcode= is geocoded through the shared geocode cache; ?lat=&lng=
+      (e.g. from the browser's location) skip the lookup.
+    - ?radius= is in km, capped at NEARBY_MAX_RADIUS_KM.
+    - ?category= narrows the results to one category.
+    - ?after= / ?before= cursors move between pages.
+
+    Returns:
+        Renders 'nearby.html' with the results, or just the form when no
+        location was given or it could not be found.
+    """
+    postcode = request.args.get("postcode", "").strip()
+    selected_category = request.args.get("category") or None
+    max_radius = current_app.config["NEARBY_MAX_RADIUS_KM"]
+    radius = min(request.args.get("radius", 5, type=float), max_radius)
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    after = request.args.get("after")
+    before = request.args.get("before")
+
+    form = dict(postcode=postcode, radius=radius, selected_category=selected_category,
+                categories=CATEGORIES, max_radius=max_radius)
+
+    if (lat is None or lng is None) and postcode:
+        coordinates = coordinates_for(postcode)
+        if coordinates is None:
+            flash("We couldn't find that postcode, please check it and try again.", "warning")
+            return render_template("nearby.html", results=None, **form)
+        lat, lng = coordinates["lat"], coordinates["lng"]
+
+    if lat is None or lng is None or radius <= 0:
+        return render_template("nearby.html", results=None, **form)
+
+    try:
+        results = nearby_businesses(
+            lat, lng, radius, selected_category, after=after, before=before,
+            limit=page_size("NEARBY_PAGE_SIZE"))
+    except OperationFailure as e:
+        current_app.logger.warning("Nearby search failed: %s", e)
+        flash("Nearby search is unavailable right now, please browse by category.", "warning")
+        return redirect(url_for("main.home"))
+
+    return render_template("nearby.html", results=results, page=results,
+                           lat=None if postcode else lat, lng=None if postcode else lng, **form)
 
 
 @main.route("/delete_business/<business_user_id>", methods=["GET", "POST"])
+@query_budget(6)
 @logged_in_user()
 def delete_business(business_user_id):
     """
@@ -808,7 +1184,7 @@ def delete_business(business_user_id):
     - If the user is not authorized, flashes an error and redirects to the profile page.
     - If authorized:
         - Deletes the business from the database.
-        - Deletes all reviews associated with the business.
+        - Queues deleting its reviews and deals in the background.
         - Flashes a success message confirming the deletion.
     - If an error occurs during deletion, catches the exception, flashes an error, and redirects to the profile page.
 
@@ -823,7 +1199,7 @@ def delete_business(business_user_id):
     """
     current_user = get_current_user()
 
-    business = get_business_owner(business_user_id)
+    business = get_business_owner(business_user_id, BUSINESS_OWNER)
 
     if not business:
         flash("Business not found", "danger")
@@ -834,15 +1210,10 @@ def delete_business(business_user_id):
         return redirect(url_for("main.profile", username=session["user"]))
 
     try:
-        mongo.db.business.delete_one({"_id": ObjectId(business["_id"])})
-
-        mongo.db.reviews.delete_many(
-            {"business_id": ObjectId(business_user_id)})
-
-        mongo.db.deals.delete_one({
-            "business_owner": ObjectId(business_user_id)
-        })
+        delete_later(mongo.db, "business", business["owner_id"], business)
+        forget("business")
 
+        notify_changed(category_tag(business.get("category")), "search", "home")
         flash("Business and associated reviews deleted successfully", "success")
     except Exception as e:
         flash(f"An error occurred: {e}", "danger")
@@ -852,6 +1223,7 @@ def delete_business(business_user_id):
 
 
 @main.route("/delete_account/<username>", methods=["GET", "POST"])
+@query_budget(7)
 @logged_in_user()
 def delete_account(username):
     """
@@ -861,10 +1233,9 @@ def delete_account(username):
     - Retrieves the current logged-in user and the profile being accessed.
     - Ensures that the user attempting to delete the account is its owner.
     - Checks if the user owns a business in the database.
-    - If a business exists:
-        - Deletes all reviews associated with the business.
-        - Deletes the business itself from the database.
-    - Deletes the user account from the database.
+    - Deletes the user account and any business from the database.
+    - Queues deleting the business's reviews and deals, and the reviews the
+      user wrote, in the background.
     - Clears the session to log out the user.
     - Flashes a success message and redirects to the home page.
 
@@ -882,30 +1253,18 @@ def delete_account(username):
     if request.method == "POST":
         # Fetch the current user and the profile user
         current_user = get_current_user()
-        page_profile_user = get_profile_user(username)
+        page_profile_user = get_profile_user(username, USER_AUTH)
 
         # Check if the current user is the owner of the profile
         if page_profile_user["username"] == session["user"]:
             # Check for business owned by the user
-            check_for_business = mongo.db.business.find_one({
-                "owner_id": ObjectId(current_user["_id"])
-            })
+            check_for_business = get_business_owner(current_user["_id"], BUSINESS_OWNER)
 
-            # If a business exists, delete all associated reviews
+            # Delete the user account and business now, the rest in the background
+            delete_later(mongo.db, "account", current_user["_id"], check_for_business)
+            forget("users", "business")
             if check_for_business:
-                mongo.db.reviews.delete_many({
-                    "business_id": ObjectId(check_for_business["owner_id"])
-                })
-
-                # Delete the business itself
-                mongo.db.business.delete_one({
-                    "_id": ObjectId(check_for_business["_id"])
-                })
-
-            # Delete the user account
-            mongo.db.users.delete_one({
-                "_id": ObjectId(current_user["_id"])
-            })
+                notify_changed(category_tag(check_for_business.get("category")), "search", "home")
 
             # Clear the session and redirect to home
             session.pop("user")
@@ -918,6 +1277,7 @@ def delete_account(username):
 
 
 @main.route("/create_deal/<business_id>", methods=["GET", "POST"])
+@query_budget(5)
 @logged_in_user()
 def create_deal(business_id):
     """
@@ -927,13 +1287,14 @@ def create_deal(business_id):
     - Retrieves the current logged-in user.
     - Checks if the current user is the owner of the specified business.
     - If the user is not the owner, flashes an error message and redirects to their profile.
+    - Parses the expiry date; if it is missing, invalid or in the past, flashes an error message.
     - Ensures an image file is uploaded; otherwise, flashes an error message and reloads the page.
-    - Reads and encodes the uploaded image into Base64 format.
+    - Stores the uploaded image in the media store.
     - Collects deal information from the form, including:
         - Business owner ID
         - Deal description (deal-text)
-        - Start and expiration dates
-        - Encoded deal image
+        - Start and expiration dates, plus the parsed expiry moment used by the TTL index
+        - Deal image digest
     - Inserts the deal into the database.
     - If insertion fails, flashes an error message and redirects to the profile page.
     - On success, flashes a confirmation message and reloads the current page.
@@ -954,11 +1315,17 @@ def create_deal(business_id):
     if request.method == "POST":
         # check the person creating is the account owner
         current_user = get_current_user()
-        business_owner = get_business_owner(ObjectId(business_id))
+        business_owner = get_business_owner(business_id, BUSINESS_OWNER)
 
         # check whether user owns account
         if current_user['_id'] == business_owner['owner_id']:
 
+            expires_at = parse_expiry(request.form.get("expire-date"))
+
+            if not is_live(expires_at):
+                flash("Please choose an expiry date in the future", "danger")
+                return redirect(url_for("main.profile", username=session["user"]))
+
             if "deal-image" not in request.files or not request.files["deal-image"].filename:
                 flash("No image uploaded", "danger")
                 return redirect(request.url)
@@ -967,20 +1334,16 @@ def create_deal(business_id):
             file = request.files["deal-image"]
 
             if file:  # Ensure the file is not empty
-                # Read image content
-                image_content = file.read()
-                # Encode image to Base64
-                encoded_image = base64.b64encode(image_content).decode("utf-8")
-
-                # You can now store or use the encoded_image as needed
-                # For example: save to database or pass to template
+                # Store the image and keep only its digest on the deal
+                image_digest = save_upload(file)
 
                 create = {
                     "business_owner": ObjectId(business_id),
                     "deal-text": request.form.get("deal-text"),
                     "date": request.form.get("date"),
                     "expire-date": request.form.get("expire-date"),
-                    "deal-image": encoded_image
+                    "expires_at": expires_at,
+                    "deal-image": image_digest
                 }
 
                 upload_deal = mongo.db.deals.insert_one(create)
@@ -990,6 +1353,8 @@ def create_deal(business_id):
                         "WOW, we are very sorry but something has gone wrong", "warning")
                     return redirect(url_for("main.profile", username=session["user"]))
 
+                add_latest_deal(mongo.db, {**create, "_id": upload_deal.inserted_id})
+                notify_changed("deals", "home")
                 flash("Deal Created!!", "success")
                 return redirect(request.full_path)
 
@@ -1000,6 +1365,8 @@ def create_deal(business_id):
 
 
 @main.route("/deals", methods=["GET", "POST"])
+@query_budget(2)
+@cached(lambda: ["deals"])
 def deals():
     """
     Handles business deal retrieval and user profile redirection.
@@ -1014,8 +1381,8 @@ def deals():
     - If the user is not logged in, redirects to the login page.
 
     For GET requests:
-    - Fetches all available deals from the 'deals' collection in the database.
-    - Converts the query results into a list.
+    - Fetches one page of live deals from the 'deals' collection, soonest to expire first.
+    - Uses the after/before cursors in the query string to move between pages.
     - Renders the 'deals.html' template, passing the retrieved deals.
 
     Args:
@@ -1034,8 +1401,7 @@ def deals():
 
             if user_id:
                 try:
-                    profile_user = mongo.db.users.find_one(
-                        {"_id": ObjectId(user_id)})
+                    profile_user = repository.find_user_by_id(user_id, USER_AUTH)
 
                     if profile_user:
                         return redirect(url_for("main.profile", username=profile_user["username"]))
@@ -1053,10 +1419,16 @@ def deals():
         flash("You must be logged in to see profiles", "warning")
         return redirect(url_for("main.login"))
 
-    return render_template("deals.html", deals=list(mongo.db.deals.find()))
+    deals = repository.find_deals(
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        limit=page_size("DEALS_PAGE_SIZE")
+    )
+    return render_template("deals.html", deals=deals, page=deals)
 
 
 @main.route("/edit_promo/<edit_id>", methods=["GET", "POST"])
+@query_budget(6)
 @logged_in_user()
 def edit_promo(edit_id):
     """
@@ -1067,6 +1439,7 @@ def edit_promo(edit_id):
 
     POST request:
         - Updates the existing promo in the database with new details from the form.
+        - Parses the new expiry date; if it is invalid or in the past, flashes an error message.
         - If an image is uploaded, replaces the old image; otherwise, retains the existing image.
         - If the promo does not exist, flashes an error message.
         - If the update is unsuccessful, flashes an error message.
@@ -1079,7 +1452,7 @@ def edit_promo(edit_id):
         - On failure: Redirects back to the referring page with an error message.
     """
     if request.method == "POST":
-        get_promo = mongo.db.deals.find_one({"_id": ObjectId(edit_id)})
+        get_promo = repository.find_deal(edit_id, DEAL_CARD)
 
         if not get_promo:
             flash("Sorry, we cannot find that promo", "danger")
@@ -1089,12 +1462,19 @@ def edit_promo(edit_id):
 
         if ObjectId(get_promo["business_owner"]) == ObjectId(current_user["_id"]):
 
+            expires_at = parse_expiry(request.form.get("expire-date"))
+
+            if not is_live(expires_at):
+                flash("Please choose an expiry date in the future", "danger")
+                return redirect(request.referrer)
+
             image_data = getImages("deal-image")
 
             # Prepare update data
             updated_promo = {
                 "deal-text": request.form.get("deal-text"),
                 "expire-date": request.form.get("expire-date"),
+                "expires_at": expires_at,
                 "deal-image": image_data if image_data else get_promo['deal-image']
             }
 
@@ -1108,6 +1488,8 @@ def edit_promo(edit_id):
                 flash("Sorry something has gone wrong", "danger")
                 return redirect(request.referrer)
 
+            refresh_latest_deals(mongo.db)
+            notify_changed("deals", "home")
             flash("You have successfully updated your promo", "success")
             return redirect(request.referrer)
 
@@ -1116,6 +1498,7 @@ def edit_promo(edit_id):
 
 
 @main.route("/deal_delete/<delete_id>", methods=["GET", "POST"])
+@query_budget(6)
 @logged_in_user()
 def deal_delete(delete_id):
     """
@@ -1140,7 +1523,7 @@ def deal_delete(delete_id):
     if request.method == "POST":
         current_user = get_current_user()
 
-        get_promo = mongo.db.deals.find_one({"_id": ObjectId(delete_id)})
+        get_promo = repository.find_deal(delete_id)
 
         if ObjectId(get_promo["business_owner"]) == ObjectId(current_user["_id"]):
 
@@ -1152,6 +1535,8 @@ def deal_delete(delete_id):
                 flash("How embarressing, Something has gone wrong", "warning")
                 return redirect(request.referrer)
 
+            refresh_latest_deals(mongo.db)
+            notify_changed("deals", "home")
             flash("Successfully deleted", "success")
             return redirect(request.referrer)
 
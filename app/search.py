@@ -0,0 +1,122 @@
+from .pagination import paginate_pipeline
+from .repository import BUSINESS_CARD, listing
+
+
+# Best match first; _id breaks ties so cursors are exact.
+SEARCH_SORT = [("score", -1), ("_id", 1)]
+
+# A search result card, plus the relevance score the cursor is built from.
+# An aggregation $project takes the $slice expression rather than the find()
+# projection operator, so the first image is picked that way.
+SEARCH_CARD = {
+    **{field: 1 for field in BUSINESS_CARD if field != "images"},
+    "images": {"$slice": ["$images", 1]},
+    "score": 1,
+}
+
+
+def search_query(text, category=None):
+    """
+    Builds the $match for a search, served by the business_text index.
+
+    Args:
+        text (str): What the user typed; words are ORed, "quoted phrases"
+            must match exactly and -words exclude.
+        category (str): Only match this category, if given.
+
+    Returns:
+        dict: The filter.
+    """
+    query = {"$text": {"$search": text}}
+    if category:
+        query["category"] = category
+    return query
+
+
+def search_businesses(text, category=None, after=None, before=None, limit=20):
+    """
+    Finds one page of businesses matching a free text search, most
+    relevant first.
+
+    Args:
+        text (str): The search terms.
+        category (str): Narrow the results to one category facet.
+        after (str): Cursor for the next page.
+        before (str): Cursor for the previous page.
+        limit (int): Page size.
+
+    Returns:
+        Page: Business cards, each with its relevance "score".
+    """
+    pipeline = [
+        {"$match": search_query(text, category)},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    return paginate_pipeline(
+        listing("business"), pipeline, SEARCH_SORT, SEARCH_CARD,
+        after=after, before=before, limit=limit)
+
+
+def category_facets(text):
+    """
+    Counts the businesses matching a search in each category, so the
+    results page can offer to narrow them down.
+
+    Args:
+        text (str): The search terms.
+
+    Returns:
+        list: {"category", "count"} dicts, largest first.
+    """
+    pipeline = [
+        {"$match": search_query(text)},
+        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+    ]
+    return [
+        {"category": facet["_id"], "count": facet["count"]}
+        for facet in listing("business").aggregate(pipeline)
+        if facet["_id"]
+    ]
+
+
+# Nearest first; _id breaks ties between businesses at the same spot.
+NEARBY_SORT = [("distance", 1), ("_id", 1)]
+
+# A nearby result card, plus how far away it is in metres.
+NEARBY_CARD = {
+    **{field: value for field, value in SEARCH_CARD.items() if field != "score"},
+    "distance": 1,
+}
+
+
+def nearby_businesses(lat, lng, radius_km, category=None, after=None,
+                      before=None, limit=20):
+    """
+    Finds one page of businesses within a radius of a point, nearest first,
+    using $geoNear on the point_2dsphere index.
+
+    Args:
+        lat (float): Latitude of the centre.
+        lng (float): Longitude of the centre.
+        radius_km (float): How far out to look.
+        category (str): Only include this category, if given.
+        after (str): Cursor for the next page.
+        before (str): Cursor for the previous page.
+        limit (int): Page size.
+
+    Returns:
+        Page: Business cards, each with its "distance" in metres.
+    """
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [lng, lat]},
+        "key": "point",
+        "distanceField": "distance",
+        "maxDistance": radius_km * 1000,
+        "spherical": True,
+    }
+    if category:
+        geo_near["query"] = {"category": category}
+    return paginate_pipeline(
+        listing("business"), [{"$geoNear": geo_near}], NEARBY_SORT, NEARBY_CARD,
+        after=after, before=before, limit=limit)
@@ -0,0 +1,27 @@
+from blinker import Namespace
+from flask import current_app
+
+
+_signals = Namespace()
+
+# Sent after a write changes data that rendered pages depend on. Receivers
+# get the app as sender and a "tags" list naming what changed, e.g.
+# ["deals"] or ["category:gardening"].
+content_changed = _signals.signal("content-changed")
+
+
+def category_tag(category):
+    """The tag for pages listing a category."""
+    return f"category:{category}"
+
+
+def notify_changed(*tags):
+    """
+    Announces that the data behind the given tags has changed.
+
+    Args:
+        *tags (str): What changed, e.g. "deals" or category_tag("gardening").
+    """
+    tags = [tag for tag in tags if tag]
+    if tags:
+        content_changed.send(current_app._get_current_object(), tags=tags)
@@ -0,0 +1,345 @@
+import json
+import logging
+import os
+import threading
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from logging.handlers import RotatingFileHandler
+
+import click
+from bson import json_util
+from flask import current_app, has_request_context, request
+from flask.cli import AppGroup, with_appcontext
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from .budgets import VOLATILE_FIELDS
+from .tasks import BoundedExecutor
+
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# The profiler's own modules, left out of the recorded call stack.
+LISTENER_FILES = {os.path.join(APP_DIR, name)
+                  for name in ("slowlog.py", "timing.py", "budgets.py", "pool.py")}
+
+# Commands worth profiling, and the ones the server can explain.
+PROFILED = {"find", "aggregate", "count", "distinct", "update", "delete",
+            "findAndModify", "insert", "getMore"}
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete",
+               "findAndModify"}
+# Commands whose values may carry emails, password hashes or other personal
+# data: only their shape is recorded, never the literal command.
+WRITES = {"insert", "update", "delete", "findAndModify"}
+PRIVATE_COLLECTIONS = {"users"}
+
+SLOW_QUERY_COLLECTION = "slow_queries"
+MAX_COMMAND_LENGTH = 2000
+
+
+def query_shape(value):
+    """
+    Replaces every literal in a command with "?", so the same query with
+    different values groups together in the report.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [query_shape(item) for item in value]
+    return "?"
+
+
+def find_stages(plan, stages=None):
+    """
+    Collects every plan stage in an explain() result, e.g. ["IXSCAN owner_id",
+    "FETCH"], wherever the server nests them.
+    """
+    stages = [] if stages is None else stages
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            name = plan["stage"]
+            if plan.get("indexName"):
+                name += " " + plan["indexName"]
+            stages.append(name)
+        for key, value in plan.items():
+            # Rejected plans never ran, so they say nothing about this query
+            if key != "rejectedPlans":
+                find_stages(value, stages)
+    elif isinstance(plan, list):
+        for item in plan:
+            find_stages(item, stages)
+    return stages
+
+
+def app_stack(limit=3):
+    """
+    The innermost frames of this app that led to the current command, as
+    "app/repository.py:110 in find_businesses_by_category".
+    """
+    frames = []
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(APP_DIR) and frame.filename not in LISTENER_FILES:
+            path = os.path.relpath(frame.filename, os.path.dirname(APP_DIR))
+            frames.append(f"{path}:{frame.lineno} in {frame.name}")
+            if len(frames) == limit:
+                break
+    return frames
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """
+    Notices commands slower than the threshold and hands them to the
+    profiler. Commands are remembered per thread between started and
+    succeeded, which pymongo calls on the thread that runs them.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.local = threading.local()
+
+    def _pending(self):
+        if not hasattr(self.local, "commands"):
+            self.local.commands = {}
+        return self.local.commands
+
+    def started(self, event):
+        if (self.profiler.threshold_ms is not None and event.command_name in PROFILED
+                and not getattr(self.local, "busy", False)):
+            self._pending()[event.request_id] = event.command
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        command = self._pending().pop(event.request_id, None)
+        if command is None or event.duration_micros < self.profiler.threshold_ms * 1000:
+            return
+        collection = command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        if collection == SLOW_QUERY_COLLECTION:
+            return
+        self.profiler.capture(event, command, collection)
+
+
+class SlowQueryProfiler:
+    """
+    Flask extension sampling MongoDB commands slower than a threshold.
+
+    Each slow command is recorded with how long it took, its query shape,
+    the route and the lines of app code that sent it. An explain() on the
+    background pool then shows the plan it got, so collection scans stand
+    out. The explains run on a thread of their own, which drops slow
+    commands rather than queue them once SLOW_QUERY_QUEUE_SIZE are
+    waiting. "flask slow-queries report" ranks what was recorded. Writes and
+    commands on users are recorded by shape only, so no email or password
+    hash ends up in the log. The listener has to be given to the
+    MongoClient, see client_options().
+
+    Config:
+        SLOW_QUERY_MS: threshold in milliseconds; None (default) turns
+            profiling off.
+        SLOW_QUERY_SINK: "collection" for a capped "slow_queries"
+            collection (default) or "file" for a rotating JSON lines log.
+        SLOW_QUERY_CAPPED_SIZE: size of the capped collection in bytes.
+        SLOW_QUERY_FILE: path of the log file for the "file" sink.
+        SLOW_QUERY_EXPLAIN: run explain() on slow commands (default True).
+        SLOW_QUERY_QUEUE_SIZE: slow commands that may wait to be explained
+            and written (default 20).
+    """
+
+    def __init__(self, app=None):
+        self.listener = SlowQueryListener(self)
+        self.app = None
+        self.threshold_ms = None
+        self.sink = None
+        self.explain = None
+        self.file_logger = None
+        self.capped_ready = False
+        self.executor = None
+        self.dropped = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SLOW_QUERY_MS", None)
+        app.config.setdefault("SLOW_QUERY_SINK", "collection")
+        app.config.setdefault("SLOW_QUERY_CAPPED_SIZE", 16 * 1024 * 1024)
+        app.config.setdefault("SLOW_QUERY_FILE", "slow_queries.log")
+        app.config.setdefault("SLOW_QUERY_EXPLAIN", True)
+        app.config.setdefault("SLOW_QUERY_QUEUE_SIZE", 20)
+
+        self.app = app
+        self.threshold_ms = app.config["SLOW_QUERY_MS"]
+        self.sink = app.config["SLOW_QUERY_SINK"]
+        self.explain = app.config["SLOW_QUERY_EXPLAIN"]
+        if self.sink not in ("collection", "file"):
+            raise ValueError(f"Unknown SLOW_QUERY_SINK: {self.sink}")
+        if self.sink == "file":
+            self.file_logger = logging.getLogger("msp3.slow_queries")
+            self.file_logger.propagate = False
+            if not self.file_logger.handlers:
+                handler = RotatingFileHandler(
+                    app.config["SLOW_QUERY_FILE"], maxBytes=10 * 1024 * 1024, backupCount=5)
+                self.file_logger.addHandler(handler)
+            self.file_logger.setLevel(logging.INFO)
+        self.executor = BoundedExecutor(
+            1, app.config["SLOW_QUERY_QUEUE_SIZE"], thread_name_prefix="slow-queries")
+        app.extensions["slow_queries"] = self
+
+    def capture(self, event, command, collection):
+        """
+        Records a slow command; the explain and the write happen in the
+        background, or not at all if too many are already waiting.
+        """
+        command = {key: value for key, value in command.items()
+                   if key not in VOLATILE_FIELDS}
+        entry = {
+            "at": datetime.now(timezone.utc),
+            "ms": round(event.duration_micros / 1000, 1),
+            "command_name": event.command_name,
+            "database": event.database_name,
+            "collection": collection,
+            "shape": json_util.dumps(query_shape(command), sort_keys=True),
+            "route": request.endpoint if has_request_context() else None,
+            "stack": app_stack(),
+            "failed": isinstance(event, monitoring.CommandFailedEvent),
+        }
+        if event.command_name not in WRITES and collection not in PRIVATE_COLLECTIONS:
+            entry["command"] = json_util.dumps(command)[:MAX_COMMAND_LENGTH]
+        if self.executor.try_submit(self._record, entry, command) is None:
+            self.dropped += 1
+
+    def _record(self, entry, command):
+        self.listener.local.busy = True
+        try:
+            if self.explain and entry["command_name"] in EXPLAINABLE:
+                entry.update(self._explain(entry["database"], command))
+            self._write(entry)
+        except Exception:
+            logger.exception("Could not record a slow %s", entry["command_name"])
+        finally:
+            self.listener.local.busy = False
+
+    def _explain(self, database, command):
+        from .extensions import mongo
+
+        try:
+            plan = mongo.cx[database].command(
+                {"explain": command, "verbosity": "queryPlanner"})
+        except PyMongoError as e:
+            return {"plan": [], "collscan": None, "explain_error": str(e)}
+        stages = find_stages(plan.get("queryPlanner", plan))
+        return {"plan": stages, "collscan": "COLLSCAN" in stages}
+
+    def _write(self, entry):
+        if self.sink == "file":
+            self.file_logger.info(json_util.dumps(entry))
+            return
+
+        from .extensions import mongo
+
+        db = mongo.cx[entry["database"]]
+        if not self.capped_ready:
+            if SLOW_QUERY_COLLECTION not in db.list_collection_names():
+                try:
+                    db.create_collection(
+                        SLOW_QUERY_COLLECTION, capped=True,
+                        size=self.app.config["SLOW_QUERY_CAPPED_SIZE"])
+                except CollectionInvalid:
+                    pass  # another worker created it first
+            self.capped_ready = True
+        db[SLOW_QUERY_COLLECTION].insert_one(entry)
+
+    def entries(self, since):
+        """Reads back what has been recorded since a moment, from either sink."""
+        if self.sink == "collection":
+            from .extensions import mongo
+
+            return list(mongo.db[SLOW_QUERY_COLLECTION].find({"at": {"$gte": since}}))
+
+        entries = []
+        path = self.app.config["SLOW_QUERY_FILE"]
+        for name in sorted(f for f in os.listdir(os.path.dirname(path) or ".")
+                           if f.startswith(os.path.basename(path))):
+            with open(os.path.join(os.path.dirname(path), name)) as log:
+                for line in log:
+                    entry = json_util.loads(line)
+                    at = entry["at"]
+                    if at.tzinfo is None:
+                        at = at.replace(tzinfo=timezone.utc)
+                    if at >= since:
+                        entries.append(entry)
+        return entries
+
+
+def rank(entries):
+    """
+    Groups slow commands by query shape and where they came from, worst
+    total time first.
+
+    Returns:
+        list: One dict per group with count, total, max and mean ms.
+    """
+    groups = defaultdict(list)
+    for entry in entries:
+        origin = entry["stack"][0] if entry.get("stack") else "-"
+        groups[(entry["collection"], entry["command_name"], entry["shape"], origin)].append(entry)
+
+    ranked = []
+    for (collection, command_name, shape, origin), group in groups.items():
+        timings = [entry["ms"] for entry in group]
+        ranked.append({
+            "collection": collection,
+            "command": command_name,
+            "shape": shape,
+            "origin": origin,
+            "routes": sorted({entry["route"] or "-" for entry in group}),
+            "count": len(group),
+            "total_ms": round(sum(timings), 1),
+            "max_ms": max(timings),
+            "mean_ms": round(sum(timings) / len(timings), 1),
+            "collscan": any(entry.get("collscan") for entry in group),
+            "plan": next((entry["plan"] for entry in reversed(group) if entry.get("plan")), []),
+        })
+    return sorted(ranked, key=lambda group: group["total_ms"], reverse=True)
+
+
+slow_queries_cli = AppGroup("slow-queries", help="Inspect slow MongoDB commands.")
+
+
+@slow_queries_cli.command("report")
+@click.option("--hours", default=24, show_default=True, help="How far back to look.")
+@click.option("--limit", default=20, show_default=True, help="How many groups to show.")
+@click.option("--json", "as_json", is_flag=True, help="Print the groups as JSON.")
+@with_appcontext
+def report_command(hours, limit, as_json):
+    """
+    Ranks the slow commands recorded by the profiler by total time, and
+    marks the ones that scanned a whole collection.
+    """
+    from .extensions import slow_queries
+
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    ranked = rank(slow_queries.entries(since))[:limit]
+    if as_json:
+        click.echo(json.dumps(ranked, indent=2))
+        return
+    if not ranked:
+        click.echo(f"No commands slower than {current_app.config['SLOW_QUERY_MS']}ms "
+                   f"in the last {hours}h")
+        return
+
+    for group in ranked:
+        flag = "COLLSCAN " if group["collscan"] else ""
+        click.echo(f"{group['total_ms']:>10.1f}ms total {group['count']:>5}x "
+                   f"max {group['max_ms']:.1f}ms  {flag}{group['collection']}.{group['command']}")
+        click.echo(f"    from {group['origin']} ({', '.join(group['routes'])})")
+        click.echo(f"    shape {group['shape'][:200]}")
+        if group["plan"]:
+            click.echo(f"    plan {' > '.join(group['plan'])}")
@@ -30,8 +30,8 @@ const flash_messages = () => {
 };
 
 // Attach click listeners to all modal triggers to open corresponding modals
-const model_triggers = () => {
-    document.querySelectorAll(".modal-trigger").forEach((trigger) => {
+const model_triggers = (root = document) => {
+    root.querySelectorAll(".modal-trigger").forEach((trigger) => {
         trigger.addEventListener("click", (event) => {
             event.preventDefault();
             const modal_id = trigger.getAttribute("href").replace("#", "");
@@ -123,6 +123,48 @@ const create_deal_datepicker = () => {
     });
 };
 
+// Load older reviews on the profile page as the "Older reviews" button scrolls into view
+const lazy_reviews = () => {
+    const more = document.getElementById("reviews-more");
+    const list = document.getElementById("review-list");
+
+    if (!more || !list || !("IntersectionObserver" in window)) {
+        return;
+    }
+
+    let loading = false;
+    const observer = new IntersectionObserver((entries) => {
+        if (!entries[0].isIntersecting || loading) {
+            return;
+        }
+        loading = true;
+
+        fetch(more.dataset.url, { headers: { Accept: "application/json" } })
+            .then((response) => response.json())
+            .then((page) => {
+                const holder = document.createElement("div");
+                holder.innerHTML = page.html;
+                model_triggers(holder);
+                list.append(...holder.childNodes);
+                review_style();
+
+                if (page.next) {
+                    more.dataset.url = page.next;
+                    loading = false;
+                } else {
+                    observer.disconnect();
+                    more.remove();
+                }
+            })
+            .catch(() => {
+                // Leave the button as a plain link to the next page
+                observer.disconnect();
+            });
+    });
+
+    observer.observe(more);
+};
+
 // Run all functions after DOM is loaded
 document.addEventListener("DOMContentLoaded", () => {
     popup();
@@ -133,4 +175,5 @@ document.addEventListener("DOMContentLoaded", () => {
     review_style();
     form_auto_date();
     create_deal_datepicker();
+    lazy_reviews();
 });
@@ -0,0 +1,168 @@
+from datetime import timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from .categories import CATEGORIES
+from .deals import active_deals_query, is_live
+from .repository import DEAL_CARD
+
+
+# The homepage reads everything it needs from this one document in the
+# "summaries" collection.
+HOME_SUMMARY_ID = "home"
+
+CATEGORY_VALUES = {value for value, _ in CATEGORIES}
+
+
+def _aware(moment):
+    # BSON dates come back naive unless the client is tz_aware
+    if moment is not None and moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def _deal_card(deal):
+    return {field: deal[field] for field in DEAL_CARD if field in deal}
+
+
+def _latest_deals(db, size):
+    return list(
+        db.deals.find(active_deals_query(), DEAL_CARD)
+        .sort("_id", -1)
+        .limit(size)
+    )
+
+
+def rebuild_home_summary(db):
+    """
+    Recounts the businesses in each category and reloads the newest deals
+    from scratch.
+
+    The incremental updates below keep the summary current; this is for
+    creating it the first time and correcting any drift.
+
+    Args:
+        db (Database): The database.
+
+    Returns:
+        dict: The summary as stored.
+    """
+    counts = dict.fromkeys(CATEGORY_VALUES, 0)
+    for group in db.business.aggregate([
+            {"$group": {"_id": "$category", "count": {"$sum": 1}}}]):
+        if group["_id"] in counts:
+            counts[group["_id"]] = group["count"]
+
+    summary = {
+        "categories": counts,
+        "latest_deals": _latest_deals(db, current_app.config["HOME_DEALS_SIZE"]),
+    }
+    db.summaries.update_one({"_id": HOME_SUMMARY_ID}, {"$set": summary}, upsert=True)
+    return summary
+
+
+def load_home_summary(db):
+    """
+    Reads the homepage summary, building it on first use.
+
+    Deals that have expired since they were added are dropped, and the
+    list is topped up from the deals collection when that happens.
+
+    Args:
+        db (Database): The database.
+
+    Returns:
+        dict: {"categories": {category: business count}, "latest_deals": [deal cards]}.
+    """
+    summary = db.summaries.find_one({"_id": HOME_SUMMARY_ID})
+    if summary is None:
+        return rebuild_home_summary(db)
+
+    latest = [deal for deal in summary.get("latest_deals", [])
+              if is_live(_aware(deal.get("expires_at")))]
+    if len(latest) < len(summary.get("latest_deals", [])):
+        latest = refresh_latest_deals(db)
+    return {"categories": summary.get("categories", {}), "latest_deals": latest}
+
+
+def category_count(db, category):
+    """
+    Looks up how many businesses a category has, from the summary.
+
+    Returns:
+        int or None: The count, or None if the summary does not exist yet
+        or does not track this category.
+    """
+    if category not in CATEGORY_VALUES:
+        return None
+    summary = db.summaries.find_one(
+        {"_id": HOME_SUMMARY_ID}, {f"categories.{category}": 1})
+    if summary is None:
+        return None
+    return summary.get("categories", {}).get(category)
+
+
+def count_business(db, category, delta):
+    """
+    Adds delta to a category's business count after a business is added
+    (1) or deleted (-1).
+
+    Only an existing summary is updated; load_home_summary() builds it with
+    the right counts on first use.
+    """
+    if category in CATEGORY_VALUES:
+        db.summaries.update_one(
+            {"_id": HOME_SUMMARY_ID}, {"$inc": {f"categories.{category}": delta}})
+
+
+def move_business(db, old_category, new_category):
+    """Moves one business between category counts after an edit."""
+    if old_category != new_category:
+        count_business(db, old_category, -1)
+        count_business(db, new_category, 1)
+
+
+def add_latest_deal(db, deal):
+    """
+    Puts a new deal at the front of the homepage's latest deals, keeping
+    only HOME_DEALS_SIZE of them.
+    """
+    db.summaries.update_one(
+        {"_id": HOME_SUMMARY_ID},
+        {"$push": {"latest_deals": {
+            "$each": [_deal_card(deal)],
+            "$position": 0,
+            "$slice": current_app.config["HOME_DEALS_SIZE"],
+        }}}
+    )
+
+
+def refresh_latest_deals(db):
+    """
+    Reloads the latest deals after a deal is edited or deleted, when
+    patching the list in place could leave it short or stale.
+
+    Returns:
+        list: The deal cards as stored.
+    """
+    latest = _latest_deals(db, current_app.config["HOME_DEALS_SIZE"])
+    db.summaries.update_one(
+        {"_id": HOME_SUMMARY_ID}, {"$set": {"latest_deals": latest}})
+    return latest
+
+
+summary_cli = AppGroup("summary", help="Manage the homepage summary.")
+
+
+@summary_cli.command("rebuild")
+@with_appcontext
+def rebuild_command():
+    """Recounts categories and reloads the latest deals for the homepage."""
+    from .extensions import mongo
+
+    summary = rebuild_home_summary(mongo.db)
+    for value, label in CATEGORIES:
+        click.echo(f"{label:<28}{summary['categories'][value]:>6}")
+    click.echo(f"{len(summary['latest_deals'])} latest deals")
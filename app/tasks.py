@@ -0,0 +1,82 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedExecutor(ThreadPoolExecutor):
+    """
+    A thread pool holding at most queue_size tasks waiting for a worker.
+
+    ThreadPoolExecutor queues without limit, so work arriving faster than
+    the workers finish it piles up in memory. Here submit() waits for a
+    free slot instead, and try_submit() gives up at once.
+    """
+
+    def __init__(self, max_workers, queue_size, thread_name_prefix=""):
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.slots = threading.BoundedSemaphore(max_workers + queue_size)
+
+    def submit(self, fn, /, *args, **kwargs):
+        self.slots.acquire()
+        return self._submit(fn, args, kwargs)
+
+    def try_submit(self, fn, /, *args, **kwargs):
+        """
+        Queues a task unless the queue is full.
+
+        Returns:
+            Future: The task, or None if it was dropped.
+        """
+        if not self.slots.acquire(blocking=False):
+            return None
+        return self._submit(fn, args, kwargs)
+
+    def _submit(self, fn, args, kwargs):
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+
+class BackgroundTasks:
+    """
+    Flask extension running work off the request thread on a small,
+    bounded thread pool.
+
+    The pool size is set with BACKGROUND_WORKERS and the number of tasks
+    that may wait for it with BACKGROUND_QUEUE_SIZE; once that many are
+    waiting, submit() blocks the caller until one starts. Exceptions
+    raised by a task are logged rather than lost with the future.
+    """
+
+    def __init__(self, app=None):
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("BACKGROUND_WORKERS", 2)
+        app.config.setdefault("BACKGROUND_QUEUE_SIZE", 100)
+        self.executor = BoundedExecutor(
+            app.config["BACKGROUND_WORKERS"],
+            app.config["BACKGROUND_QUEUE_SIZE"],
+            thread_name_prefix="background"
+        )
+        app.extensions["tasks"] = self
+
+    def submit(self, fn, *args, **kwargs):
+        future = self.executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(_log_failure)
+        return future
+
+
+def _log_failure(future):
+    exception = future.exception()
+    if exception is not None:
+        logger.error("Background task failed", exc_info=exception)
@@ -0,0 +1,179 @@
+import hmac
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from pymongo import monitoring
+
+from .metrics import Histogram
+
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+class RequestTimings:
+    """What the current request has spent its time on so far."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.http_seconds = 0.0
+        self.render_seconds = 0.0
+        self.render_started = []
+
+    def server_timing(self, total):
+        """Formats the timings as a Server-Timing header value."""
+        return ", ".join([
+            f"app;dur={total * 1000:.1f}",
+            f'db;dur={self.mongo_seconds * 1000:.1f};desc="{self.mongo_commands} commands"',
+            f"http;dur={self.http_seconds * 1000:.1f}",
+            f"render;dur={self.render_seconds * 1000:.1f}",
+        ])
+
+
+def current_timings():
+    """The RequestTimings of the request on this thread, if any."""
+    if has_request_context():
+        return g.get("timings")
+    return None
+
+
+@contextmanager
+def timed_http():
+    """
+    Counts the time spent in an outbound HTTP call towards the request.
+
+    Usage:
+        with timed_http():
+            response = session.get(url)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_timings()
+        if timings is not None:
+            timings.http_seconds += time.perf_counter() - start
+
+
+class CommandTimer(monitoring.CommandListener):
+    """
+    Adds each MongoDB command to the timings of the request that issued
+    it. pymongo calls listeners on the thread running the command, so
+    commands from background tasks are not counted against any request.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        timings = current_timings()
+        if timings is not None:
+            timings.mongo_commands += 1
+            timings.mongo_seconds += event.duration_micros / 1e6
+
+    def failed(self, event):
+        timings = current_timings()
+        if timings is not None:
+            timings.mongo_commands += 1
+            timings.mongo_seconds += event.duration_micros / 1e6
+
+
+class RequestMetrics:
+    """
+    Flask extension timing every request and where its time went: MongoDB
+    commands (how many and how long), outbound HTTP calls and
+    template rendering. The totals go into per-route histograms served on
+    /metrics, and into a Server-Timing header for the browser's devtools.
+    /metrics answers only requests bearing METRICS_TOKEN or coming from
+    METRICS_ALLOWED_IPS, and is a 404 for everyone else.
+
+    The command listener has to be given to the MongoClient, see
+    client_options().
+
+    Config:
+        REQUEST_METRICS: record timings at all (default True).
+        SERVER_TIMING: add the Server-Timing header (default True).
+        METRICS_TOKEN: bearer token a scraper sends to read /metrics.
+        METRICS_ALLOWED_IPS: client addresses that may read /metrics
+            without the token.
+    """
+
+    def __init__(self, app=None):
+        self.listener = CommandTimer()
+        self.server_timing = None
+        self.token = None
+        self.allowed_ips = frozenset()
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds", "Time to handle a request.", SECONDS_BUCKETS)
+        self.mongo_commands = Histogram(
+            "http_request_mongo_commands", "MongoDB commands issued per request.", COUNT_BUCKETS)
+        self.mongo_seconds = Histogram(
+            "http_request_mongo_seconds", "Time spent in MongoDB per request.", SECONDS_BUCKETS)
+        self.http_seconds = Histogram(
+            "http_request_outbound_seconds", "Time spent calling other services per request.",
+            SECONDS_BUCKETS)
+        self.render_seconds = Histogram(
+            "http_request_render_seconds", "Time spent rendering templates per request.",
+            SECONDS_BUCKETS)
+        self.histograms = (self.request_seconds, self.mongo_commands, self.mongo_seconds,
+                           self.http_seconds, self.render_seconds)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("REQUEST_METRICS", True)
+        app.config.setdefault("SERVER_TIMING", True)
+        app.config.setdefault("METRICS_TOKEN", None)
+        app.config.setdefault("METRICS_ALLOWED_IPS", ())
+        self.server_timing = app.config["SERVER_TIMING"]
+        self.token = app.config["METRICS_TOKEN"]
+        self.allowed_ips = frozenset(app.config["METRICS_ALLOWED_IPS"])
+        app.extensions["request_metrics"] = self
+        if not app.config["REQUEST_METRICS"]:
+            return
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._render_started, app, weak=False)
+        template_rendered.connect(self._render_finished, app, weak=False)
+
+    def may_scrape(self):
+        """Whether the current request may read /metrics."""
+        if self.token:
+            supplied = request.headers.get("Authorization", "")
+            if hmac.compare_digest(supplied.encode(), f"Bearer {self.token}".encode()):
+                return True
+        return request.remote_addr in self.allowed_ips
+
+    def _start(self):
+        g.timings = RequestTimings()
+
+    def _render_started(self, sender, template, context, **extra):
+        timings = current_timings()
+        if timings is not None:
+            timings.render_started.append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        timings = current_timings()
+        if timings is not None and timings.render_started:
+            timings.render_seconds += time.perf_counter() - timings.render_started.pop()
+
+    def _finish(self, response):
+        timings = g.pop("timings", None)
+        if timings is None:
+            return response
+
+        total = time.perf_counter() - timings.started
+        route = request.endpoint or "unmatched"
+        self.request_seconds.observe(route, total)
+        self.mongo_commands.observe(route, timings.mongo_commands)
+        self.mongo_seconds.observe(route, timings.mongo_seconds)
+        self.http_seconds.observe(route, timings.http_seconds)
+        self.render_seconds.observe(route, timings.render_seconds)
+
+        if self.server_timing:
+            response.headers["Server-Timing"] = timings.server_timing(total)
+        return response
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+from datetime import datetime, time, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from .signals import content_changed
+
+
+VERSIONS_COLLECTION = "versions"
+
+# Pages behind these tags list live deals, which drop off at midnight UTC
+# without any write, so their validators change with the date as well.
+DAILY_TAGS = {"deals", "home"}
+
+
+def release_digest(root):
+    """
+    Digests the app's code and templates, so every ETag changes when a
+    deploy changes what the pages look like. Each worker computes the same
+    value from the same files.
+    """
+    digest = hashlib.sha1()
+    for folder, dirs, files in sorted(os.walk(root)):
+        dirs[:] = sorted(d for d in dirs if d not in ("__pycache__", "static"))
+        for name in sorted(files):
+            if name.endswith((".py", ".html")):
+                path = os.path.join(folder, name)
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, "rb") as source:
+                    digest.update(source.read())
+    return digest.hexdigest()[:12]
+
+
+class ContentVersions:
+    """
+    Flask extension keeping a version stamp for every cache tag.
+
+    Each tag has a document in the "versions" collection counting the
+    writes that notified it and when the last one happened, bumped from
+    the content_changed signal. Pages derive their ETag and Last-Modified
+    from the versions of the tags they render, so a conditional GET can be
+    answered with a 304 from one small query, before the page's own
+    queries and template run.
+
+    Config:
+        CONDITIONAL_REQUESTS: send validators and answer 304s (default True).
+        ETAG_SALT: mixed into every ETag; defaults to a digest of the app's
+            code and templates, so a deploy invalidates them.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = None
+        self.salt = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CONDITIONAL_REQUESTS", True)
+        app.config.setdefault("ETAG_SALT", None)
+
+        self.enabled = app.config["CONDITIONAL_REQUESTS"]
+        self.salt = app.config["ETAG_SALT"] or release_digest(app.root_path)
+        content_changed.connect(self._on_content_changed, sender=app, weak=False)
+        app.extensions["content_versions"] = self
+
+    def _on_content_changed(self, sender, tags):
+        from .extensions import mongo
+
+        try:
+            self.bump(mongo.db, tags)
+        except PyMongoError:
+            # A missed bump would let clients keep a stale page, so say so
+            sender.logger.exception("Could not bump versions for %s", tags)
+
+    def bump(self, db, tags):
+        """
+        Moves the given tags to a new version, in one round trip.
+
+        Args:
+            db (Database): The app database.
+            tags (list): Tags whose data changed, e.g. ["deals", "home"].
+        """
+        db[VERSIONS_COLLECTION].bulk_write([
+            UpdateOne({"_id": tag},
+                      {"$inc": {"version": 1}, "$currentDate": {"updated_at": True}},
+                      upsert=True)
+            for tag in sorted(set(tags))
+        ], ordered=False)
+
+    def validators(self, db, tags, variant):
+        """
+        Works out the ETag and Last-Modified of a page.
+
+        Args:
+            db (Database): The app database.
+            tags (list): The tags the page renders, as given to cached().
+            variant (str): Whatever else the page depends on, e.g. its path,
+                query string and the logged in user.
+
+        Returns:
+            tuple: (etag, last_modified); last_modified is None for a page
+            whose tags have never changed.
+        """
+        stamps = {document["_id"]: document for document in
+                  db[VERSIONS_COLLECTION].find({"_id": {"$in": list(tags)}})}
+        versions = [[tag, stamps.get(tag, {}).get("version", 0)] for tag in sorted(tags)]
+        changed = [stamp["updated_at"].replace(tzinfo=timezone.utc)
+                   for stamp in stamps.values() if stamp.get("updated_at")]
+
+        today = None
+        if DAILY_TAGS.intersection(tags):
+            today = datetime.now(timezone.utc).date()
+            changed.append(datetime.combine(today, time(), timezone.utc))
+
+        etag = hashlib.sha1(json.dumps(
+            [self.salt, variant, versions, str(today)]).encode()).hexdigest()
+        return etag, max(changed) if changed else None
@@ -0,0 +1,144 @@
+from dataclasses import dataclass, field
+
+from .deals import active_deals_query
+from .extensions import mongo
+from .pagination import Page, encode_token
+from .repository import DEAL_CARD, REVIEW_SORT, find_reviews_for_business
+
+
+@dataclass
+class ProfileView:
+    """
+    Everything the profile page renders, loaded in one round trip.
+
+    Attributes:
+        user (dict): The profile owner, without the password hash.
+        business (dict or None): The business they own, if any.
+        reviews (Page): The newest page of reviews left for that business.
+        review_count (int): How many reviews the business has in total.
+        deal (dict or None): Their live deal expiring soonest, if any.
+    """
+    user: dict
+    business: dict = None
+    reviews: Page = field(default_factory=lambda: Page([]))
+    review_count: int = 0
+    deal: dict = None
+
+    @property
+    def coordinates(self):
+        """Returns (lat, lng) for the map pin, or (None, None)."""
+        if self.business and self.business.get("coordinates"):
+            coordinates = self.business["coordinates"]
+            return coordinates["lat"], coordinates["lng"]
+        return None, None
+
+
+def profile_pipeline(username):
+    """
+    Builds the aggregation that joins a user to their business and deal.
+
+    Businesses and deals are both keyed by the owner's user _id, so each
+    join is an indexed equality lookup on owner_id and business_owner.
+    Only one live deal is joined, the one expiring soonest, however many
+    expired ones the TTL monitor has yet to remove. Reviews are not
+    joined: the business carries a summary of them.
+
+    The deals join combines localField with a pipeline, which needs
+    MongoDB 5.0 or later.
+
+    Args:
+        username (str): The username of the profile being viewed.
+
+    Returns:
+        list: The aggregation pipeline stages.
+    """
+    return [
+        {"$match": {"username": username}},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "business",
+            "localField": "_id",
+            "foreignField": "owner_id",
+            "as": "business"
+        }},
+        {"$lookup": {
+            "from": "deals",
+            "localField": "_id",
+            "foreignField": "business_owner",
+            "pipeline": [
+                {"$match": active_deals_query()},
+                {"$sort": {"expires_at": 1, "_id": 1}},
+                {"$limit": 1},
+                {"$project": DEAL_CARD},
+            ],
+            "as": "deal"
+        }},
+        {"$project": {"password": 0}},
+    ]
+
+
+def first_review_page(business, limit):
+    """
+    Builds the newest page of reviews from the summary on the business,
+    falling back to a query for businesses without one yet.
+
+    Args:
+        business (dict): The business, including review_summary.
+        limit (int): Page size, as used for the query fallback.
+
+    Returns:
+        tuple: (Page, total review count).
+    """
+    summary = business.get("review_summary")
+    if summary is None:
+        page = find_reviews_for_business(business["owner_id"], limit=limit)
+        count = mongo.db.reviews.count_documents(
+            {"business_id": business["owner_id"]})
+        return page, count
+
+    latest = summary["latest"]
+    next_token = None
+    if latest and summary["count"] > len(latest):
+        next_token = encode_token(latest[-1], REVIEW_SORT)
+    return Page(latest, next_token=next_token), summary["count"]
+
+
+def load_profile_view(username, after=None, before=None, limit=10):
+    """
+    Loads the profile page for a username with a single aggregation.
+
+    The first page of reviews comes from the business's review summary;
+    later pages (after/before cursors) cost one indexed reviews query.
+
+    Args:
+        username (str): The username of the profile being viewed.
+        after (str): Cursor for older reviews.
+        before (str): Cursor for newer reviews.
+        limit (int): Reviews per page.
+
+    Returns:
+        ProfileView or None: The view model, or None if there is no such user.
+    """
+    documents = list(mongo.db.users.aggregate(profile_pipeline(username)))
+    if not documents:
+        return None
+
+    user = documents[0]
+    business = user.pop("business")
+    deal = user.pop("deal")
+
+    if not business:
+        return ProfileView(user=user)
+    business = business[0]
+
+    reviews, review_count = first_review_page(business, limit)
+    if after or before:
+        reviews = find_reviews_for_business(
+            business["owner_id"], after=after, before=before, limit=limit)
+    return ProfileView(
+        user=user,
+        business=business,
+        reviews=reviews,
+        review_count=review_count,
+        deal=deal[0] if deal else None
+    )
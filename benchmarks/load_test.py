@@ -0,0 +1,130 @@
+"""
+Load-tests the app under gunicorn with different worker classes.
+
+For each worker class, starts gunicorn with gunicorn.conf.py, hammers one
+path from a pool of concurrent clients for a fixed time, then reports
+throughput and latency percentiles. The app uses the MONGO_URI etc. from
+the environment, so point it at a seeded database for realistic numbers;
+routes that wait on MongoDB show the biggest gap between sync and gthread.
+
+Usage:
+    python benchmarks/load_test.py --path /deals --concurrency 50 \\
+        --duration 20 --worker-class sync gthread
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(worker_class, workers, threads, port):
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_THREADS=str(threads),
+        CHECK_INDEXES=os.environ.get("CHECK_INDEXES", "False"),
+    )
+    if workers:
+        env["WEB_CONCURRENCY"] = str(workers)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--access-logfile", "/dev/null",
+         "app:create_app()"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urlopen(f"http://127.0.0.1:{port}/about", timeout=1).read()
+            return server
+        except (URLError, ConnectionError, OSError):
+            if server.poll() is not None:
+                raise RuntimeError(server.stderr.read().decode())
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("gunicorn did not start within 30s")
+
+
+def client(url, stop_at, timings, errors, lock):
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        try:
+            urlopen(url, timeout=30).read()
+        except Exception:
+            with lock:
+                errors[0] += 1
+            continue
+        with lock:
+            timings.append((time.perf_counter() - start) * 1000)
+
+
+def run(url, concurrency, duration):
+    timings, errors, lock = [], [0], threading.Lock()
+    stop_at = time.monotonic() + duration
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client, url, stop_at, timings, errors, lock)
+    timings.sort()
+    if not timings:
+        return {"rps": 0.0, "errors": errors[0], "p50": 0.0, "p95": 0.0,
+                "p99": 0.0, "mean": 0.0}
+    return {
+        "rps": len(timings) / duration,
+        "errors": errors[0],
+        "mean": statistics.mean(timings),
+        "p50": timings[len(timings) // 2],
+        "p95": timings[int(len(timings) * 0.95) - 1],
+        "p99": timings[int(len(timings) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--path", default="/deals")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes; defaults to gunicorn.conf.py")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--worker-class", nargs="+", default=["sync", "gthread"])
+    args = parser.parse_args()
+
+    results = {}
+    for worker_class in args.worker_class:
+        port = free_port()
+        server = start_server(worker_class, args.workers, args.threads, port)
+        try:
+            url = f"http://127.0.0.1:{port}{args.path}"
+            run(url, args.concurrency, 2)  # warm up
+            results[worker_class] = run(url, args.concurrency, args.duration)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+    print(f"{args.path} with {args.concurrency} clients for {args.duration}s")
+    print(f"{'workers':<10}{'req/s':>10}{'errors':>8}{'mean ms':>10}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<10}{result['rps']:>10.1f}{result['errors']:>8}"
+              f"{result['mean']:>10.1f}{result['p50']:>10.1f}"
+              f"{result['p95']:>10.1f}{result['p99']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
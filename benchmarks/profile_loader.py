@@ -0,0 +1,150 @@
+"""
+Compares the profile page's old serial lookups with the single aggregation
+used by load_profile_view.
+
+Seeds a throwaway database with one business owner, their business, a deal
+and a configurable number of reviews, then loads the profile both ways and
+reports Mongo commands per load and latency percentiles. Round-trip time
+dominates, so run it against a database as far away as production is.
+
+Usage:
+    python benchmarks/profile_loader.py --uri mongodb://localhost:27017 \\
+        --reviews 100 --iterations 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from pymongo import MongoClient, monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app import repository  # noqa: E402
+from app.extensions import mongo  # noqa: E402
+from app.reviews import refresh_review_summary  # noqa: E402
+from app.views import load_profile_view  # noqa: E402
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def seed(db, reviews):
+    db.users.insert_one({
+        "username": "bench-owner",
+        "email": "bench-owner@example.com",
+        "password": "x",
+        "profile": {"name": "Bench Owner", "postcode": "BS1", "bio": "",
+                    "phoneNo": "", "profile_image": None}
+    })
+    owner = db.users.find_one({"username": "bench-owner"})
+    db.business.insert_one({
+        "owner_id": owner["_id"],
+        "company_name": "Bench Ltd",
+        "description": "Benchmarks",
+        "location": "Bristol",
+        "category": "professional services",
+        "coordinates": {"lat": 51.45, "lng": -2.58},
+        "images": [],
+        "contact_info": {}
+    })
+    db.deals.insert_one({
+        "business_owner": owner["_id"],
+        "deal-text": "10% off",
+        "expire-date": "31-12-2099",
+        "deal-image": None
+    })
+    if reviews:
+        db.reviews.insert_many([
+            {"business_id": owner["_id"], "user_id": owner["_id"],
+             "profile_image": None, "text": f"Review {i}", "date": "01-01-2025"}
+            for i in range(reviews)
+        ])
+    refresh_review_summary(db, owner["_id"])
+    for collection, key in (("business", "owner_id"), ("reviews", "business_id"),
+                            ("deals", "business_owner"), ("users", "username")):
+        db[collection].create_index(key)
+
+
+def load_serial(username):
+    """The lookups profile() used to make, in order."""
+    user = repository.find_user_by_username(username)
+    business = repository.find_business_by_owner(user["_id"])
+    repository.find_business_by_owner(user["_id"])
+    reviews = list(mongo.db.reviews.find({"business_id": business["owner_id"]}))
+    deal = repository.find_deal_by_owner(user["_id"])
+    return user, business, reviews, deal
+
+
+def load_aggregated(username):
+    return load_profile_view(username)
+
+
+def measure(loader, iterations, counter):
+    timings = []
+    start_count = counter.count
+    for _ in range(iterations):
+        start = time.perf_counter()
+        loader("bench-owner")
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "commands": (counter.count - start_count) / iterations,
+        "mean": statistics.mean(timings),
+        "p50": timings[len(timings) // 2],
+        "p95": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uri", default=os.environ.get(
+        "BENCH_MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="msp3_bench")
+    parser.add_argument("--reviews", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app({"CHECK_INDEXES": False})
+    counter = CommandCounter()
+    client = MongoClient(args.uri, event_listeners=[counter])
+    client.drop_database(args.database)
+    mongo.cx = client
+    mongo.db = client[args.database]
+
+    try:
+        with app.app_context():
+            seed(mongo.db, args.reviews)
+            # Warm up connections and plan caches before timing
+            measure(load_serial, 10, counter)
+            measure(load_aggregated, 10, counter)
+            results = {
+                "serial": measure(load_serial, args.iterations, counter),
+                "aggregated": measure(load_aggregated, args.iterations, counter),
+            }
+    finally:
+        client.drop_database(args.database)
+
+    print(f"{'loader':<12}{'commands':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<12}{result['commands']:>10.1f}{result['mean']:>10.2f}"
+              f"{result['p50']:>10.2f}{result['p95']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Replays a realistic traffic mix against the app and reports each route.
+
+The mix browses the homepage, deals, category listings and business
+profiles and logs in, weighted by MIX; half of the browsing is anonymous
+(and so may be served from the response cache), the rest logged in.
+
+Targets:
+    client    The Flask test client in this process, driven sequentially.
+              Use --mongomock to seed an in-memory database at --scale
+              (profiles are left out of the mix, as mongomock cannot run
+              their aggregation), or point --uri/--database at one
+              filled by seed.py. After
+              the timed run, a second pass measures the peak Python memory
+              allocated per request with tracemalloc.
+    gunicorn  gunicorn.conf.py on a free port, driven over HTTP by
+              --concurrency clients for --duration seconds. Needs a
+              database seeded by seed.py; memory is the growth in the
+              server's resident set size over the run.
+
+Geocoding uses the static geocoder, so nothing leaves the machine.
+
+Results can be saved with --output and compared with a saved run with
+--baseline; a route whose p95 is more than --tolerance slower fails the run.
+
+Usage:
+    python benchmarks/replay.py --mongomock --scale 1k --requests 2000
+    python benchmarks/replay.py --target gunicorn --database msp3_bench \\
+        --duration 30 --concurrency 20 --output run.json --baseline main.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, build_opener
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import free_port, start_server  # noqa: E402
+from seed import BENCH_PASSWORD, LOCATIONS, SCALES, seed, username  # noqa: E402
+
+from app.categories import CATEGORIES  # noqa: E402
+
+# Relative weight of each kind of request.
+MIX = {"home": 15, "deals": 25, "category": 25, "profile": 25, "login": 10}
+
+
+class Traffic:
+    """Picks requests from the mix for a database seeded at some scale."""
+
+    def __init__(self, users, seed_value=2, mix=MIX):
+        self.users = users
+        self.mix = mix
+        self.owners = max(1, users // 4)
+        self.rng = random.Random(seed_value)
+        self.lock = threading.Lock()
+
+    def next(self):
+        """
+        Returns:
+            tuple: (route name, method, path, form data, logged in).
+        """
+        with self.lock:
+            route = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+            anonymous = self.rng.random() < 0.5
+            owner = username(self.rng.randrange(self.owners))
+            user = username(self.rng.randrange(self.users))
+            category = self.rng.choice(CATEGORIES)[0]
+
+        if route == "home":
+            return route, "GET", "/", None, not anonymous
+        if route == "deals":
+            return route, "GET", "/deals", None, not anonymous
+        if route == "category":
+            return (route, "GET", "/searched_category?" + urlencode({"category": category}),
+                    None, not anonymous)
+        if route == "profile":
+            return route, "GET", f"/profile/{owner}", None, True
+        return (route, "POST", "/login",
+                {"email": f"{user}@example.com", "password": BENCH_PASSWORD}, False)
+
+
+def summarize(timings, errors, duration, memory=None):
+    timings = sorted(timings)
+    if not timings:
+        return {"requests": 0, "errors": errors, "rps": 0.0, "mean": 0.0,
+                "p50": 0.0, "p95": 0.0, "p99": 0.0, "memory_kb": memory}
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "rps": len(timings) / duration,
+        "mean": statistics.mean(timings),
+        "p50": timings[len(timings) // 2],
+        "p95": timings[max(0, int(len(timings) * 0.95) - 1)],
+        "p99": timings[max(0, int(len(timings) * 0.99) - 1)],
+        "memory_kb": memory,
+    }
+
+
+def make_app(args):
+    from app import create_app
+    from app.extensions import mongo
+
+    config = {
+        "CHECK_INDEXES": False,
+        "GEOCODER": "static",
+        "GEOCODE_FIXTURES": LOCATIONS,
+        "MONGO_URI": f"{args.uri.rstrip('/')}/{args.database}",
+        "SECRET_KEY": "bench",
+    }
+    app = create_app(config)
+    if args.mongomock:
+        import mongomock
+        from flask_bcrypt import generate_password_hash
+
+        mongo.cx = mongomock.MongoClient()
+        mongo.db = mongo.cx[args.database]
+        seed(mongo.db, SCALES[args.scale],
+             generate_password_hash(BENCH_PASSWORD, app.config["BCRYPT_LOG_ROUNDS"]).decode(),
+             app.config["REVIEWS_PAGE_SIZE"])
+    return app
+
+
+def run_client(args):
+    app = make_app(args)
+    users = SCALES[args.scale]
+    anonymous, member = app.test_client(), app.test_client()
+    member.post("/login", data={"email": f"{username(0)}@example.com",
+                                "password": BENCH_PASSWORD})
+
+    def send(method, path, data, logged_in):
+        client = member if logged_in else anonymous
+        return client.open(path, method=method, data=data).status_code
+
+    # mongomock has no pipeline $lookup, which the profile page uses
+    mix = MIX
+    if args.mongomock:
+        mix = {route: weight for route, weight in mix.items() if route != "profile"}
+    traffic = Traffic(users, mix=mix)
+    for _ in range(min(50, args.requests)):  # warm up
+        _, method, path, data, logged_in = traffic.next()
+        send(method, path, data, logged_in)
+
+    timings = {route: [] for route in mix}
+    errors = dict.fromkeys(mix, 0)
+    spent = dict.fromkeys(mix, 0.0)
+    for _ in range(args.requests):
+        route, method, path, data, logged_in = traffic.next()
+        start = time.perf_counter()
+        status = send(method, path, data, logged_in)
+        elapsed = time.perf_counter() - start
+        spent[route] += elapsed
+        timings[route].append(elapsed * 1000)
+        if status >= 400:
+            errors[route] += 1
+
+    # Memory gets its own pass: tracemalloc slows every allocation down
+    peaks = {route: [] for route in mix}
+    tracemalloc.start()
+    try:
+        while min(len(values) for values in peaks.values()) < args.memory_samples:
+            route, method, path, data, logged_in = traffic.next()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            send(method, path, data, logged_in)
+            peaks[route].append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    # Throughput per route is requests over the time spent serving that route
+    return {
+        route: summarize(timings[route], errors[route], spent[route] or 1,
+                         round(statistics.mean(peaks[route]) / 1024, 1))
+        for route in mix
+    }
+
+
+def _rss_kb(pid):
+    """Resident set size of a process and its children, from /proc."""
+    total = 0
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            for child in children.read().split():
+                total += _rss_kb(int(child))
+    except OSError:
+        pass
+    return total
+
+
+def run_gunicorn(args):
+    os.environ.update(
+        MONGO_URI=f"{args.uri.rstrip('/')}/{args.database}",
+        MONGO_DBNAME=args.database,
+        GEOCODER="static",
+        SECRET_KEY=os.environ.get("SECRET_KEY", "bench"),
+    )
+    port = free_port()
+    server = start_server(args.worker_class, args.workers, args.threads, port)
+    base = f"http://127.0.0.1:{port}"
+    traffic = Traffic(SCALES[args.scale])
+    timings = {route: [] for route in MIX}
+    errors = dict.fromkeys(MIX, 0)
+    lock = threading.Lock()
+
+    def client(stop_at):
+        anonymous = build_opener()
+        member = build_opener(HTTPCookieProcessor(CookieJar()))
+        member.open(base + "/login", urlencode({
+            "email": f"{username(0)}@example.com", "password": BENCH_PASSWORD}).encode(),
+            timeout=30).read()
+        while time.monotonic() < stop_at:
+            route, method, path, data, logged_in = traffic.next()
+            opener = member if logged_in else anonymous
+            body = urlencode(data).encode() if data else None
+            start = time.perf_counter()
+            try:
+                opener.open(base + path, body, timeout=30).read()
+                failed = False
+            except HTTPError as e:
+                failed = e.code >= 400
+            except OSError:
+                failed = True
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                timings[route].append(elapsed)
+                errors[route] += failed
+
+    try:
+        rss_before = _rss_kb(server.pid)
+        stop_at = time.monotonic() + args.duration
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            for _ in range(args.concurrency):
+                pool.submit(client, stop_at)
+        rss_after = _rss_kb(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    print(f"server RSS {rss_before / 1024:.1f}MB -> {rss_after / 1024:.1f}MB")
+    return {route: summarize(timings[route], errors[route], args.duration)
+            for route in MIX}
+
+
+def compare(results, baseline, tolerance):
+    """Lists routes whose p95 got worse than the baseline by more than tolerance."""
+    regressions = []
+    for route, result in results.items():
+        before = baseline.get(route)
+        if before and before["p95"] and result["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {before['p95']:.1f}ms -> {result['p95']:.1f}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target", choices=("client", "gunicorn"), default="client")
+    parser.add_argument("--uri", default=os.environ.get(
+        "BENCH_MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="msp3_bench")
+    parser.add_argument("--scale", choices=SCALES, default="1k",
+                        help="the scale the database was seeded at")
+    parser.add_argument("--mongomock", action="store_true",
+                        help="seed an in-memory database instead (client only)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--memory-samples", type=int, default=20,
+                        help="requests per route in the memory pass")
+    parser.add_argument("--duration", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--baseline", help="compare with results saved by --output")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.target == "gunicorn" and args.mongomock:
+        parser.error("gunicorn runs in other processes and needs a real database")
+
+    results = run_client(args) if args.target == "client" else run_gunicorn(args)
+
+    print(f"{'route':<10}{'requests':>9}{'errors':>8}{'req/s':>9}{'mean ms':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'mem KB':>9}")
+    for route, result in results.items():
+        memory = "-" if result["memory_kb"] is None else f"{result['memory_kb']:.1f}"
+        print(f"{route:<10}{result['requests']:>9}{result['errors']:>8}"
+              f"{result['rps']:>9.1f}{result['mean']:>9.1f}{result['p50']:>9.1f}"
+              f"{result['p95']:>9.1f}{result['p99']:>9.1f}{memory:>9}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Seeds a database with synthetic users, businesses, reviews and deals.
+
+Data is generated from a fixed random seed, so the same scale always
+produces the same database. Every user's password is BENCH_PASSWORD, and
+locations are a handful of towns listed in LOCATIONS, which also serve as
+the static geocoder's fixtures so nothing calls the Geocoding API.
+
+Scales (users / businesses / reviews / deals):
+    1k      1,000 /     250 /     2,000 /     125
+    100k  100,000 /  25,000 /   200,000 /  12,500
+    1m  1,000,000 / 250,000 / 2,000,000 / 125,000
+
+Usage:
+    python benchmarks/seed.py --uri mongodb://localhost:27017 \\
+        --database msp3_bench --scale 100k
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from flask_bcrypt import generate_password_hash
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.categories import CATEGORIES  # noqa: E402
+from app.geocode import geo_point  # noqa: E402
+from app.indexes import ensure_indexes  # noqa: E402
+from app.repository import REVIEW_SORT  # noqa: E402
+from app.reviews import SUMMARY_FIELDS  # noqa: E402
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 5_000
+
+LOCATIONS = {
+    "Bristol": (51.4545, -2.5879),
+    "Bath": (51.3811, -2.3590),
+    "Cardiff": (51.4816, -3.1791),
+    "Swindon": (51.5558, -1.7797),
+    "Gloucester": (51.8642, -2.2382),
+    "Exeter": (50.7184, -3.5339),
+}
+
+WORDS = ("friendly local reliable family run experienced affordable qualified "
+         "garden lawn hair nails cleaning tutoring builder plumber trainer "
+         "crafts accountant design repairs").split()
+
+
+def username(i):
+    return f"bench{i:07d}"
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def insert_batches(collection, documents):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def seed(db, users, password_hash, reviews_page_size, seed_value=1):
+    """
+    Fills db with the given number of users; a quarter of them own a
+    business, each business has on average eight reviews and half of them
+    have a live deal.
+
+    Args:
+        db (Database): An empty database.
+        users (int): How many users to create.
+        password_hash (str): The stored hash of BENCH_PASSWORD.
+        reviews_page_size (int): The app's REVIEWS_PAGE_SIZE, so the review
+            summaries hold the same newest page the app would build.
+        seed_value (int): Random seed.
+
+    Returns:
+        dict: Document counts per collection.
+    """
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+    user_ids = [ObjectId() for _ in range(users)]
+
+    insert_batches(db.users, (
+        {"_id": user_ids[i], "username": username(i),
+         "email": f"{username(i)}@example.com", "password": password_hash,
+         "profile": {"name": f"Bench User {i}", "postcode": "BS1 1AA", "bio": "",
+                     "phoneNo": "", "profile_image": None}}
+        for i in range(users)))
+
+    owners = user_ids[: max(1, users // 4)]
+    reviews, businesses, deals = [], [], []
+    counts = {"reviews": 0}
+
+    def flush_reviews():
+        insert_batches(db.reviews, reviews)
+        counts["reviews"] += len(reviews)
+        reviews.clear()
+
+    for owner in owners:
+        location = rng.choice(list(LOCATIONS))
+        lat, lng = LOCATIONS[location]
+        coordinates = {"lat": lat + rng.uniform(-0.05, 0.05),
+                       "lng": lng + rng.uniform(-0.05, 0.05)}
+
+        own_reviews = []
+        for _ in range(rng.randint(0, 16)):
+            author = rng.randrange(users)
+            own_reviews.append({
+                "_id": ObjectId(), "business_id": owner, "user_id": user_ids[author],
+                "author": {"user_id": user_ids[author], "name": f"Bench User {author}",
+                           "avatar": None},
+                "text": sentence(rng, 20),
+                "date": now - timedelta(minutes=rng.randrange(500_000)),
+            })
+        reviews.extend(own_reviews)
+        # Newest first, as REVIEW_SORT orders them: date, then _id, descending
+        own_reviews.sort(key=lambda review: tuple(review[field] for field, _ in REVIEW_SORT),
+                         reverse=True)
+
+        businesses.append({
+            "owner_id": owner,
+            "company_name": f"{sentence(rng, 2)} {location} Ltd",
+            "description": sentence(rng, 30),
+            "location": location,
+            "category": rng.choice(CATEGORIES)[0],
+            "coordinates": coordinates,
+            "point": geo_point(coordinates),
+            "images": [],
+            "contact_info": {"email": "", "phone": "", "website": ""},
+            "review_summary": {
+                "count": len(own_reviews),
+                "latest": [{field: review[field] for field in SUMMARY_FIELDS}
+                           for review in own_reviews[:reviews_page_size]],
+            },
+        })
+        if rng.random() < 0.5:
+            expires = now + timedelta(days=rng.randint(1, 60))
+            deals.append({
+                "business_owner": owner,
+                "deal-text": sentence(rng, 8),
+                "date": now.strftime("%d-%m-%Y"),
+                "expire-date": expires.strftime("%d-%m-%Y"),
+                "expires_at": expires,
+                "deal-image": None,
+            })
+        if len(reviews) >= BATCH_SIZE:
+            flush_reviews()
+
+    flush_reviews()
+    insert_batches(db.business, businesses)
+    insert_batches(db.deals, deals)
+    return {"users": users, "business": len(businesses),
+            "reviews": counts["reviews"], "deals": len(deals)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uri", default=os.environ.get(
+        "BENCH_MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="msp3_bench")
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--reviews-page-size", type=int,
+                        default=int(os.environ.get("REVIEWS_PAGE_SIZE", 10)),
+                        help="the REVIEWS_PAGE_SIZE the app will run with")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12,
+                        help="cost of the shared password hash")
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    client.drop_database(args.database)
+    db = client[args.database]
+
+    start = time.perf_counter()
+    password_hash = generate_password_hash(BENCH_PASSWORD, args.bcrypt_rounds).decode()
+    counts = seed(db, SCALES[args.scale], password_hash, args.reviews_page_size)
+    ensure_indexes(db)
+    print(f"Seeded {counts} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
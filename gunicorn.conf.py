@@ -0,0 +1,48 @@
+"""
+Gunicorn settings, read automatically when gunicorn starts from the project
+root.
+
+Requests spend most of their time waiting on MongoDB, GridFS and the
+Geocoding API, so each worker process runs a pool of threads (gthread)
+instead of handling one request at a time. Every setting can be overridden
+from the environment:
+
+    WEB_CONCURRENCY        worker processes (default: 2 per CPU, at least 2)
+    GUNICORN_WORKER_CLASS  gthread (default), gevent or sync
+    GUNICORN_THREADS       threads per gthread worker (default 8)
+    GUNICORN_CONNECTIONS   concurrent connections per gevent worker (default 100)
+    GUNICORN_TIMEOUT       seconds before a stuck worker is restarted (default 30)
+    GUNICORN_MAX_REQUESTS  requests before a worker is recycled (default 2000)
+
+gevent needs "pip install gevent"; gunicorn then patches sockets so
+pymongo and requests yield while they wait, which suits many slow clients
+best. Keep threads (or connections) at or below the MongoDB pool size.
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = _env_int("WEB_CONCURRENCY", max(2, multiprocessing.cpu_count() * 2))
+# Lets the app see it runs in several processes, e.g. to pick a shared cache
+os.environ["WEB_CONCURRENCY"] = str(workers)
+threads = _env_int("GUNICORN_THREADS", 8)
+worker_connections = _env_int("GUNICORN_CONNECTIONS", 100)
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = timeout
+keepalive = 5
+
+# Recycle workers now and then so slow leaks (e.g. in image decoding)
+# cannot grow without bound; the jitter stops them all restarting at once.
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 2000)
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+
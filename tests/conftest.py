@@ -0,0 +1,63 @@
+import io
+
+import mongomock
+import pytest
+from PIL import Image
+
+from app import create_app
+from app.extensions import mongo
+
+
+TEST_CONFIG = {
+    "TESTING": True,
+    "SECRET_KEY": "test",
+    "MONGO_URI": "mongodb://localhost:27017/msp3_test",
+    "CHECK_INDEXES": False,
+    "BCRYPT_LOG_ROUNDS": 4,
+    "MEDIA_BACKEND": "filesystem",
+    "GEOCODER": "static",
+    "GEOCODE_FIXTURES": {"1 High St, Bristol": (51.45, -2.59)},
+}
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app on an in-memory mongomock database and a temporary media root."""
+    app = create_app({**TEST_CONFIG, "MEDIA_ROOT": str(tmp_path / "media")})
+    mongo.cx = mongomock.MongoClient()
+    mongo.db = mongo.cx.msp3_test
+    return app
+
+
+@pytest.fixture
+def db(app):
+    return mongo.db
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def jpeg(width=40, height=30):
+    """A small JPEG upload body."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "JPEG")
+    buffer.seek(0)
+    return buffer
+
+
+def register(client, username, email, password="secret", **fields):
+    data = {"username": username, "email": email, "password": password,
+            "name": username.title(), "postcode": "BS1", "bio": "", "phoneNo": ""}
+    data.update(fields)
+    return client.post("/register", data=data, content_type="multipart/form-data")
+
+
+def login(client, email, password="secret"):
+    return client.post("/login", data={"email": email, "password": password})
+
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return session.pop("_flashes", [])
@@ -0,0 +1,139 @@
+"""
+Runs the routes with QUERY_BUDGETS="raise" against a real mongod, so a
+route sending more commands than its query_budget(), or the same query
+twice, fails the test.
+
+mongomock sends no command events, and has no $text or $geoNear, so these
+tests need a server: set MONGO_TEST_URI to a URI naming a throwaway
+database, or install pymongo_inmemory to download and start one. Without
+either they are skipped.
+"""
+import os
+import re
+
+import pytest
+
+from app import create_app
+from app.extensions import mongo, tasks
+from app.indexes import ensure_indexes
+from conftest import TEST_CONFIG, jpeg, login, register
+
+
+MULTIPART = "multipart/form-data"
+
+
+@pytest.fixture(scope="module")
+def mongod_uri():
+    if os.environ.get("MONGO_TEST_URI"):
+        yield os.environ["MONGO_TEST_URI"]
+        return
+
+    pymongo_inmemory = pytest.importorskip("pymongo_inmemory")
+    from pymongo_inmemory.context import Context
+
+    try:
+        mongod = pymongo_inmemory.Mongod(Context())
+        mongod.start()
+    except Exception as e:
+        pytest.skip(f"Could not start mongod: {e}")
+    yield f"{mongod.connection_string}/msp3_test"
+    mongod.stop()
+
+
+@pytest.fixture
+def live_app(mongod_uri):
+    app = create_app({**TEST_CONFIG, "MONGO_URI": mongod_uri, "MEDIA_BACKEND": "gridfs",
+                      "QUERY_BUDGETS": "raise", "METRICS_TOKEN": "scrape"})
+    mongo.cx.drop_database(mongo.db.name)
+    ensure_indexes(mongo.db)
+    yield app
+    tasks.executor.shutdown(wait=True)
+    mongo.cx.drop_database(mongo.db.name)
+
+
+def ok(response):
+    assert response.status_code < 400, response.status_code
+    return response
+
+
+def test_account_and_business_routes_stay_within_budget(live_app):
+    client = live_app.test_client()
+    db = mongo.db
+
+    ok(client.get("/register"))
+    ok(register(client, "amy", "amy@example.com", profile_image=(jpeg(), "amy.jpg")))
+    ok(register(client, "amy", "other@example.com"))
+    ok(register(client, "bob", "bob@example.com"))
+    ok(login(client, "amy@example.com", "wrong"))
+    ok(login(client, "amy@example.com"))
+    amy = db.users.find_one({"username": "amy"})
+
+    ok(client.post(f"/add_business/{amy['_id']}", data={
+        "category": "gardening", "company_name": "Greens", "description": "Lawns",
+        "location": "1 High St, Bristol", "email": "", "phone": "", "website": "",
+        "business_images": [(jpeg(), "a.jpg")]}, content_type=MULTIPART))
+    business = db.business.find_one({"owner_id": amy["_id"]})
+    ok(client.post(f"/edit_business/{business['_id']}", data={
+        "category": "cleaning services", "company_name": "Greens", "description": "Lawns",
+        "location": "1 High St, Bristol", "email": "", "phone": "", "website": "",
+        "business_images": [(jpeg(), "b.jpg")]}, content_type=MULTIPART))
+    ok(client.post(f"/create_deal/{amy['_id']}", data={
+        "deal-text": "10% off", "date": "01-10-2026", "expire-date": "31-12-2030",
+        "deal-image": (jpeg(), "d.jpg")}, content_type=MULTIPART))
+    deal = db.deals.find_one({"business_owner": amy["_id"]})
+    ok(client.post(f"/edit_promo/{deal['_id']}", data={
+        "deal-text": "20% off", "expire-date": "30-12-2030"},
+        content_type=MULTIPART, headers={"Referer": "/profile/amy"}))
+    ok(client.post(f"/edit_details/{amy['_id']}", data={
+        "name": "Amy B", "profile_image": (jpeg(), "amy2.jpg")}, content_type=MULTIPART))
+    ok(client.get("/profile/amy"))
+    ok(client.get("/logout"))
+
+    ok(login(client, "bob@example.com"))
+    ok(client.post(f"/add_review/amy/{amy['_id']}", data={"reviews": "Lovely lawn"}))
+    review = db.reviews.find_one()
+    ok(client.post(f"/edit_review/{review['_id']}", data={"review": "Lovely lawns"},
+                   headers={"Referer": "/profile/amy"}))
+    ok(client.get("/profile/amy"))
+    ok(client.post(f"/review_delete/{review['_id']}", data={"profile_username": "amy"}))
+    ok(client.post("/delete_account/bob"))
+
+    ok(login(client, "amy@example.com"))
+    ok(client.post(f"/deal_delete/{deal['_id']}", headers={"Referer": "/profile/amy"}))
+    ok(client.post(f"/delete_business/{amy['_id']}"))
+    ok(client.post("/delete_account/amy"))
+
+
+def test_listing_pages_stay_within_budget(live_app):
+    client = live_app.test_client()
+    db = mongo.db
+
+    ok(register(client, "amy", "amy@example.com", profile_image=(jpeg(), "amy.jpg")))
+    ok(login(client, "amy@example.com"))
+    amy = db.users.find_one({"username": "amy"})
+    ok(client.post(f"/add_business/{amy['_id']}", data={
+        "category": "gardening", "company_name": "Greens", "description": "Lawns",
+        "location": "1 High St, Bristol", "email": "", "phone": "", "website": "",
+        "business_images": [(jpeg(), "a.jpg")]}, content_type=MULTIPART))
+    ok(client.post(f"/create_deal/{amy['_id']}", data={
+        "deal-text": "10% off", "date": "01-10-2026", "expire-date": "31-12-2030",
+        "deal-image": (jpeg(), "d.jpg")}, content_type=MULTIPART))
+    for i in range(12):
+        ok(client.post(f"/add_review/amy/{amy['_id']}", data={"reviews": f"Review {i}"}))
+
+    profile = ok(client.get("/profile/amy")).get_data(as_text=True)
+    older = re.search(r"/profile/amy/reviews\?after=([\w-]+)", profile)
+    assert older
+    ok(client.get(f"/profile/amy?after={older.group(1)}"))
+    ok(client.get(f"/profile/amy/reviews?after={older.group(1)}"))
+    ok(client.get("/logout"))
+
+    # Twice each: once rendered, once from the cache
+    for path in ["/", "/about", "/deals", "/searched_category?category=gardening",
+                 "/search?q=lawns", "/nearby?lat=51.45&lng=-2.59"]:
+        ok(client.get(path))
+        ok(client.get(path))
+
+    digest = db.users.find_one({"username": "amy"})["profile"]["profile_image"]
+    ok(client.get(f"/media/{digest}"))
+    ok(client.get("/metrics", headers={"Authorization": "Bearer scrape"}))
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from app import create_app
+from app.extensions import content_versions
+from app.signals import notify_changed
+from conftest import TEST_CONFIG
+
+
+def add_deal(db, text):
+    db.deals.insert_one({
+        "business_owner": ObjectId(),
+        "deal-text": text,
+        "expire-date": "31-12-2030",
+        "expires_at": datetime.now(timezone.utc) + timedelta(days=30),
+    })
+
+
+@pytest.fixture
+def deal(db):
+    add_deal(db, "Half price lawns")
+
+
+def test_anonymous_pages_are_cached(client, deal):
+    assert client.get("/deals").headers["X-Cache"] == "MISS"
+    response = client.get("/deals")
+    assert response.headers["X-Cache"] == "HIT"
+    assert b"Half price lawns" in response.data
+
+
+def test_notified_tags_evict_the_page(app, client, db, deal):
+    client.get("/deals")
+    add_deal(db, "Free hedge trim")
+    with app.app_context():
+        notify_changed("deals")
+
+    response = client.get("/deals")
+    assert response.headers["X-Cache"] == "MISS"
+    assert b"Free hedge trim" in response.data
+
+
+def test_other_tags_keep_the_page(app, client, deal):
+    client.get("/deals")
+    with app.app_context():
+        notify_changed("home")
+    assert client.get("/deals").headers["X-Cache"] == "HIT"
+
+
+def test_query_strings_are_cached_separately(client, deal):
+    client.get("/deals")
+    assert client.get("/deals?limit=5").headers["X-Cache"] == "MISS"
+
+
+def test_logged_in_pages_are_not_cached(client, deal):
+    with client.session_transaction() as session:
+        session["user"] = "amy"
+    client.get("/deals")
+    assert client.get("/deals").headers.get("X-Cache") is None
+
+
+def test_page_cached_before_another_workers_write_is_not_served(client, db, deal):
+    # Another worker's write bumps the versions but never reaches this
+    # worker's lru cache
+    first = client.get("/deals")
+    add_deal(db, "Free hedge trim")
+    content_versions.bump(db, ["deals"])
+
+    response = client.get("/deals")
+    assert response.headers["X-Cache"] == "MISS"
+    assert b"Free hedge trim" in response.data
+    assert response.headers["ETag"] != first.headers["ETag"]
+
+
+def test_current_etag_gets_304(client, deal):
+    etag = client.get("/deals").headers["ETag"]
+    response = client.get("/deals", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_stale_etag_gets_the_page(app, client, deal):
+    etag = client.get("/deals").headers["ETag"]
+    with app.app_context():
+        notify_changed("deals")
+    response = client.get("/deals", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.headers["Last-Modified"]
+
+
+@pytest.mark.parametrize("workers, backend", [("1", "lru"), ("3", "redis")])
+def test_several_workers_share_a_redis_cache(monkeypatch, workers, backend):
+    if backend == "redis":
+        pytest.importorskip("redis")
+    monkeypatch.setenv("REDIS_URL", "redis://cache.internal:6379/0")
+    monkeypatch.setenv("WEB_CONCURRENCY", workers)
+    app = create_app(TEST_CONFIG)
+    assert app.config["CACHE_BACKEND"] == backend
+    assert app.config["CACHE_REDIS_URL"] == "redis://cache.internal:6379/0"
+
+
+def test_pages_read_from_a_secondary_are_not_cached_or_validated(app, client, deal):
+    app.config["LISTING_READ_PREFERENCE"] = "secondaryPreferred"
+    client.get("/deals")
+    response = client.get("/deals")
+    assert response.headers.get("X-Cache") is None
+    assert response.headers.get("ETag") is None
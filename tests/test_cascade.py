@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.cascade import run_deletion
+from app.extensions import tasks
+from app.reviews import refresh_review_summary
+from app.summary import load_home_summary
+
+
+def add_user(db, username, category=None):
+    user_id = db.users.insert_one({"username": username, "email": f"{username}@example.com",
+                                   "profile": {"name": username.title()}}).inserted_id
+    if category:
+        db.business.insert_one({"owner_id": user_id, "category": category,
+                                "company_name": f"{username.title()} Ltd"})
+    return user_id
+
+
+def add_review(db, business_id, user_id, text="Great"):
+    db.reviews.insert_one({"business_id": business_id, "user_id": user_id, "text": text,
+                           "date": datetime.now(timezone.utc), "author": {"user_id": user_id}})
+
+
+def add_deal(db, owner_id):
+    db.deals.insert_one({"business_owner": owner_id, "deal-text": "10% off",
+                         "expires_at": datetime.now(timezone.utc) + timedelta(days=30)})
+
+
+@pytest.fixture
+def people(app, db):
+    amy = add_user(db, "amy", "gardening")
+    carol = add_user(db, "carol", "gardening")
+    bob = add_user(db, "bob")
+    add_review(db, amy, bob)
+    add_review(db, amy, carol)
+    add_review(db, carol, bob)
+    add_review(db, carol, amy)
+    add_deal(db, amy)
+    add_deal(db, carol)
+    with app.app_context():
+        for owner in (amy, carol):
+            refresh_review_summary(db, owner)
+        load_home_summary(db)
+    return {"amy": amy, "bob": bob, "carol": carol}
+
+
+def delete_as(client, username, path):
+    with client.session_transaction() as session:
+        session["user"] = username
+    response = client.post(path)
+    # Let the background part of the deletion finish
+    tasks.executor.shutdown(wait=True)
+    return response
+
+
+def test_delete_business_removes_its_reviews_and_deals(client, db, people):
+    amy = people["amy"]
+    delete_as(client, "amy", f"/delete_business/{amy}")
+
+    assert db.business.count_documents({"owner_id": amy}) == 0
+    assert db.reviews.count_documents({"business_id": amy}) == 0
+    assert db.deals.count_documents({"business_owner": amy}) == 0
+    # The account and the reviews Amy wrote stay
+    assert db.users.count_documents({"_id": amy}) == 1
+    assert db.reviews.count_documents({"user_id": amy}) == 1
+    assert db.deletion_jobs.count_documents({}) == 0
+
+
+def test_delete_account_removes_written_reviews_and_refreshes_summaries(client, db, people):
+    amy, bob, carol = people["amy"], people["bob"], people["carol"]
+    delete_as(client, "bob", "/delete_account/bob")
+
+    assert db.users.count_documents({"_id": bob}) == 0
+    assert db.reviews.count_documents({"user_id": bob}) == 0
+    for owner in (amy, carol):
+        summary = db.business.find_one({"owner_id": owner})["review_summary"]
+        assert summary["count"] == 1
+        assert bob not in [review["user_id"] for review in summary["latest"]]
+
+
+def test_delete_account_updates_the_home_summary(app, client, db, people):
+    delete_as(client, "amy", "/delete_account/amy")
+
+    with app.app_context():
+        summary = load_home_summary(db)
+    assert summary["categories"]["gardening"] == 1
+    assert all(deal["business_owner"] != people["amy"] for deal in summary["latest_deals"])
+
+
+def test_reviews_and_deals_newer_than_the_job_are_kept(app, db, people):
+    amy = people["amy"]
+    business = db.business.find_one({"owner_id": amy})
+    job = {"_id": ObjectId(), "kind": "business", "user_id": amy,
+           "business_id": business["_id"], "category": "gardening"}
+    # Amy starts a new business before the job runs
+    db.business.insert_one({"owner_id": amy, "category": "cleaning services"})
+    add_deal(db, amy)
+    add_review(db, amy, people["bob"], "Still great")
+
+    with app.app_context():
+        deleted = run_deletion(db, job)
+
+    assert deleted == {"reviews": 2, "deals": 1}
+    assert db.business.count_documents({"owner_id": amy}) == 1
+    assert db.deals.count_documents({"business_owner": amy}) == 1
+    assert [r["text"] for r in db.reviews.find({"business_id": amy})] == ["Still great"]
+
+
+def test_reconcile_finishes_jobs_and_sweeps_orphans(app, db, people):
+    amy, bob = people["amy"], people["bob"]
+    stale = datetime.now(timezone.utc) - timedelta(hours=1)
+    business = db.business.find_one_and_delete({"owner_id": amy})
+    # A deletion cut short by a restart, after the business itself went
+    db.deletion_jobs.insert_one({"kind": "business", "user_id": amy,
+                                 "business_id": business["_id"], "category": "gardening",
+                                 "created_at": stale})
+    # A review left behind by a user removed without the cascade
+    db.users.delete_one({"_id": bob})
+
+    result = app.test_cli_runner().invoke(args=["cascade", "reconcile"])
+
+    assert result.exit_code == 0, result.output
+    assert db.deletion_jobs.count_documents({}) == 0
+    assert db.reviews.count_documents({"business_id": amy}) == 0
+    assert db.deals.count_documents({"business_owner": amy}) == 0
+    assert db.reviews.count_documents({"user_id": bob}) == 0
+    carol = db.business.find_one({"owner_id": people["carol"]})
+    assert bob not in [review["user_id"] for review in carol["review_summary"]["latest"]]
@@ -0,0 +1,34 @@
+import pytest
+
+from app.geocode import GeocodeError, GoogleGeocoder
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def geocoder_answering(body):
+    geocoder = GoogleGeocoder("key")
+    geocoder.session.get = lambda *args, **kwargs: FakeResponse(body)
+    return geocoder
+
+
+def test_google_match_gives_coordinates():
+    body = {"status": "OK", "results": [{"geometry": {"location": {"lat": 51.45, "lng": -2.59}}}]}
+    assert geocoder_answering(body).geocode("1 High St") == (51.45, -2.59)
+
+
+@pytest.mark.parametrize("body", [
+    {},
+    [],
+    {"status": "OK", "results": []},
+    {"status": "OK", "results": [{"geometry": {}}]},
+    {"status": "REQUEST_DENIED"},
+])
+def test_unexpected_google_responses_raise_geocode_error(body):
+    with pytest.raises(GeocodeError):
+        geocoder_answering(body).geocode("1 High St")
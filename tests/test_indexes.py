@@ -0,0 +1,50 @@
+import pytest
+
+from app.indexes import INDEXES, DuplicateKeys, ensure_indexes, missing_indexes
+
+
+def test_ensure_indexes_creates_the_registry(db):
+    assert missing_indexes(db)
+    ensure_indexes(db)
+    assert missing_indexes(db) == []
+    # Safe to run again on every deploy
+    ensure_indexes(db)
+    assert set(db.users.index_information()) >= {"username_unique", "email_unique"}
+
+
+def test_check_indexes_command_fails_until_indexes_exist(app, db):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["db", "check-indexes"])
+    assert result.exit_code == 1
+    assert "Missing users.username_unique" in result.output
+
+    assert runner.invoke(args=["db", "ensure-indexes"]).exit_code == 0
+    result = runner.invoke(args=["db", "check-indexes"])
+    assert result.exit_code == 0
+    assert "All indexes present" in result.output
+
+
+def test_every_index_has_a_name():
+    for indexes in INDEXES.values():
+        assert all("name" in index.document for index in indexes)
+
+
+def test_ensure_indexes_reports_existing_duplicates(db):
+    db.users.insert_many([
+        {"username": "amy", "email": "amy@example.com"},
+        {"username": "amy2", "email": "amy@example.com"},
+    ])
+    with pytest.raises(DuplicateKeys) as raised:
+        ensure_indexes(db)
+
+    conflicts = raised.value.conflicts[("users", "email_unique")]
+    assert [key for key, _ in conflicts] == [{"email": "amy@example.com"}]
+    # The collection's other indexes are still built
+    assert "username_unique" in db.users.index_information()
+
+
+def test_ensure_indexes_command_exits_non_zero_on_duplicates(app, db):
+    db.users.insert_many([{"username": "amy"}, {"username": "amy"}])
+    result = app.test_cli_runner().invoke(args=["db", "ensure-indexes"])
+    assert result.exit_code == 1
+    assert "username_unique" in result.output
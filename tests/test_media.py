@@ -0,0 +1,31 @@
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app.extensions import media
+from app.media import UnsupportedImage, save_upload
+from conftest import flashes, jpeg, register
+
+
+def test_uploads_that_are_not_images_are_rejected(app):
+    page = FileStorage(io.BytesIO(b"<html><script>alert(1)</script>"), "cat.jpg",
+                       content_type="image/jpeg")
+    with app.test_request_context(), pytest.raises(UnsupportedImage):
+        save_upload(page)
+
+
+def test_register_with_a_non_image_is_sent_back(client, db):
+    response = register(client, "amy", "amy@example.com",
+                        profile_image=(io.BytesIO(b"%PDF-1.7"), "amy.jpg"))
+    assert response.status_code == 302
+    assert ("danger", "Images must be JPEG, PNG, GIF, WebP or AVIF files.") in flashes(client)
+    assert db.users.count_documents({}) == 0
+
+
+def test_media_is_served_with_nosniff(app, client):
+    with app.app_context():
+        digest = media.put_bytes(jpeg().getvalue())
+    response = client.get(f"/media/{digest}")
+    assert response.mimetype == "image/jpeg"
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
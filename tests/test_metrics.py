@@ -0,0 +1,30 @@
+import mongomock
+import pytest
+
+from app import create_app
+from app.extensions import mongo
+from conftest import TEST_CONFIG
+
+
+@pytest.fixture
+def scraped_app(tmp_path):
+    app = create_app({**TEST_CONFIG, "MEDIA_ROOT": str(tmp_path), "METRICS_TOKEN": "scrape",
+                      "METRICS_ALLOWED_IPS": ["10.0.0.5"]})
+    mongo.cx = mongomock.MongoClient()
+    mongo.db = mongo.cx.msp3_test
+    return app
+
+
+def test_metrics_are_hidden_by_default(client):
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_need_the_token_or_an_allowed_address(scraped_app):
+    client = scraped_app.test_client()
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 404
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    assert b"http_request_duration_seconds" in response.data
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "10.0.0.5"}).status_code == 200
@@ -0,0 +1,93 @@
+import base64
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId, json_util
+
+from app.pagination import decode_token, encode_token, paginate
+
+
+SORT = [("date", -1), ("_id", -1)]
+
+
+def raw_token(values):
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def test_token_round_trip():
+    document = {"_id": ObjectId(), "date": datetime(2026, 10, 1)}
+    token = encode_token(document, SORT)
+    assert decode_token(token, SORT) == [document["date"], document["_id"]]
+
+
+@pytest.mark.parametrize("token", [
+    None,
+    "",
+    "not base64!",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    base64.urlsafe_b64encode(b"{not json").decode(),
+    raw_token({"date": 1}),
+    raw_token([1]),
+    raw_token([1, 2, 3]),
+    base64.urlsafe_b64encode(b'[{"$date": {}}, 1]').decode(),
+])
+def test_malformed_tokens_mean_first_page(token):
+    assert decode_token(token, SORT) is None
+
+
+@pytest.mark.parametrize("value", [{"$ne": None}, {"$gt": ""}, [1, 2]])
+def test_operator_tokens_are_rejected(value):
+    assert decode_token(raw_token([value, ObjectId()]), SORT) is None
+
+
+@pytest.fixture
+def reviews(db):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    documents = [{"_id": ObjectId(), "business_id": 1, "date": start + timedelta(days=i % 5)}
+                 for i in range(12)]
+    db.reviews.insert_many(documents)
+    return sorted(documents, key=lambda d: (d["date"], d["_id"]), reverse=True)
+
+
+def test_pages_walk_forwards_and_back(db, reviews):
+    first = paginate(db.reviews, {"business_id": 1}, SORT, limit=5)
+    assert [d["_id"] for d in first] == [d["_id"] for d in reviews[:5]]
+    assert first.prev_token is None
+
+    second = paginate(db.reviews, {"business_id": 1}, SORT, after=first.next_token, limit=5)
+    assert [d["_id"] for d in second] == [d["_id"] for d in reviews[5:10]]
+
+    third = paginate(db.reviews, {"business_id": 1}, SORT, after=second.next_token, limit=5)
+    assert [d["_id"] for d in third] == [d["_id"] for d in reviews[10:]]
+    assert third.next_token is None
+
+    back = paginate(db.reviews, {"business_id": 1}, SORT, before=third.prev_token, limit=5)
+    assert [d["_id"] for d in back] == [d["_id"] for d in reviews[5:10]]
+
+
+def test_operator_token_cannot_widen_the_query(db, reviews):
+    token = raw_token([{"$ne": None}, {"$ne": None}])
+    page = paginate(db.reviews, {"business_id": 1}, SORT, after=token, limit=5)
+    assert [d["_id"] for d in page] == [d["_id"] for d in reviews[:5]]
+    assert page.prev_token is None
+
+
+def test_listing_ignores_a_tampered_cursor(client, db):
+    response = client.get("/deals?after=" + raw_token([{"$gt": ""}, 1]))
+    assert response.status_code == 200
+
+
+def test_category_listing_pages_with_cursors(client, db):
+    db.business.insert_many([
+        {"category": "gardening", "company_name": f"Garden {i}", "images": []}
+        for i in range(5)])
+
+    first = client.get("/searched_category?category=gardening&limit=3").get_data(as_text=True)
+    assert "Garden 2" in first and "Garden 3" not in first
+
+    after = re.search(r"after=([\w-]+)", first).group(1)
+    second = client.get(f"/searched_category?category=gardening&limit=3&after={after}")
+    text = second.get_data(as_text=True)
+    assert "Garden 3" in text and "Garden 4" in text and "Garden 2" not in text
@@ -0,0 +1,47 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.extensions import bcrypt
+from app.passwords import bcrypt_rounds
+from conftest import flashes, login
+
+
+@pytest.fixture
+def amy(db):
+    def add(password_hash):
+        db.users.insert_one({"username": "amy", "email": "amy@example.com",
+                             "password": password_hash, "profile": {"name": "Amy"}})
+    return add
+
+
+def stored_hash(db):
+    return db.users.find_one({"username": "amy"})["password"]
+
+
+def test_bcrypt_rounds():
+    assert bcrypt_rounds("$2b$12$" + "x" * 53) == 12
+    assert bcrypt_rounds("pbkdf2:sha256:600000$salt$hash") is None
+
+
+def test_legacy_hash_is_replaced_on_login(client, db, amy):
+    amy(generate_password_hash("secret", method="pbkdf2:sha256:1000"))
+    login(client, "amy@example.com")
+
+    assert flashes(client) == [("success", "Welcome, amy")]
+    assert bcrypt_rounds(stored_hash(db)) == 4
+
+
+def test_hash_at_another_cost_is_replaced_on_login(app, client, db, amy):
+    with app.app_context():
+        amy(bcrypt.generate_password_hash("secret", 5).decode())
+    login(client, "amy@example.com")
+    assert bcrypt_rounds(stored_hash(db)) == 4
+
+
+def test_wrong_password_keeps_the_hash(client, db, amy):
+    legacy = generate_password_hash("secret", method="pbkdf2:sha256:1000")
+    amy(legacy)
+    login(client, "amy@example.com", "wrong")
+
+    assert flashes(client) == [("danger", "Incorrect password. Please try again.")]
+    assert stored_hash(db) == legacy
@@ -0,0 +1,57 @@
+import pytest
+
+import app.routes as routes
+from app.extensions import passwords
+from app.indexes import DuplicateKeys, ensure_indexes
+from conftest import flashes, jpeg, register
+
+
+@pytest.fixture
+def amy(client, db):
+    ensure_indexes(db)
+    register(client, "Amy", "amy@example.com")
+    flashes(client)
+
+
+@pytest.fixture
+def expensive_work(monkeypatch):
+    """Records every password hash and image upload a request does."""
+    calls = []
+    hash_password, save_upload = passwords.hash, routes.save_upload
+    monkeypatch.setattr(passwords, "hash", lambda p: calls.append("hash") or hash_password(p))
+    monkeypatch.setattr(routes, "save_upload", lambda f: calls.append("upload") or save_upload(f))
+    return calls
+
+
+def test_register_stores_a_lowercased_user(client, db):
+    response = register(client, "Amy", "Amy@Example.com", profile_image=(jpeg(), "amy.jpg"))
+    assert response.status_code == 302
+    user = db.users.find_one()
+    assert (user["username"], user["email"]) == ("amy", "amy@example.com")
+    assert user["password"].startswith("$2b$04$")
+    assert user["profile"]["profile_image"]
+
+
+@pytest.mark.parametrize("username, email, taken", [
+    ("AMY", "other@example.com", "username"),
+    ("other", "AMY@example.com", "email"),
+])
+def test_duplicate_is_refused_before_hashing_or_uploading(
+        client, db, amy, expensive_work, username, email, taken):
+    response = register(client, username, email, profile_image=(jpeg(), "p.jpg"))
+
+    assert response.status_code == 302
+    assert flashes(client) == [("danger", f"A user with that {taken} already exist")]
+    assert db.users.count_documents({}) == 1
+    assert expensive_work == []
+
+
+def test_unique_indexes_catch_a_racing_duplicate(client, db, amy, monkeypatch):
+    # As if the other registration landed between the check and the insert
+    monkeypatch.setattr(routes.repository, "find_user_by_username_or_email",
+                        lambda username, email: None)
+
+    register(client, "amy", "other@example.com")
+    [(category, message)] = flashes(client)
+    assert category == "danger" and message.endswith("already exist")
+    assert db.users.count_documents({}) == 1
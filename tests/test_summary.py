@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.reviews import refresh_review_summary
+from app.summary import HOME_SUMMARY_ID, load_home_summary, rebuild_home_summary
+from conftest import jpeg, login, register
+
+
+MULTIPART = "multipart/form-data"
+
+
+@pytest.fixture
+def owner(app, client, db):
+    """Amy, logged in and without a business yet, after the summary was built."""
+    amy = db.users.insert_one({"username": "amy", "email": "amy@example.com",
+                               "profile": {"name": "Amy"}}).inserted_id
+    with client.session_transaction() as session:
+        session["user"] = "amy"
+    with app.app_context():
+        rebuild_home_summary(db)
+    return amy
+
+
+def add_business(client, owner, category="gardening"):
+    return client.post(f"/add_business/{owner}", data={
+        "category": category, "company_name": "Greens", "description": "Lawns",
+        "location": "1 High St, Bristol", "email": "", "phone": "", "website": "",
+        "business_images": [(jpeg(), "a.jpg")]}, content_type=MULTIPART)
+
+
+def create_deal(client, owner, text):
+    return client.post(f"/create_deal/{owner}", data={
+        "deal-text": text, "date": "01-10-2026", "expire-date": "31-12-2030",
+        "deal-image": (jpeg(), "d.jpg")}, content_type=MULTIPART)
+
+
+def home_summary(db):
+    return db.summaries.find_one({"_id": HOME_SUMMARY_ID})
+
+
+def test_adding_and_moving_a_business_updates_category_counts(client, db, owner):
+    add_business(client, owner)
+    assert home_summary(db)["categories"]["gardening"] == 1
+
+    business = db.business.find_one({"owner_id": owner})
+    client.post(f"/edit_business/{business['_id']}", data={
+        "category": "cleaning services", "company_name": "Greens", "description": "Lawns",
+        "location": "1 High St, Bristol", "email": "", "phone": "", "website": ""},
+        content_type=MULTIPART)
+    counts = home_summary(db)["categories"]
+    assert (counts["gardening"], counts["cleaning services"]) == (0, 1)
+
+
+def test_new_deal_goes_to_the_front_of_latest_deals(app, client, db, owner):
+    add_business(client, owner)
+    create_deal(client, owner, "First")
+    create_deal(client, owner, "Second")
+    latest = home_summary(db)["latest_deals"]
+    assert [deal["deal-text"] for deal in latest] == ["Second", "First"]
+
+    app.config["HOME_DEALS_SIZE"] = 1
+    create_deal(client, owner, "Third")
+    assert [deal["deal-text"] for deal in home_summary(db)["latest_deals"]] == ["Third"]
+
+
+def test_expired_deals_are_dropped_from_the_homepage(app, db, owner):
+    now = datetime.now(timezone.utc)
+    live = {"_id": ObjectId(), "deal-text": "Live", "expires_at": now + timedelta(days=1)}
+    db.deals.insert_one(live)
+    db.summaries.update_one({"_id": HOME_SUMMARY_ID}, {"$set": {"latest_deals": [
+        live, {"_id": ObjectId(), "deal-text": "Gone", "expires_at": now - timedelta(days=1)}]}})
+
+    with app.app_context():
+        latest = load_home_summary(db)["latest_deals"]
+    assert [deal["deal-text"] for deal in latest] == ["Live"]
+    assert [deal["deal-text"] for deal in home_summary(db)["latest_deals"]] == ["Live"]
+
+
+@pytest.fixture
+def business(client, db):
+    """Amy's business, with Bob logged in to review it."""
+    register(client, "amy", "amy@example.com")
+    register(client, "bob", "bob@example.com")
+    amy = db.users.find_one({"username": "amy"})["_id"]
+    db.business.insert_one({"owner_id": amy, "category": "gardening",
+                            "company_name": "Greens", "images": []})
+    login(client, "bob@example.com")
+    return amy
+
+
+def review_summary(db, owner):
+    return db.business.find_one({"owner_id": owner})["review_summary"]
+
+
+def test_review_writes_keep_the_review_summary_current(client, db, business):
+    client.post(f"/add_review/amy/{business}", data={"reviews": "Lovely lawn"})
+    client.post(f"/add_review/amy/{business}", data={"reviews": "Tidy hedges"})
+    summary = review_summary(db, business)
+    assert summary["count"] == 2
+    assert [review["text"] for review in summary["latest"]] == ["Tidy hedges", "Lovely lawn"]
+    assert summary["latest"][0]["author"]["name"] == "Bob"
+
+    review = db.reviews.find_one({"text": "Lovely lawn"})
+    client.post(f"/edit_review/{review['_id']}",
+                data={"review": "Lovely lawns", "datefeild": "03-10-2026"},
+                headers={"Referer": "/profile/amy"})
+    assert "Lovely lawns" in [r["text"] for r in review_summary(db, business)["latest"]]
+
+    client.post(f"/review_delete/{review['_id']}", data={"profile_username": "amy"})
+    summary = review_summary(db, business)
+    assert summary["count"] == 1
+    assert [review["text"] for review in summary["latest"]] == ["Tidy hedges"]
+
+
+def test_renaming_a_reviewer_updates_the_summary(client, db, business):
+    client.post(f"/add_review/amy/{business}", data={"reviews": "Lovely lawn"})
+    bob = db.users.find_one({"username": "bob"})
+    client.post(f"/edit_details/{bob['_id']}", data={"name": "Robert"},
+                content_type=MULTIPART)
+
+    assert db.reviews.find_one()["author"]["name"] == "Robert"
+    assert review_summary(db, business)["latest"][0]["author"]["name"] == "Robert"
+
+
+def test_review_summary_keeps_only_a_page_of_reviews(app, db, business):
+    app.config["REVIEWS_PAGE_SIZE"] = 3
+    start = datetime.now(timezone.utc)
+    for i in range(5):
+        db.reviews.insert_one({"business_id": business, "text": str(i),
+                               "date": start + timedelta(minutes=i)})
+    with app.app_context():
+        refresh_review_summary(db, business)
+
+    summary = review_summary(db, business)
+    assert summary["count"] == 5
+    assert [review["text"] for review in summary["latest"]] == ["4", "3", "2"]
+
+
+def test_older_rebuild_does_not_overwrite_a_newer_one(app, db, business):
+    with app.app_context():
+        refresh_review_summary(db, business)
+    # A rebuild that started later has already been stored
+    later = datetime.now(timezone.utc) + timedelta(seconds=5)
+    db.business.update_one({"owner_id": business}, {"$set": {
+        "review_summary.rebuilt_at": later, "review_summary.count": 7}})
+
+    db.reviews.insert_one({"business_id": business, "text": "Late",
+                           "date": datetime.now(timezone.utc)})
+    with app.app_context():
+        refresh_review_summary(db, business)
+    assert review_summary(db, business)["count"] == 7
@@ -0,0 +1,25 @@
+import threading
+
+from app.tasks import BoundedExecutor
+
+
+def test_full_queue_drops_or_waits():
+    executor = BoundedExecutor(1, 1)
+    release = threading.Event()
+    running = executor.submit(release.wait)
+    waiting = executor.submit(release.wait)
+
+    assert executor.try_submit(print) is None
+
+    blocked = []
+    submitter = threading.Thread(target=lambda: blocked.append(executor.submit(len, "ab")))
+    submitter.start()
+    submitter.join(timeout=0.1)
+    assert submitter.is_alive()
+
+    release.set()
+    submitter.join(timeout=5)
+    assert blocked[0].result(timeout=5) == 2
+    assert running.result() and waiting.result()
+    assert executor.try_submit(len, "abc").result(timeout=5) == 3
+    executor.shutdown(wait=True)